@@ -1,5 +1,6 @@
 from django.contrib import admin
 from api import models
+from api import rollups
 
 
 class CartAdmin(admin.ModelAdmin):
@@ -8,16 +9,35 @@ class CartAdmin(admin.ModelAdmin):
 
 class CourseAdmin(admin.ModelAdmin):
     list_display = ["id", "course_id", "title"]
+    # 统计字段由api/counters.py维护，后台只能查看
+    readonly_fields = ["rating_sum", "review_count", "enrollment_count", "revenue"]
 
 
 class CartOrderAdmin(admin.ModelAdmin):
-    list_display = ["id", "cart_order_id", "full_name"]
+    list_display = ["id", "cart_order_id", "full_name", "payment_status"]
+    actions = ["mark_refunded"]
+
+    @admin.action(description="标记为退款（同步扣减销售统计）")
+    def mark_refunded(self, request, queryset):
+        refunded = sum(rollups.mark_order_refunded(order) for order in queryset)
+        self.message_user(request, f"{refunded} 个已支付订单标记为退款")
 
 
 class CartOrderItemAdmin(admin.ModelAdmin):
     list_display = ["id", "cart_order_item_id", "order"]
 
 
+class FulfilmentJobAdmin(admin.ModelAdmin):
+    list_display = ["id", "order", "status", "attempts", "updated"]
+    list_filter = ["status"]
+
+
+class PaymentEventAdmin(admin.ModelAdmin):
+    list_display = ["id", "provider", "event_id", "event_type", "order", "result", "date"]
+    list_filter = ["provider", "result"]
+    search_fields = ["event_id"]
+
+
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ["id", "user", "rating"]
 
@@ -33,7 +53,7 @@ class VariantAdmin(admin.ModelAdmin):
     list_display = ['id','course__title','title']
 
 class VariantItemAdmin(admin.ModelAdmin):
-    list_display = ['id','variant__course__title','variant__title','title']
+    list_display = ['id','variant__course__title','variant__title','title','probe_status']
     
 admin.site.register(models.Teacher)
 admin.site.register(models.Category)
@@ -45,6 +65,8 @@ admin.site.register(models.Question_Answer_Message)
 admin.site.register(models.Cart, CartAdmin)
 admin.site.register(models.CartOrder, CartOrderAdmin)
 admin.site.register(models.CartOrderItem, CartOrderItemAdmin)
+admin.site.register(models.FulfilmentJob, FulfilmentJobAdmin)
+admin.site.register(models.PaymentEvent, PaymentEventAdmin)
 admin.site.register(models.Certificate)
 admin.site.register(models.CompletedLesson)
 admin.site.register(models.EnrolledCourse)
@@ -12,4 +12,12 @@ class ApiConfig(AppConfig):
             from .swagger_inspector import monkey_patch_field_repr
             monkey_patch_field_repr()
         except ImportError:
-            pass
\ No newline at end of file
+            pass
+
+        # 注册信号处理（搜索索引等派生数据的同步）
+        from api import signals  # noqa: F401
+
+        # 接口响应缓存后端的系统检查（见api/response_cache.py）
+        from django.core import checks
+        from api import response_cache
+        checks.register(response_cache.check_backend, checks.Tags.caches)
@@ -0,0 +1,257 @@
+"""
+购物车的汇总：件数、价格、税费、总计
+
+🧐为什么不在Python里累加？
+答：原来 CartStatsAPIView 逐行读出购物车，把 Decimal 转成 float 再 round 后累加，
+金额会有浮点误差（0.1 + 0.2 != 0.3），而且购物车有几行就要把几行都读出来；
+件数又是 CartCountAPIView 单独查一次。现在一条 aggregate() 在数据库里求和，
+结果是精确的 Decimal，件数也在同一条查询里。
+
+购物车页面通过 CartStateAPIView 一次拿到购物车项和汇总。
+
+🧐税率为什么缓存在进程里？
+答：原来每次加入购物车都要按国家名查一次 Country 表。国家和税率很少变化，
+所以每个进程第一次用到时把整张表读成 {国家名: 税率} 的字典，之后加购物车不再查国家；
+Country 保存/删除时由 api/signals.py 调用 invalidate_tax_rates()，下次用到时重新读取。
+信号只能清掉当前进程的缓存，所以税率表还有 TAX_RATE_CACHE_TIMEOUT 秒的有效期，
+多进程部署时其他进程最多过这么久就会重新读取，读到新的税率。
+
+批量加入购物车（add_courses）和切换国家后重算税费（recompute_taxes）都是固定条数的SQL：
+一次查课程、一次查已有的购物车项，然后 bulk_create / bulk_update。
+
+🧐匿名购物车怎么处理？
+答：没登录时前端随机生成 cart_id，购物车项的 user 是空的；登录之后前端换成按用户ID生成的 cart_id，
+原来的匿名购物车就再也没人用了，表会一直变大。
+- 登录时 merge_anonymous_cart() 把匿名购物车并进用户的购物车（目标 cart_id 由 user_cart_id() 在后端算出，不信任前端传的）：一条DELETE去掉用户购物车里已经有的课程，
+  一条UPDATE把剩下的改成用户的 cart_id 和 user
+- sweep_abandoned_carts() 删除长时间没有活动的匿名购物车，每批最多 CART_SWEEP_BATCH_SIZE 个购物车，
+  由 `python manage.py sweep_carts` 定时执行（或者 --loop 常驻）
+"""
+
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from api import models as api_models
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal("0.00")
+
+CENT = Decimal("0.01")
+
+# 找不到国家时沿用原来的默认值：国家记为 China，不收税
+DEFAULT_COUNTRY = "China"
+
+MONEY = models.DecimalField(max_digits=12, decimal_places=2)
+
+
+def money_sum(field):
+    # 空购物车的 SUM 是 NULL，统一成 0.00
+    return Coalesce(models.Sum(field), models.Value(ZERO), output_field=MONEY)
+
+
+def cart_summary(cart_id):
+    """一条查询算出购物车的件数和价格/税费/总计（Decimal）"""
+    return api_models.Cart.objects.filter(cart_id=cart_id).aggregate(
+        count=models.Count("id"),
+        price=money_sum("price"),
+        tax=money_sum("tax_fee"),
+        total=money_sum("total"),
+    )
+
+
+# ---------------------------------------
+# 国家 → 税率
+# (过期时间, {国家名: 税率百分比})
+_tax_rates = None
+_tax_rates_lock = threading.Lock()
+
+
+def tax_rates():
+    """{国家名: 税率百分比}，每个进程在第一次用到、失效或者过期之后读一次 Country 表"""
+    global _tax_rates
+    entry = _tax_rates
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    with _tax_rates_lock:
+        if _tax_rates is None or _tax_rates[0] <= time.monotonic():
+            rates = {}
+            # 重名的国家和原来的 filter(name=...).first() 一样取id最小的那个
+            for name, rate in api_models.Country.objects.order_by("-id").values_list(
+                "name", "tax_rate"
+            ):
+                rates[name] = rate
+            _tax_rates = (time.monotonic() + settings.TAX_RATE_CACHE_TIMEOUT, rates)
+        return _tax_rates[1]
+
+
+def invalidate_tax_rates():
+    global _tax_rates
+    with _tax_rates_lock:
+        _tax_rates = None
+
+
+def resolve_country(country_name):
+    """返回 (国家名, 税率)，税率是 Decimal 小数（5% 是 0.05）"""
+    rate = tax_rates().get(country_name)
+    if rate is None:
+        return DEFAULT_COUNTRY, ZERO
+    return country_name, Decimal(rate) / 100
+
+
+def apply_price(cart, price, tax_rate):
+    """按价格和税率设置购物车项的价格、税费、总价；税费先保留两位小数，保证 总价 = 价格 + 税费"""
+    cart.price = Decimal(str(price)).quantize(CENT)
+    cart.tax_fee = (cart.price * tax_rate).quantize(CENT)
+    cart.total = cart.price + cart.tax_fee
+
+
+# ---------------------------------------
+# 批量操作
+def add_courses(cart_id, course_ids, user, country_name):
+    """
+    把多门课程加入购物车，已经在购物车里的课程更新价格和税费。
+    价格取课程当前的价格。返回 (新加入的数量, 更新的数量, 不存在的课程ID列表)
+    """
+    country, tax_rate = resolve_country(country_name)
+    courses = api_models.Course.objects.in_bulk(course_ids)
+    missing = [course_id for course_id in course_ids if course_id not in courses]
+    now = timezone.now()
+
+    with transaction.atomic():
+        existing = {
+            cart.course_id: cart
+            for cart in api_models.Cart.objects.select_for_update().filter(
+                cart_id=cart_id, course_id__in=courses
+            )
+        }
+        new_carts = []
+        for course in courses.values():
+            cart = existing.get(course.id)
+            if cart is None:
+                cart = api_models.Cart(cart_id=cart_id, course=course)
+                new_carts.append(cart)
+            cart.user = user
+            cart.country = country
+            cart.date = now
+            apply_price(cart, course.price, tax_rate)
+        api_models.Cart.objects.bulk_create(new_carts)
+        api_models.Cart.objects.bulk_update(
+            existing.values(), ["user", "country", "date", "price", "tax_fee", "total"]
+        )
+    return len(new_carts), len(existing), missing
+
+
+def recompute_taxes(cart_id, country_name):
+    """购物者切换国家后，按新国家的税率重算整个购物车的税费和总价，返回更新的购物车项数"""
+    country, tax_rate = resolve_country(country_name)
+    with transaction.atomic():
+        items = list(
+            api_models.Cart.objects.select_for_update().filter(cart_id=cart_id)
+        )
+        for cart in items:
+            cart.country = country
+            apply_price(cart, cart.price, tax_rate)
+        api_models.Cart.objects.bulk_update(items, ["country", "tax_fee", "total"])
+    return len(items)
+
+
+# ---------------------------------------
+# 匿名购物车：登录时合并、过期清理
+def to_int32(value):
+    value &= 0xFFFFFFFF
+    return value - 0x100000000 if value & 0x80000000 else value
+
+
+def user_cart_id(user):
+    """
+    登录用户的 cart_id，和前端 GenerateCartId.ts 的 generateUserBasedCartId 算法一致：
+    对用户ID字符串做 hash = hash * 31 + 字符码（32位整数），取绝对值，补0到10位，超过10位截取前10位
+    """
+    value = 0
+    for char in str(user.id):
+        value = to_int32(value * 31 + ord(char))
+    return str(abs(value)).zfill(10)[:10]
+
+
+def owned_by_other_user(cart_id, user):
+    """cart_id 里是否有别的登录用户的购物车项"""
+    return (
+        api_models.Cart.objects.filter(cart_id=cart_id, user__isnull=False)
+        .exclude(user=user)
+        .exists()
+    )
+
+
+def merge_anonymous_cart(anonymous_cart_id, cart_id, user):
+    """
+    把匿名购物车 anonymous_cart_id 里的课程并进用户的购物车 cart_id，返回 (并入的数量, 丢弃的重复数量)。
+    只处理 user 为空的购物车项，别人的购物车不会被并走；两边都有的课程保留用户购物车里的那一项。
+    """
+    if not anonymous_cart_id or anonymous_cart_id == cart_id:
+        return 0, 0
+    anonymous = api_models.Cart.objects.filter(
+        cart_id=anonymous_cart_id, user__isnull=True
+    )
+    with transaction.atomic():
+        duplicates, _ = anonymous.filter(
+            models.Exists(
+                api_models.Cart.objects.filter(
+                    cart_id=cart_id, course=models.OuterRef("course")
+                )
+            )
+        ).delete()
+        merged = anonymous.update(cart_id=cart_id, user=user, date=timezone.now())
+    return merged, duplicates
+
+
+SweepResult = namedtuple("SweepResult", ["carts", "rows", "batches", "seconds"])
+
+
+def abandoned_cart_ids(cutoff):
+    """最近一次活动早于 cutoff 的匿名购物车"""
+    return (
+        api_models.Cart.objects.filter(user__isnull=True)
+        .values("cart_id")
+        .annotate(last_active=models.Max("date"))
+        .filter(last_active__lt=cutoff)
+        .values_list("cart_id", flat=True)
+    )
+
+
+def sweep_abandoned_carts(ttl_days=None, batch_size=None, max_batches=None):
+    """
+    分批删除过期的匿名购物车，返回 SweepResult(删除的购物车数, 删除的行数, 批数, 耗时秒数)。
+    每一批是一个单独的短事务，不会长时间锁住购物车表。
+    """
+    ttl_days = settings.CART_ANONYMOUS_TTL_DAYS if ttl_days is None else ttl_days
+    batch_size = batch_size or settings.CART_SWEEP_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=ttl_days)
+
+    started = time.monotonic()
+    carts = rows = batches = 0
+    while max_batches is None or batches < max_batches:
+        cart_ids = list(abandoned_cart_ids(cutoff)[:batch_size])
+        if not cart_ids:
+            break
+        deleted, _ = api_models.Cart.objects.filter(
+            cart_id__in=cart_ids, user__isnull=True, date__lt=cutoff
+        ).delete()
+        carts += len(cart_ids)
+        rows += deleted
+        batches += 1
+    result = SweepResult(carts, rows, batches, round(time.monotonic() - started, 3))
+    if result.rows:
+        logger.info(
+            "清理了 %s 个过期的匿名购物车，共 %s 行，%s 批，耗时 %ss", *result
+        )
+    return result
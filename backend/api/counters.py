@@ -0,0 +1,242 @@
+"""
+课程的冗余统计字段：rating_sum、review_count、enrollment_count、revenue
+
+🧐为什么要冗余存储？
+答：原来每序列化一门课程都要对 Review 跑一次 AVG 和 COUNT，
+教师的畅销课程接口还要对每门课程聚合一次 enrolledcourse_set。
+把这些数字直接存在 Course 表上之后，读取只是普通的列，还可以直接在SQL里排序。
+
+维护方式：
+- Review / EnrolledCourse / CartOrderItem 的 save() 在同一个事务里调用这里的 *_saved()
+- 删除（包括级联删除）由 api/signals.py 的 post_delete 调用 *_deleted()，
+  Django的删除本身就在事务里执行
+- 每条记录从数据库读出来时（from_db → remember_state）记下它对统计的“贡献”，保存/删除时只加减差值，
+  用 F() 表达式原地加减，多个请求并发修改同一门课程也不会互相覆盖
+- bulk_create / update() / loaddata 不会经过上面的路径，需要自己调用或者执行
+  `python manage.py rebuild_course_counters` 重新计算
+
+注意：这个模块会被 api/models.py 导入，模块顶层不能 import 模型。
+"""
+
+from decimal import Decimal
+
+from django.apps import apps as global_apps
+from django.db import models
+from django.db.models.functions import Coalesce
+
+
+# Course 上由这里维护的统计字段。Course.save() 更新已有记录时不写这几列，
+# 否则读出来之后别的请求加过的数会被旧值覆盖回去
+COURSE_COUNTER_FIELDS = ("rating_sum", "review_count", "enrollment_count", "revenue")
+
+
+def fields_without_counters(model):
+    """保存已有课程时要写的字段：除了主键和统计字段之外的所有字段"""
+    return [
+        field.name
+        for field in model._meta.concrete_fields
+        if not field.primary_key and field.name not in COURSE_COUNTER_FIELDS
+    ]
+
+
+# 从数据库读出来的记录如果延迟加载了相关字段，就不知道它原来的贡献，保存时不做增量
+UNKNOWN = object()
+
+
+def remember_state(instance, fields, state):
+    """在 from_db 中调用，记下记录当前对统计的贡献"""
+    if not instance.get_deferred_fields() & set(fields):
+        instance._counter_state = state(instance)
+
+
+def previous_state(instance, adding):
+    return None if adding else getattr(instance, "_counter_state", UNKNOWN)
+
+
+def add_to_course(course_id, **deltas):
+    """给课程的统计字段加上差值，例如 add_to_course(1, review_count=1, rating_sum=5)"""
+    from api.models import Course
+
+    values = {field: models.F(field) + delta for field, delta in deltas.items() if delta}
+    if course_id and values:
+        Course.objects.filter(id=course_id).update(**values)
+
+
+# ---------------------------------------
+# 评价：有效（active）的评价才计入评分
+REVIEW_FIELDS = ("course_id", "active", "rating")
+
+
+def review_state(review):
+    if review.active and review.course_id:
+        return (review.course_id, review.rating or 0)
+    return None
+
+
+def apply_review_change(old, new):
+    if old is UNKNOWN or old == new:
+        return
+    if old:
+        add_to_course(old[0], rating_sum=-old[1], review_count=-1)
+    if new:
+        add_to_course(new[0], rating_sum=new[1], review_count=1)
+
+
+def review_saved(review, adding):
+    new = review_state(review)
+    apply_review_change(previous_state(review, adding), new)
+    review._counter_state = new
+
+
+def review_deleted(review):
+    apply_review_change(getattr(review, "_counter_state", review_state(review)), None)
+    review._counter_state = None
+
+
+# ---------------------------------------
+# 报名：每条报名记录计一次报名，收入是对应订单项的价格
+ENROLLMENT_FIELDS = ("course_id", "order_item_id")
+
+
+def enrollment_state(enrollment):
+    if enrollment.course_id and enrollment.order_item_id:
+        return (enrollment.course_id, enrollment.order_item_id)
+    return None
+
+
+def order_item_price(enrollment, order_item_id):
+    from api.models import CartOrderItem, EnrolledCourse
+
+    if EnrolledCourse.order_item.is_cached(enrollment) and (
+        enrollment.order_item_id == order_item_id
+    ):
+        return enrollment.order_item.price
+    price = (
+        CartOrderItem.objects.filter(id=order_item_id)
+        .values_list("price", flat=True)
+        .first()
+    )
+    return price or Decimal("0.00")
+
+
+def apply_enrollment_change(enrollment, old, new):
+    if old is UNKNOWN or old == new:
+        return
+    if old:
+        add_to_course(
+            old[0], enrollment_count=-1, revenue=-order_item_price(enrollment, old[1])
+        )
+    if new:
+        add_to_course(
+            new[0], enrollment_count=1, revenue=order_item_price(enrollment, new[1])
+        )
+
+
+def enrollment_saved(enrollment, adding):
+    new = enrollment_state(enrollment)
+    apply_enrollment_change(enrollment, previous_state(enrollment, adding), new)
+    enrollment._counter_state = new
+
+
+def enrollment_deleted(enrollment):
+    old = getattr(enrollment, "_counter_state", enrollment_state(enrollment))
+    apply_enrollment_change(enrollment, old, None)
+    enrollment._counter_state = None
+
+
+def enrollments_created(enrollments):
+    """bulk_create 的报名记录不经过 save()，按课程合并后每门课程只执行一次UPDATE"""
+    deltas = {}
+    for enrollment in enrollments:
+        state = enrollment_state(enrollment)
+        enrollment._counter_state = state
+        if not state:
+            continue
+        count, revenue = deltas.get(state[0], (0, Decimal("0.00")))
+        deltas[state[0]] = (
+            count + 1,
+            revenue + order_item_price(enrollment, state[1]),
+        )
+    for course_id, (count, revenue) in deltas.items():
+        add_to_course(course_id, enrollment_count=count, revenue=revenue)
+
+
+# ---------------------------------------
+# 订单项：价格变化时，引用它的报名记录对应的课程收入跟着变化
+ORDER_ITEM_FIELDS = ("price",)
+
+
+def order_item_state(order_item):
+    return Decimal(order_item.price)
+
+
+def order_item_saved(order_item, adding):
+    old = previous_state(order_item, adding)
+    new = order_item_state(order_item)
+    order_item._counter_state = new
+    # 新建的订单项还没有报名记录
+    if old is None or old is UNKNOWN or old == new:
+        return
+
+    from api.models import EnrolledCourse
+
+    enrollments = (
+        EnrolledCourse.objects.filter(order_item=order_item)
+        .values("course_id")
+        .annotate(count=models.Count("id"))
+    )
+    for row in enrollments:
+        add_to_course(row["course_id"], revenue=(new - old) * row["count"])
+
+
+# ---------------------------------------
+# 全量重算
+def rebuild_counters(course_ids=None, apps=global_apps):
+    """
+    用一条 UPDATE ... SET x = (子查询) 重新计算课程的统计字段，返回更新的课程数量。
+    apps 参数让迁移可以传入历史模型。
+    """
+    Course = apps.get_model("api", "Course")
+    Review = apps.get_model("api", "Review")
+    EnrolledCourse = apps.get_model("api", "EnrolledCourse")
+
+    reviews = (
+        Review.objects.filter(course=models.OuterRef("pk"), active=True)
+        .order_by()
+        .values("course")
+    )
+    enrollments = (
+        EnrolledCourse.objects.filter(course=models.OuterRef("pk"))
+        .order_by()
+        .values("course")
+    )
+    courses = Course.objects.all()
+    if course_ids is not None:
+        courses = courses.filter(id__in=course_ids)
+
+    zero = models.Value(Decimal("0.00"), output_field=models.DecimalField())
+    return courses.update(
+        rating_sum=Coalesce(
+            models.Subquery(reviews.annotate(total=models.Sum("rating")).values("total")),
+            0,
+        ),
+        review_count=Coalesce(
+            models.Subquery(reviews.annotate(total=models.Count("id")).values("total")),
+            0,
+        ),
+        enrollment_count=Coalesce(
+            models.Subquery(
+                enrollments.annotate(total=models.Count("id")).values("total")
+            ),
+            0,
+        ),
+        revenue=Coalesce(
+            models.Subquery(
+                enrollments.annotate(total=models.Sum("order_item__price")).values(
+                    "total"
+                ),
+                output_field=models.DecimalField(),
+            ),
+            zero,
+        ),
+    )
@@ -0,0 +1,265 @@
+"""
+优惠券：把教师的优惠券应用到订单上
+
+🧐原来的 CouponApplyAPIView 有什么问题？
+答：对每个订单项都执行一次 coupon in item.coupons.all()（每次都要查一遍多对多表），
+在循环里保存订单项和订单，而且处理完第一个订单项就 return 了，
+一个订单里有同一个教师的多门课程时只有第一门打了折；也没有检查优惠券是否启用、用户是否用过。
+
+现在 apply_coupon() 的流程：
+1. 锁住订单和优惠券（select_for_update），同一个订单/同一张优惠券的并发请求排队执行
+2. 只校验一次：订单还没支付、优惠券已启用、这个订单没用过、这个学生没在别的已支付订单里用过
+3. 一条查询取出这个教师的、还没用过这张优惠券的订单项，一次遍历算出每一项的折扣
+4. bulk_update 订单项，多对多关系各一次INSERT，最后按订单项重新汇总订单的总计和节省金额
+
+🧐为什么应用时不记 used_by？
+答：应用优惠券时订单还没支付，学生放弃这个订单（或者一次性优惠券被放进一个没人付款的订单）的话，
+这张优惠券就再也用不了了。所以“用过”只算已支付（包括之后退款）的订单：
+订单确认支付时由 orders.confirm_payment() 调用 record_usage() 写 used_by，
+校验时看 used_by 和已支付的订单。代价是同一张一次性优惠券可以同时放进几个未支付的订单，
+谁先付款都能按折扣价付，这和原来“应用就算用过”相比是更可以接受的情况。
+
+🧐按代码查找优惠券为什么要缓存？
+答：优惠券代码只在同一个教师下唯一，输入一个代码要先找出所有同名的启用优惠券，再按订单里的教师挑一张。
+find_coupon() 把 {代码: 启用的 (优惠券ID, 教师ID)} 放在进程内的LRU里（最多 COUPON_CACHE_SIZE 个代码），
+Coupon 保存/删除时由 api/signals.py 清空；其他进程的缓存最多过 COUPON_CACHE_TIMEOUT 秒失效。
+缓存只用来找到优惠券ID，真正应用时 apply_coupon() 还会锁住优惠券重新读取、重新校验，
+所以缓存过期了也不会用错优惠券，最多就是刚启用的优惠券在其他进程里要等一会儿才能用。
+查不到的代码不缓存，否则刚创建的优惠券在其他进程里会一直查不到。
+
+generate_coupons() 给活动批量生成一次性优惠券，一次 bulk_create 插入；默认不启用，教师确认后再启用。
+"""
+
+import secrets
+import string
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import models, transaction
+
+from api import models as api_models
+from api import rollups
+
+CENT = Decimal("0.01")
+
+# 批量生成的代码：去掉容易看错的 0/O、1/I
+CODE_ALPHABET = "".join(
+    ch for ch in string.ascii_uppercase + string.digits if ch not in "0O1I"
+)
+CODE_LENGTH = 10
+
+
+class CouponError(Exception):
+    """优惠券不能用在这个订单上，message 直接返回给前端"""
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+def discount_for(amount, coupon):
+    """按优惠券的折扣百分比算出折扣金额，保留两位小数"""
+    return (Decimal(amount) * Decimal(coupon.discount) / 100).quantize(CENT)
+
+
+def check_coupon(order, coupon):
+    """校验优惠券能不能用在这个订单上，不能用时抛出 CouponError"""
+    if order.payment_status != "Processing":
+        raise CouponError("Order Already Paid.")
+    if not coupon.active:
+        raise CouponError("Coupon Is Not Active.")
+    if order.coupons.filter(id=coupon.id).exists():
+        raise CouponError("Coupon Already Applied.")
+    paid_orders = coupon.cartorder_set.filter(payment_status__in=rollups.PAID_STATUSES)
+    # 一个学生只能用一次：在别的已支付订单里用过的优惠券不能再用
+    if order.student_id and (
+        coupon.used_by.filter(id=order.student_id).exists()
+        or paid_orders.filter(student_id=order.student_id).exists()
+    ):
+        raise CouponError("Coupon Already Used.")
+    # 一次性优惠券：任何人付款用过之后都不能再用（没登录的订单没有 used_by，所以也看已支付的订单）
+    if coupon.single_use and (coupon.used_by.exists() or paid_orders.exists()):
+        raise CouponError("Coupon Already Used.")
+
+
+def refresh_order_totals(order):
+    """按订单项重新汇总订单的总计和节省金额"""
+    totals = api_models.CartOrderItem.objects.filter(order=order).aggregate(
+        total=models.Sum("total"), saved=models.Sum("saved")
+    )
+    order.total = totals["total"] or Decimal("0.00")
+    order.saved = totals["saved"] or Decimal("0.00")
+    order.save(update_fields=["total", "saved"])
+
+
+def apply_coupon(order, coupon_id, code):
+    """
+    把优惠券应用到订单里这个教师的所有课程上，返回 (打折的订单项数量, 折扣总额)。
+    不能用时抛出 CouponError。
+    """
+    with transaction.atomic():
+        order = api_models.CartOrder.objects.select_for_update().get(id=order.id)
+        # 带上代码一起查：其他进程的缓存过期时，改过代码或者已经删除的优惠券都查不到
+        coupon = (
+            api_models.Coupon.objects.select_for_update()
+            .filter(id=coupon_id, code=code)
+            .first()
+        )
+        if coupon is None:
+            raise CouponError("Coupon Not Found.")
+        check_coupon(order, coupon)
+
+        items = list(
+            api_models.CartOrderItem.objects.filter(
+                order=order, teacher=coupon.teacher
+            ).exclude(coupons=coupon)
+        )
+        if not items:
+            raise CouponError("Coupon Not Applicable To This Order.")
+
+        discount_total = Decimal("0.00")
+        for item in items:
+            discount = discount_for(item.total, coupon)
+            item.total -= discount
+            item.price -= discount
+            item.saved += discount
+            item.applied_coupon = True
+            discount_total += discount
+        api_models.CartOrderItem.objects.bulk_update(
+            items, ["total", "price", "saved", "applied_coupon"]
+        )
+
+        ItemCoupon = api_models.CartOrderItem.coupons.through
+        ItemCoupon.objects.bulk_create(
+            [ItemCoupon(cartorderitem_id=item.id, coupon_id=coupon.id) for item in items]
+        )
+        order.coupons.add(coupon)
+
+        refresh_order_totals(order)
+    return len(items), discount_total
+
+
+def record_usage(order):
+    """订单支付后，把订单用到的优惠券记到这个学生的 used_by 里"""
+    if not order.student_id:
+        return
+    UsedBy = api_models.Coupon.used_by.through
+    UsedBy.objects.bulk_create(
+        [
+            UsedBy(coupon_id=coupon_id, user_id=order.student_id)
+            for coupon_id in order.coupons.values_list("id", flat=True)
+        ],
+        ignore_conflicts=True,
+    )
+
+
+# ---------------------------------------
+# 按代码查找（进程内LRU）
+class CouponCache:
+    """{优惠券代码: ((优惠券ID, 教师ID), ...)}，只缓存查得到的代码"""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, code):
+        with self.lock:
+            entry = self.entries.get(code)
+            if entry is None:
+                return None
+            expires, coupons = entry
+            if expires < time.monotonic():
+                del self.entries[code]
+                return None
+            self.entries.move_to_end(code)
+            return coupons
+
+    def set(self, code, coupons):
+        with self.lock:
+            self.entries[code] = (time.monotonic() + self.timeout, coupons)
+            self.entries.move_to_end(code)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_cache = CouponCache(settings.COUPON_CACHE_SIZE, settings.COUPON_CACHE_TIMEOUT)
+
+
+def invalidate_cache():
+    _cache.clear()
+
+
+def active_coupons(code):
+    """这个代码对应的所有启用的优惠券 ((优惠券ID, 教师ID), ...)"""
+    coupons = _cache.get(code)
+    if coupons is None:
+        coupons = tuple(
+            api_models.Coupon.objects.filter(code=code, active=True)
+            .order_by("id")
+            .values_list("id", "teacher_id")
+        )
+        if coupons:
+            _cache.set(code, coupons)
+    return coupons
+
+
+def find_coupon(code, order):
+    """按代码找到用在这个订单上的优惠券ID；同名的优惠券优先选订单里有这个教师课程的那张，找不到返回None"""
+    coupons = active_coupons(code)
+    if len(coupons) > 1:
+        teacher_ids = set(
+            api_models.CartOrderItem.objects.filter(order=order).values_list(
+                "teacher_id", flat=True
+            )
+        )
+        for coupon_id, teacher_id in coupons:
+            if teacher_id in teacher_ids:
+                return coupon_id
+    return coupons[0][0] if coupons else None
+
+
+# ---------------------------------------
+# 批量生成
+def random_code(prefix=""):
+    return prefix + "".join(secrets.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH))
+
+
+def generate_coupons(teacher, quantity, discount, prefix="", active=False):
+    """
+    给教师生成 quantity 张一次性优惠券，返回新建的优惠券列表。
+    代码随机生成，和这个教师已有的代码重复的会重新生成（一次查询检查一批）。
+    """
+    codes = set()
+    while len(codes) < quantity:
+        candidates = {random_code(prefix) for _ in range(quantity - len(codes))} - codes
+        taken = set(
+            api_models.Coupon.objects.filter(
+                teacher=teacher, code__in=candidates
+            ).values_list("code", flat=True)
+        )
+        codes |= candidates - taken
+
+    new_coupons = [
+        api_models.Coupon(
+            teacher=teacher,
+            code=code,
+            discount=discount,
+            active=active,
+            single_use=True,
+        )
+        for code in codes
+    ]
+    with transaction.atomic():
+        api_models.Coupon.objects.bulk_create(new_coupons, batch_size=1000)
+    # bulk_create 不会发出 post_save 信号，别的教师可能有同名的代码已经在缓存里
+    transaction.on_commit(invalidate_cache)
+    return new_coupons
@@ -0,0 +1,327 @@
+"""
+课程大纲（章节 Variant + 课时 VariantItem）的解析和批量写入
+
+🧐为什么要单独拿出来？
+答：原来的创建接口对每个章节都要把整个 request.data 扫一遍找 variants[i][items] 的键，
+复杂度是 章节数 × 字段数；然后每个章节、每个课时都单独 create 一次，
+一门 300 个课时的课程要执行几百条 INSERT（VariantItem.save 还会再 save 一次）。
+
+现在：
+1. parse_curriculum 只遍历一次请求数据，用正则把 variants[i][items][j][field] 归位
+2. create_curriculum 用 bulk_create 一次插入所有章节、一次插入所有课时
+3. 插入完成后把有视频的课时统一交给 media_probe 探测时长
+
+除了 multipart 的扁平键，还支持用 JSON 传大纲的文字部分：
+
+    {"curriculum": [{"variant_title": "第1章", "items": [{"title": "1.1", "preview": true}]}]}
+
+multipart 请求里 curriculum 是一个 JSON 字符串，视频文件仍然用
+variants[i][items][j][file] 上传，两边按下标合并。
+"""
+
+import json
+import re
+
+from django.core.files.base import File
+from django.db import transaction
+from rest_framework import serializers
+
+from api import media_probe
+from api import models as api_models
+from api import progress
+from api import response_cache
+
+# variants[0][variant_title] / variants[0][items][1][title]
+CURRICULUM_KEY = re.compile(r"^variants\[(\d+)\]\[(\w+)\](?:\[(\d+)\]\[(\w+)\])?$")
+
+CURRICULUM_JSON_FIELD = "curriculum"
+
+
+def strtobool(val):
+    """
+    Convert a string representation of truth to true (1) or false (0).
+
+    True values are 'y', 'yes', 't', 'true', 'on', and '1'; false values
+    are 'n', 'no', 'f', 'false', 'off', and '0'.  Raises ValueError if
+    'val' is anything else.
+    """
+    val = val.lower()
+    if val in ("y", "yes", "t", "true", "on", "1"):
+        return 1
+    elif val in ("n", "no", "f", "false", "off", "0"):
+        return 0
+    else:
+        raise ValueError(f"invalid truth value {val!r}")
+
+
+def parse_preview(value):
+    """preview 可能是 "true"/"false" 字符串（multipart）也可能是布尔值（JSON）"""
+    if value is None:
+        return False
+    try:
+        return bool(strtobool(str(value)))
+    except ValueError:
+        raise serializers.ValidationError({"preview": f"无效的布尔值: {value}"})
+
+
+def uploaded_file(value):
+    """只有真正上传的文件才写入；"null"、已有文件的URL之类的字符串都忽略"""
+    return value if isinstance(value, File) else None
+
+
+def load_json_curriculum(raw, variants):
+    """把 JSON 格式的大纲合并进 variants（{章节下标: {字段..., "items": {课时下标: {...}}}}）"""
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            raise serializers.ValidationError({CURRICULUM_JSON_FIELD: "课程大纲不是合法的JSON"})
+    if not isinstance(raw, list):
+        raise serializers.ValidationError({CURRICULUM_JSON_FIELD: "课程大纲必须是章节列表"})
+
+    for variant_index, variant_data in enumerate(raw):
+        if not isinstance(variant_data, dict):
+            raise serializers.ValidationError({CURRICULUM_JSON_FIELD: "章节必须是对象"})
+        entry = variants.setdefault(variant_index, {"items": {}})
+        for field, value in variant_data.items():
+            if field != "items":
+                entry[field] = value
+                continue
+            for item_index, item_data in enumerate(value or []):
+                if not isinstance(item_data, dict):
+                    raise serializers.ValidationError({CURRICULUM_JSON_FIELD: "课时必须是对象"})
+                entry["items"].setdefault(item_index, {}).update(item_data)
+
+
+def parse_curriculum(data):
+    """
+    单次遍历解析请求里的课程大纲，返回按下标排好序的章节列表：
+
+        [{"variant_title": "第1章", "variant_id": "12", "items": [{"title": ..., "file": ...}, ...]}, ...]
+
+    和原来的逻辑一致，只要提交了 variant_title 字段（标题是空字符串也算）章节就会保留；
+    既没有 variant_title 也没有 variant_id 的章节会被忽略。
+    🧐为什么空标题也要保留？
+    答：更新时提交里没有的章节会被删除（见 sync_curriculum），老师只是清空了章节标题，
+    不能因此把章节连同课时和学生的完成记录一起删掉
+    """
+    variants = {}
+
+    raw = data.get(CURRICULUM_JSON_FIELD)
+    if raw:
+        load_json_curriculum(raw, variants)
+
+    for key, value in data.items():
+        match = CURRICULUM_KEY.match(key)
+        if not match:
+            continue
+        variant_index, field, item_index, item_field = match.groups()
+        entry = variants.setdefault(int(variant_index), {"items": {}})
+        if item_index is None:
+            entry[field] = value
+        elif field == "items":
+            entry["items"].setdefault(int(item_index), {})[item_field] = value
+
+    # 下标按数字排序，"10" 要排在 "2" 后面
+    return [
+        {
+            **{field: value for field, value in entry.items() if field != "items"},
+            "items": [entry["items"][index] for index in sorted(entry["items"])],
+        }
+        for _, entry in sorted(variants.items())
+        if "variant_title" in entry or public_id_key(entry.get("variant_id"))
+    ]
+
+
+def build_variant_item(variant, item_data):
+    """根据解析出来的课时数据构造（未保存的）VariantItem"""
+    file = uploaded_file(item_data.get("file"))
+    return api_models.VariantItem(
+        variant=variant,
+        title=item_data.get("title"),
+        description=item_data.get("description"),
+        file=file,
+        preview=parse_preview(item_data.get("preview")),
+        # bulk_create 不会调用 VariantItem.save，这里手动标记待探测
+        probe_status=media_probe.PROBE_PENDING if file else None,
+    )
+
+
+def create_curriculum(course, curriculum):
+    """
+    批量创建课程大纲，调用方需要在事务中执行。
+
+    无论多少章节和课时，都只有两次批量INSERT（超出数据库单条语句参数上限时Django会自动分批），
+    视频文件在INSERT前由FileField.pre_save写入存储。
+    """
+    variants = [
+        api_models.Variant(course=course, title=entry.get("variant_title") or "")
+        for entry in curriculum
+    ]
+    api_models.Variant.objects.bulk_create(variants)
+
+    items = [
+        build_variant_item(variant, item_data)
+        for variant, entry in zip(variants, curriculum)
+        for item_data in entry["items"]
+    ]
+    api_models.VariantItem.objects.bulk_create(items)
+
+    # bulk_create 不会发出 post_save 信号
+    response_cache.invalidate_course(course.id)
+    media_probe.schedule_probes(items)
+    return variants, items
+
+
+# ---------------------------------------
+# 更新：和数据库里的大纲做diff
+
+
+def public_id_key(value):
+    """
+    variant_id / variant_item_id 是纯数字的字符串，前端会把它转成 number 再传回来，
+    开头的 0 会丢掉，这里统一去掉前导 0 再比较
+    """
+    if value in (None, ""):
+        return None
+    return str(value).strip().lstrip("0") or "0"
+
+
+def empty_summary():
+    return {
+        "variants": {"created": 0, "updated": 0, "deleted": 0},
+        "items": {"created": 0, "updated": 0, "moved": 0, "deleted": 0},
+    }
+
+
+def load_curriculum_tree(course):
+    """两条查询取出课程的全部章节和课时"""
+    variants = list(course.variant_set.all())
+    items = list(api_models.VariantItem.objects.filter(variant__course=course))
+    return variants, items
+
+
+def diff_variant_item(item, variant, item_data):
+    """比较一个已有课时和提交的数据，原地修改并返回变化的字段（没有提交的字段保持不变）"""
+    changed = []
+    for field in ("title", "description"):
+        if field in item_data and getattr(item, field) != item_data[field]:
+            setattr(item, field, item_data[field])
+            changed.append(field)
+    if "preview" in item_data:
+        preview = parse_preview(item_data["preview"])
+        if item.preview != preview:
+            item.preview = preview
+            changed.append("preview")
+    if item.variant_id != variant.id:
+        item.variant = variant
+        changed.append("variant")
+
+    # 只有真正上传了新文件才替换，原样传回来的URL或"null"都表示不修改
+    file = uploaded_file(item_data.get("file"))
+    if file is not None:
+        item.file = file
+        item.duration = None
+        item.content_duration = None
+        item.probe_status = media_probe.PROBE_PENDING
+        changed += ["file", "duration", "content_duration", "probe_status"]
+    return changed
+
+
+def sync_curriculum(course, curriculum):
+    """
+    把提交的大纲（parse_curriculum 的结果）同步到数据库，返回变更统计。
+
+    提交的是完整的大纲树：
+    - 章节按 variant_id、课时按 variant_item_id 和数据库里的记录匹配，
+      匹配不上的（包括前端给新行临时生成的id）一律新建
+    - 课时出现在别的章节下面表示被移动了，更新它的 variant
+    - 数据库里有、提交里没有的章节和课时会被删除
+    - 没有提交任何章节时什么都不做，避免只改课程标题的请求把大纲清空
+
+    读取是两条查询，写入是 bulk_create / bulk_update / delete 各一次，全部在一个事务里完成。
+    """
+    summary = empty_summary()
+    if not curriculum:
+        return summary
+
+    variant_item_file = api_models.VariantItem._meta.get_field("file")
+
+    with transaction.atomic():
+        existing_variants, existing_items = load_curriculum_tree(course)
+        variants_by_key = {public_id_key(v.variant_id): v for v in existing_variants}
+        items_by_key = {public_id_key(i.variant_item_id): i for i in existing_items}
+
+        submitted = []
+        new_variants = []
+        updated_variants = []
+        for entry in curriculum:
+            variant = variants_by_key.pop(public_id_key(entry.get("variant_id")), None)
+            # 没有提交 variant_title 字段时标题保持不变；提交了空字符串就改成空标题
+            title = entry.get("variant_title")
+            if variant is None:
+                variant = api_models.Variant(course=course, title=title or "")
+                new_variants.append(variant)
+            elif title is not None and variant.title != title:
+                variant.title = title
+                updated_variants.append(variant)
+            submitted.append((variant, entry))
+
+        api_models.Variant.objects.bulk_create(new_variants)
+
+        new_items = []
+        updated_items = []
+        update_fields = set()
+        probe_items = []
+        for variant, entry in submitted:
+            for item_data in entry["items"]:
+                item = items_by_key.pop(public_id_key(item_data.get("variant_item_id")), None)
+                if item is None:
+                    item = build_variant_item(variant, item_data)
+                    new_items.append(item)
+                    if item.file:
+                        probe_items.append(item)
+                    continue
+
+                changed = diff_variant_item(item, variant, item_data)
+                if not changed:
+                    continue
+                if "variant" in changed:
+                    summary["items"]["moved"] += 1
+                if "file" in changed:
+                    # bulk_update 不会调用 FileField.pre_save，新文件要先手动写入存储
+                    variant_item_file.pre_save(item, add=False)
+                    probe_items.append(item)
+                updated_items.append(item)
+                update_fields.update(changed)
+
+        api_models.VariantItem.objects.bulk_create(new_items)
+        if updated_variants:
+            api_models.Variant.objects.bulk_update(updated_variants, ["title"])
+        # 各个课时变化的字段不同，统一按并集更新，没变的字段写回的还是原值
+        if updated_items:
+            api_models.VariantItem.objects.bulk_update(updated_items, sorted(update_fields))
+
+        # 先移动课时再删除章节，否则移走的课时会被级联删除
+        removed_item_ids = [item.id for item in items_by_key.values()]
+        removed_variant_ids = [variant.id for variant in variants_by_key.values()]
+        if removed_item_ids:
+            api_models.VariantItem.objects.filter(id__in=removed_item_ids).delete()
+        if removed_variant_ids:
+            api_models.Variant.objects.filter(id__in=removed_variant_ids).delete()
+
+        if new_variants or updated_variants or new_items or updated_items:
+            # bulk_create / bulk_update 不会发出 post_save 信号
+            response_cache.invalidate_course(course.id)
+        if new_items:
+            # 删除的课时由 post_delete 信号处理，新建的课时要手动刷新学习进度
+            progress.refresh_course_on_commit(course.id)
+        media_probe.schedule_probes(probe_items)
+
+    summary["variants"]["created"] = len(new_variants)
+    summary["variants"]["updated"] = len(updated_variants)
+    summary["variants"]["deleted"] = len(removed_variant_ids)
+    summary["items"]["created"] = len(new_items)
+    summary["items"]["updated"] = len(updated_items)
+    summary["items"]["deleted"] = len(removed_item_ids)
+    return summary
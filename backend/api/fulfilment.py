@@ -0,0 +1,188 @@
+"""
+订单支付成功后的开通任务（报名记录 + 通知）
+
+🧐为什么不在 PaymentSuccessAPIView 里直接创建？
+答：原来的 process_payment_success 在请求里先通知学生，再对每个订单项分别通知教师、
+查一次是否已报名、创建一条报名记录，而客户端还在等 PayPal/Stripe 的校验请求，
+订单越大等得越久；两个支付回调同时到达时，“先查再建”也挡不住重复报名。
+
+现在的流程（数据库 outbox）：
+1. 校验接口把订单改成 Paid 的同一个事务里创建一条 FulfilmentJob（一个订单只有一条），立即返回
+2. 事务提交后把任务交给本进程的后台线程执行（MEDIA_PROBE 同样的做法，不依赖 Redis/Celery）
+3. 执行时先用条件UPDATE“认领”任务，同一时刻只有一个线程/进程能执行它；
+   报名记录和通知各一次 bulk_create，和任务状态在同一个事务里提交
+4. EnrolledCourse 上 order_item 的唯一约束兜底：万一别的路径已经创建了报名记录，
+   INSERT 失败，整个事务回滚，任务标记 Failed，重试时只会补上缺少的报名
+5. 进程重启丢失的任务、失败的任务由 `python manage.py run_fulfilment_jobs` 重新执行
+
+前端可以轮询 order/fulfilment/<cart_order_id>/ 查看任务状态。
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, models, transaction
+from django.utils import timezone
+
+from api import counters
+from api import models as api_models
+from api import progress
+from api import response_cache
+
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = "Pending"
+JOB_RUNNING = "Running"
+JOB_COMPLETED = "Completed"
+JOB_FAILED = "Failed"
+
+# 失败超过这个次数就不再自动重试，需要人工处理后在后台把状态改回Pending
+MAX_ATTEMPTS = 5
+# Running 超过这么久还没完成，认为执行它的进程已经退出，可以被重新认领
+STALE_AFTER = timedelta(minutes=10)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def enqueue(order):
+    """在订单变成 Paid 的事务里调用：创建（或取出已有的）开通任务，事务提交后开始执行"""
+    job, _ = api_models.FulfilmentJob.objects.get_or_create(order=order)
+    if job.status != JOB_COMPLETED:
+        transaction.on_commit(lambda: dispatch(job.id))
+    return job
+
+
+def job_status(order):
+    return (
+        api_models.FulfilmentJob.objects.filter(order=order)
+        .values_list("status", flat=True)
+        .first()
+    )
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.FULFILMENT_WORKERS,
+                thread_name_prefix="fulfilment",
+            )
+        return _executor
+
+
+def dispatch(job_id):
+    if not settings.FULFILMENT_ASYNC:
+        run_job(job_id)
+        return
+    get_executor().submit(run_job_in_thread, job_id)
+
+
+def run_job_in_thread(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        # 线程里打开的数据库连接不会被请求结束时的清理关掉
+        connections.close_all()
+
+
+def runnable_jobs():
+    """等待执行、失败待重试、执行超时的任务"""
+    stale = timezone.now() - STALE_AFTER
+    return api_models.FulfilmentJob.objects.filter(
+        models.Q(status=JOB_PENDING)
+        | models.Q(status=JOB_FAILED, attempts__lt=MAX_ATTEMPTS)
+        | models.Q(status=JOB_RUNNING, updated__lt=stale)
+    )
+
+
+def claim(job_id):
+    """条件UPDATE认领任务，返回是否认领成功"""
+    return bool(
+        runnable_jobs()
+        .filter(id=job_id)
+        .update(
+            status=JOB_RUNNING,
+            attempts=models.F("attempts") + 1,
+            updated=timezone.now(),
+        )
+    )
+
+
+def run_job(job_id):
+    """执行一个开通任务，返回是否成功；任务已经被别人认领或已经完成时直接返回False"""
+    if not claim(job_id):
+        return False
+    job = api_models.FulfilmentJob.objects.select_related("order").get(id=job_id)
+    try:
+        with transaction.atomic():
+            fulfil_order(job.order)
+            api_models.FulfilmentJob.objects.filter(id=job_id).update(
+                status=JOB_COMPLETED,
+                last_error=None,
+                updated=timezone.now(),
+                completed_at=timezone.now(),
+            )
+    except Exception as e:
+        logger.exception("订单 %s 开通失败", job.order.cart_order_id)
+        api_models.FulfilmentJob.objects.filter(id=job_id).update(
+            status=JOB_FAILED, last_error=repr(e), updated=timezone.now()
+        )
+        return False
+    return True
+
+
+def fulfil_order(order):
+    """
+    给订单里还没有报名记录的订单项创建报名记录，并通知学生和教师。
+    调用方需要在事务中执行；查询次数和订单项数量无关。
+    """
+    order_items = list(api_models.CartOrderItem.objects.filter(order=order))
+    enrolled = set(
+        api_models.EnrolledCourse.objects.filter(order_item__order=order).values_list(
+            "order_item_id", flat=True
+        )
+    )
+    order_items = [item for item in order_items if item.id not in enrolled]
+    if not order_items:
+        return []
+
+    enrollments = [
+        api_models.EnrolledCourse(
+            teacher_id=item.teacher_id,
+            course_id=item.course_id,
+            user_id=order.student_id,
+            order_item=item,
+        )
+        for item in order_items
+    ]
+    api_models.EnrolledCourse.objects.bulk_create(enrollments)
+    # bulk_create 不会经过 save() 和 post_save，课程统计、学习进度和缓存要手动更新
+    counters.enrollments_created(enrollments)
+    progress.refresh(api_models.EnrolledCourse.objects.filter(order_item__in=order_items))
+    for course_id in {item.course_id for item in order_items}:
+        response_cache.invalidate_course(course_id)
+
+    # 通知学生买了新课程，通知每个订单项的教师有新订单
+    notifications = [
+        api_models.Notification(
+            user_id=order.student_id,
+            order=order,
+            type="Course Enrollment Completed",
+        )
+    ]
+    notifications += [
+        api_models.Notification(
+            teacher_id=item.teacher_id,
+            order=order,
+            order_item=item,
+            type="New Order",
+        )
+        for item in order_items
+    ]
+    api_models.Notification.objects.bulk_create(notifications)
+    return enrollments
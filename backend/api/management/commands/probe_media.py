@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from api import media_probe
+from api import models as api_models
+
+
+class Command(BaseCommand):
+    help = "探测课时视频时长：默认处理所有Pending状态的课时（例如进程重启时丢失的任务）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--failed", action="store_true", help="同时重试探测失败（Failed）的课时"
+        )
+        parser.add_argument(
+            "--all", action="store_true", help="重新探测所有带视频文件的课时"
+        )
+
+    def handle(self, *args, **options):
+        items = api_models.VariantItem.objects.exclude(file="").exclude(
+            file__isnull=True
+        )
+        if not options["all"]:
+            statuses = [media_probe.PROBE_PENDING]
+            if options["failed"]:
+                statuses.append(media_probe.PROBE_FAILED)
+            items = items.filter(probe_status__in=statuses)
+
+        probed_ids = []
+        for item in items.only("id", "file").iterator():
+            media_probe.probe_now(item.id, item.file.name, item.file.path)
+            probed_ids.append(item.id)
+
+        completed = api_models.VariantItem.objects.filter(
+            id__in=probed_ids, probe_status=media_probe.PROBE_COMPLETED
+        ).count()
+        self.stdout.write(
+            self.style.SUCCESS(f"探测了 {len(probed_ids)} 个课时，其中 {completed} 个成功")
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from api import counters
+from api import models as api_models
+from api import response_cache
+
+
+class Command(BaseCommand):
+    help = "重新计算课程的统计字段（评分总和、评价数、报名人次、收入），用于修正批量导入等造成的偏差"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--course", type=int, nargs="*", help="只重算指定id的课程，默认全部课程"
+        )
+
+    def handle(self, *args, **options):
+        course_ids = options["course"] or None
+        updated = counters.rebuild_counters(course_ids)
+
+        # update() 不会发出信号，课程数据的缓存需要手动失效
+        if course_ids is None:
+            course_ids = api_models.Course.objects.values_list("id", flat=True)
+        response_cache.invalidate(
+            "course-list", *[f"course:{course_id}" for course_id in course_ids]
+        )
+        self.stdout.write(self.style.SUCCESS(f"重新计算了 {updated} 门课程的统计字段"))
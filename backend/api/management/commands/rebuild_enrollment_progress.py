@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api import progress
+
+
+class Command(BaseCommand):
+    help = "重新计算报名记录的学习进度（完成课时数、课时总数、进度百分比），用于修正批量导入等造成的偏差"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--course", type=int, nargs="*", help="只重算指定id的课程，默认全部课程"
+        )
+
+    def handle(self, *args, **options):
+        updated = progress.rebuild_progress(options["course"] or None)
+        self.stdout.write(self.style.SUCCESS(f"重新计算了 {updated} 条报名记录的学习进度"))
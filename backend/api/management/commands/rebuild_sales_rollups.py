@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api import rollups
+
+
+class Command(BaseCommand):
+    help = "根据已支付/已退款的订单重新生成教师和课程的按日、按月销售统计表"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--teacher", type=int, nargs="*", help="只重算指定id的教师，默认全部教师"
+        )
+
+    def handle(self, *args, **options):
+        rows = rollups.rebuild_rollups(options["teacher"] or None)
+        self.stdout.write(self.style.SUCCESS(f"生成了 {rows} 条按日销售统计"))
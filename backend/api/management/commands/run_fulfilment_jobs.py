@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import fulfilment
+
+
+class Command(BaseCommand):
+    help = "执行订单开通任务：处理等待中、失败待重试、执行超时的任务（例如进程重启时丢失的任务）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop", action="store_true", help="持续运行，每隔 --interval 秒检查一次"
+        )
+        parser.add_argument(
+            "--interval", type=float, default=5, help="--loop 模式下的检查间隔（秒）"
+        )
+        parser.add_argument(
+            "--limit", type=int, default=100, help="每一轮最多执行的任务数量"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            job_ids = list(
+                fulfilment.runnable_jobs()
+                .order_by("updated")
+                .values_list("id", flat=True)[: options["limit"]]
+            )
+            # run_job 会先认领任务，多个worker同时运行也不会重复执行
+            completed = sum(fulfilment.run_job(job_id) for job_id in job_ids)
+            if job_ids:
+                self.stdout.write(
+                    self.style.SUCCESS(f"执行了 {len(job_ids)} 个开通任务，其中 {completed} 个成功")
+                )
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
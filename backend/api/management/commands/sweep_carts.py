@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import carts
+
+
+class Command(BaseCommand):
+    help = "清理过期的匿名购物车：超过 CART_ANONYMOUS_TTL_DAYS 天没有活动的购物车分批删除"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=None, help="过期天数，默认取 CART_ANONYMOUS_TTL_DAYS"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=None, help="每一批删除的购物车数量，默认取 CART_SWEEP_BATCH_SIZE"
+        )
+        parser.add_argument(
+            "--max-batches", type=int, default=None, help="每一轮最多执行的批数，不传则删完为止"
+        )
+        parser.add_argument(
+            "--loop", action="store_true", help="持续运行，每隔 --interval 秒清理一次"
+        )
+        parser.add_argument(
+            "--interval", type=float, default=3600, help="--loop 模式下的清理间隔（秒）"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            result = carts.sweep_abandoned_carts(
+                ttl_days=options["days"],
+                batch_size=options["batch_size"],
+                max_batches=options["max_batches"],
+            )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"清理了 {result.carts} 个购物车，共 {result.rows} 行，"
+                    f"{result.batches} 批，耗时 {result.seconds}s"
+                )
+            )
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,200 @@
+"""
+课时视频时长探测
+
+🧐为什么不在 VariantItem.save 里直接用 moviepy 读时长？
+答：VideoFileClip 会启动 ffmpeg 解码整个文件头，一个视频要几秒钟，
+而 save 是在请求里（甚至在创建课程的事务里）执行的，会长时间占住 gunicorn worker 和数据库事务。
+
+现在的流程：
+1. VariantItem.save 发现视频文件变了，把 probe_status 设为 Pending，直接返回
+2. 事务提交后（transaction.on_commit）把探测任务提交到本进程的进程池
+3. 子进程读取容器头部拿到时长（MP4/MOV 只需读 moov/mvhd 几十个字节，其他格式才退回 moviepy）
+4. 结果回到主进程后写回 duration / content_duration / probe_status
+
+不依赖 Redis/Celery 之类的外部组件；进程重启时丢失的任务可以用
+`python manage.py probe_media` 重新探测所有 Pending 的课时。
+
+注意：子进程用 spawn 方式启动，只会 import 这个模块，所以模块顶层不能 import Django 模型。
+"""
+
+import logging
+import math
+import multiprocessing
+import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+PROBE_PENDING = "Pending"
+PROBE_COMPLETED = "Completed"
+PROBE_FAILED = "Failed"
+
+# ISO BMFF（MP4/MOV/M4V）容器的box头
+BOX_HEADER = struct.Struct(">I4s")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# ---------------------------------------
+# 时长读取（在子进程中执行）
+def iter_boxes(f, start, end):
+    """遍历 [start, end) 范围内的box，返回 (类型, 内容起始位置, 结束位置)"""
+    position = start
+    while position + BOX_HEADER.size <= end:
+        f.seek(position)
+        size, kind = BOX_HEADER.unpack(f.read(BOX_HEADER.size))
+        header_size = BOX_HEADER.size
+        if size == 1:  # 64位大小
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_size += 8
+        elif size == 0:  # 一直延伸到文件末尾
+            size = end - position
+        if size < header_size:
+            return
+        yield kind, position + header_size, position + size
+        position += size
+
+
+def read_mp4_duration(path):
+    """从 moov/mvhd 里读出时长（秒），不是MP4/MOV容器时返回None"""
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        file_size = f.tell()
+        for kind, start, end in iter_boxes(f, 0, file_size):
+            if kind != b"moov":
+                continue
+            for child, child_start, _ in iter_boxes(f, start, end):
+                if child != b"mvhd":
+                    continue
+                f.seek(child_start)
+                version = f.read(4)[0]
+                if version == 1:
+                    f.seek(16, 1)  # creation_time + modification_time（各8字节）
+                    timescale, duration = struct.unpack(">IQ", f.read(12))
+                else:
+                    f.seek(8, 1)  # creation_time + modification_time（各4字节）
+                    timescale, duration = struct.unpack(">II", f.read(8))
+                if not timescale:
+                    return None
+                return duration / timescale
+    return None
+
+
+def read_duration(path):
+    """读取视频时长（秒），先读容器头，失败再用moviepy解码"""
+    try:
+        duration = read_mp4_duration(path)
+    except (OSError, struct.error, IndexError):
+        duration = None
+    if duration is not None:
+        return duration
+
+    from moviepy import VideoFileClip
+
+    clip = VideoFileClip(path)
+    try:
+        return clip.duration
+    finally:
+        clip.close()
+
+
+def format_duration(duration_seconds):
+    """把秒数格式化成 "5m 30s" 这样的展示文本"""
+    minutes, seconds = divmod(duration_seconds, 60)
+    return f"{math.floor(minutes)}m {math.floor(seconds)}s"
+
+
+# ---------------------------------------
+# 任务调度（在Web进程中执行）
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.MEDIA_PROBE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def store_result(variant_item_id, file_name, duration_seconds):
+    """写回探测结果；文件在探测期间被替换过的话就丢弃这次结果"""
+    from api import response_cache
+    from api.models import VariantItem
+
+    if duration_seconds is None:
+        values = {"probe_status": PROBE_FAILED}
+    else:
+        values = {
+            "duration": timedelta(seconds=duration_seconds),
+            "content_duration": format_duration(duration_seconds),
+            "probe_status": PROBE_COMPLETED,
+        }
+    # 用update()而不是save()，避免再次触发探测
+    variant_items = VariantItem.objects.filter(id=variant_item_id, file=file_name)
+    if variant_items.update(**values):
+        # update()不会发出post_save信号，课程的缓存需要手动失效
+        response_cache.invalidate_course(
+            variant_items.values_list("variant__course_id", flat=True).first()
+        )
+
+
+def probe_now(variant_item_id, file_name, path):
+    """在当前进程里同步探测（probe_media命令和MEDIA_PROBE_ASYNC=False时使用）"""
+    try:
+        duration_seconds = read_duration(path)
+    except Exception:
+        logger.exception("探测视频时长失败: %s", path)
+        duration_seconds = None
+    store_result(variant_item_id, file_name, duration_seconds)
+
+
+def submit_probe(variant_item_id, file_name, path):
+    if not settings.MEDIA_PROBE_ASYNC:
+        probe_now(variant_item_id, file_name, path)
+        return
+
+    future = get_executor().submit(read_duration, path)
+    submitting_thread = threading.get_ident()
+
+    def on_done(done_future):
+        try:
+            duration_seconds = done_future.result()
+        except Exception:
+            logger.exception("探测视频时长失败: %s", path)
+            duration_seconds = None
+        try:
+            store_result(variant_item_id, file_name, duration_seconds)
+        finally:
+            # 回调通常运行在进程池的管理线程里，用完要关闭这个线程自己的数据库连接
+            if threading.get_ident() != submitting_thread:
+                connection.close()
+
+    future.add_done_callback(on_done)
+
+
+def schedule_probes(variant_items):
+    """事务提交后再提交探测任务，保证文件已经落盘、记录已经可见"""
+    jobs = [
+        (item.id, item.file.name, item.file.path)
+        for item in variant_items
+        if item.file
+    ]
+    if not jobs:
+        return
+
+    def submit_all():
+        for job in jobs:
+            submit_probe(*job)
+
+    transaction.on_commit(submit_all)
+
+
+def schedule_probe(variant_item):
+    schedule_probes([variant_item])
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from api import search
+
+    backend = search.get_backend(schema_editor.connection.vendor)
+    if backend is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        backend.create_table(cursor)
+        # 回填已有课程
+        Course = apps.get_model("api", "Course")
+        for course in Course.objects.select_related("category", "teacher").iterator():
+            backend.upsert(cursor, course.id, search.course_document(course))
+
+
+def drop_search_index(apps, schema_editor):
+    from api import search
+
+    backend = search.get_backend(schema_editor.connection.vendor)
+    if backend is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        backend.drop_table(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_course_review_order_item_date_id_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:14
+
+from django.db import migrations, models
+
+
+def mark_existing_items(apps, schema_editor):
+    # 之前的课时在保存时已经同步算过时长；有文件但没有时长的等待probe_media命令重新探测
+    VariantItem = apps.get_model("api", "VariantItem")
+    with_file = VariantItem.objects.exclude(file="").exclude(file__isnull=True)
+    with_file.filter(content_duration__isnull=False).update(probe_status="Completed")
+    with_file.filter(content_duration__isnull=True).update(probe_status="Pending")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_course_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='variantitem',
+            name='probe_status',
+            field=models.CharField(blank=True, choices=[('Pending', 'Pending'), ('Completed', 'Completed'), ('Failed', 'Failed')], max_length=20, null=True),
+        ),
+        migrations.RunPython(mark_existing_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from api import rollups
+
+
+def backfill_rollups(apps, schema_editor):
+    rollups.rebuild_rollups(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_course_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cartorder',
+            name='payment_status',
+            field=models.CharField(choices=[('Processing', 'Processing'), ('Paid', 'Paid'), ('Failed', 'Failed'), ('Refunded', 'Refunded')], default='Processing', max_length=100),
+        ),
+        migrations.CreateModel(
+            name='CourseDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('orders', models.IntegerField(default=0)),
+                ('new_students', models.IntegerField(default=0)),
+                ('refunds', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('day', models.DateField()),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.course')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('course', 'day'), name='unique_course_daily_stat')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CourseMonthlyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('orders', models.IntegerField(default=0)),
+                ('new_students', models.IntegerField(default=0)),
+                ('refunds', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('month', models.DateField()),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.course')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('course', 'month'), name='unique_course_monthly_stat')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TeacherDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('orders', models.IntegerField(default=0)),
+                ('new_students', models.IntegerField(default=0)),
+                ('refunds', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('day', models.DateField()),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.teacher')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('teacher', 'day'), name='unique_teacher_daily_stat')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TeacherMonthlyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('orders', models.IntegerField(default=0)),
+                ('new_students', models.IntegerField(default=0)),
+                ('refunds', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('month', models.DateField()),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.teacher')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('teacher', 'month'), name='unique_teacher_monthly_stat')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:34
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+from api import counters
+
+
+def remove_duplicate_enrollments(apps, schema_editor):
+    """加唯一约束之前，同一个订单项的重复报名只保留最早的一条"""
+    EnrolledCourse = apps.get_model("api", "EnrolledCourse")
+    duplicates = (
+        EnrolledCourse.objects.values("order_item")
+        .annotate(first_id=models.Min("id"), total=models.Count("id"))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    course_ids = set()
+    for row in duplicates:
+        extra = EnrolledCourse.objects.filter(order_item=row["order_item"]).exclude(
+            id=row["first_id"]
+        )
+        course_ids.update(extra.values_list("course_id", flat=True))
+        extra.delete()
+    if course_ids:
+        counters.rebuild_counters(course_ids, apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_sales_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FulfilmentJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Running', 'Running'), ('Completed', 'Completed'), ('Failed', 'Failed')], default='Pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated', models.DateTimeField(default=django.utils.timezone.now)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(remove_duplicate_enrollments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='enrolledcourse',
+            constraint=models.UniqueConstraint(fields=('order_item',), name='unique_enrollment_per_order_item'),
+        ),
+        migrations.AddField(
+            model_name='fulfilmentjob',
+            name='order',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='fulfilment_job', to='api.cartorder'),
+        ),
+        migrations.AddIndex(
+            model_name='fulfilmentjob',
+            index=models.Index(fields=['status', 'updated'], name='fulfilmentjob_status_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:41
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_fulfilment_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(choices=[('stripe', 'Stripe'), ('paypal', 'PayPal'), ('alipay', 'Alipay')], max_length=20)),
+                ('event_id', models.CharField(max_length=255)),
+                ('event_type', models.CharField(blank=True, max_length=100, null=True)),
+                ('result', models.CharField(choices=[('paid', 'Paid'), ('already_paid', 'Already Paid'), ('ignored', 'Ignored'), ('order_not_found', 'Order Not Found'), ('amount_mismatch', 'Amount Mismatch')], max_length=30)),
+                ('payload', models.JSONField(default=dict)),
+                ('date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.cartorder')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('provider', 'event_id'), name='unique_payment_event')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def remove_duplicate_completions(apps, schema_editor):
+    """加唯一约束之前，同一个学生同一个课时的重复完成记录只保留最早的一条"""
+    CompletedLesson = apps.get_model("api", "CompletedLesson")
+    duplicates = (
+        CompletedLesson.objects.filter(user__isnull=False)
+        .values("user", "variant_item")
+        .annotate(first_id=models.Min("id"), total=models.Count("id"))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for row in duplicates:
+        CompletedLesson.objects.filter(
+            user=row["user"], variant_item=row["variant_item"]
+        ).exclude(id=row["first_id"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_payment_events'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_completions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='completedlesson',
+            constraint=models.UniqueConstraint(fields=('user', 'variant_item'), name='unique_completed_lesson'),
+        ),
+    ]
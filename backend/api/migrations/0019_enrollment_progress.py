@@ -0,0 +1,94 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def count_subquery(queryset, group_by):
+    return Coalesce(
+        models.Subquery(
+            queryset.order_by()
+            .values(group_by)
+            .annotate(total=models.Count("pk"))
+            .values("total")[:1]
+        ),
+        0,
+    )
+
+
+def backfill_progress(apps, schema_editor):
+    """
+    按已有的课时和完成记录算出每条报名记录的进度。
+    和 api/progress.py 的 refresh() 是同样的两条UPDATE，这里单独写一份，只依赖历史模型，
+    以后修改 progress.py 不会影响这个迁移
+    """
+    CompletedLesson = apps.get_model("api", "CompletedLesson")
+    EnrolledCourse = apps.get_model("api", "EnrolledCourse")
+    VariantItem = apps.get_model("api", "VariantItem")
+
+    lectures = VariantItem.objects.filter(variant__course=models.OuterRef("course_id"))
+    completed = CompletedLesson.objects.filter(
+        user=models.OuterRef("user_id"),
+        course=models.OuterRef("course_id"),
+        variant_item__variant__course=models.OuterRef("course_id"),
+    )
+    enrollments = EnrolledCourse.objects.all()
+    enrollments.update(
+        total_lectures=count_subquery(lectures, "variant__course"),
+        completed_lessons=count_subquery(completed, "user"),
+        last_completed_lesson=models.Subquery(
+            completed.order_by("-date", "-id").values("variant_item")[:1]
+        ),
+    )
+    finished = models.Q(total_lectures__gt=0) & models.Q(
+        completed_lessons__gte=models.F("total_lectures")
+    )
+    enrollments.update(
+        progress_percent=models.Case(
+            models.When(total_lectures=0, then=0),
+            default=(models.F("completed_lessons") * 200 + models.F("total_lectures"))
+            / (models.F("total_lectures") * 2),
+        ),
+        completed_at=models.Case(
+            models.When(finished, then=models.Value(timezone.now())),
+            default=None,
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_completed_lesson_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrolledcourse',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='enrolledcourse',
+            name='completed_lessons',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='enrolledcourse',
+            name='last_completed_lesson',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.variantitem'),
+        ),
+        migrations.AddField(
+            model_name='enrolledcourse',
+            name='progress_percent',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='enrolledcourse',
+            name='total_lectures',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_progress, migrations.RunPython.noop),
+    ]
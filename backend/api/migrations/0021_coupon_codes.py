@@ -0,0 +1,42 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def rename_duplicate_codes(apps, schema_editor):
+    """加唯一约束之前，同一个教师的重名优惠券保留最早的一张，其余的代码后面加上 -<id>"""
+    Coupon = apps.get_model("api", "Coupon")
+    duplicates = (
+        Coupon.objects.filter(teacher__isnull=False)
+        .values("teacher", "code")
+        .annotate(first_id=models.Min("id"), total=models.Count("id"))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for row in duplicates:
+        for coupon in Coupon.objects.filter(
+            teacher=row["teacher"], code=row["code"]
+        ).exclude(id=row["first_id"]):
+            coupon.code = f"{coupon.code[:40]}-{coupon.id}"
+            coupon.save(update_fields=["code"])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_cart_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_codes, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='coupon',
+            name='single_use',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddConstraint(
+            model_name='coupon',
+            constraint=models.UniqueConstraint(fields=('code', 'teacher'), name='unique_teacher_coupon_code'),
+        ),
+    ]
@@ -1,12 +1,14 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils.text import slugify
 from django.utils import timezone
 
 from userauths.models import User, Profile
 
 from shortuuid.django_fields import ShortUUIDField
-from moviepy import VideoFileClip
-import math
+
+from api import counters
+from api import media_probe
+from api import progress
 
 # 像这里的元组，最外层是元组也可以是列表，但是秉承着元组不可改变的性质，用来当作配置项再合适不过了，所以最外层一般用元组
 # 然后里面的一个个元组项，其中元组的第一项会存到数据库当中，也就是对应的default中的值；第二项用于在Django后台管理界面或表单中显示给用户看的友好名称，提升可读性和用户体验。
@@ -40,6 +42,30 @@ PAYMENT_STATUS = (
     ("Processing", "Processing"),  # 支付处理中
     ("Paid", "Paid"),  # 已支付
     ("Failed", "Failed"),  # 支付失败
+    ("Refunded", "Refunded"),  # 已退款
+)
+PAYMENT_PROVIDER = (
+    ("stripe", "Stripe"),
+    ("paypal", "PayPal"),
+    ("alipay", "Alipay"),
+)
+PAYMENT_EVENT_RESULT = (
+    ("paid", "Paid"),  # 订单因为这条通知变成了已支付
+    ("already_paid", "Already Paid"),  # 订单之前已经是已支付
+    ("ignored", "Ignored"),  # 和支付成功无关的事件
+    ("order_not_found", "Order Not Found"),  # 找不到对应的订单
+    ("amount_mismatch", "Amount Mismatch"),  # 支付金额和订单金额不一致，需要人工核对
+)
+FULFILMENT_STATUS = (
+    ("Pending", "Pending"),  # 等待执行
+    ("Running", "Running"),  # 执行中
+    ("Completed", "Completed"),  # 报名记录和通知已创建
+    ("Failed", "Failed"),  # 执行失败，等待重试
+)
+PROBE_STATUS = (
+    (media_probe.PROBE_PENDING, "Pending"),  # 等待后台探测视频时长
+    (media_probe.PROBE_COMPLETED, "Completed"),  # 已探测出时长
+    (media_probe.PROBE_FAILED, "Failed"),  # 文件无法解析
 )
 RATING = (
     (1, "1 Star"),
@@ -79,18 +105,20 @@ class Teacher(models.Model):
 
     # 🧐写这个方法有什么用？
     # 答：获取这个教师的所有学生（通过购买记录）
+    # 🧐为什么用self.cartorderitem_set而不是CartOrderItem.objects.filter(teacher=self)？
+    # 答：两者查询结果一样，但反向管理器会优先读取prefetch_related的缓存，列表页预加载后不会再逐个查询
     def students(self):
-        return CartOrderItem.objects.filter(teacher=self)
+        return self.cartorderitem_set.all()
 
     # 🧐写这个方法有什么用？
     # 答：获取这个教师的所有课程
     def courses(self):
-        return Course.objects.filter(teacher=self)
+        return self.course_set.all()
 
     # 🧐写这个方法有什么用？
-    # 答：获取这个教师的课程数量（用于统计）
+    # 答：获取这个教师的课程数量（用于统计），预加载过course_set时count()直接取缓存长度
     def review(self):
-        return Course.objects.filter(teacher=self).count()
+        return self.course_set.count()
 
 
 class Category(models.Model):
@@ -170,6 +198,22 @@ class Course(models.Model):
     slug = models.SlugField(unique=True, null=True, blank=True)
     date = models.DateTimeField(default=timezone.now)
 
+    # 🧐下面这几个字段为什么不直接从Review/EnrolledCourse实时统计？
+    # 答：每次序列化课程都做一次聚合太慢，这里冗余存储，由api/counters.py在评价、报名、订单项变化时增量维护，
+    # 出现偏差时可以执行 python manage.py rebuild_course_counters 重算
+    # editable=False：后台和序列化器里都是只读的，只能由api/counters.py修改
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)  # 有效评价的评分总和
+    review_count = models.PositiveIntegerField(default=0, editable=False)  # 有效评价数量
+    enrollment_count = models.PositiveIntegerField(default=0, editable=False)  # 报名人次
+    revenue = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0.00, editable=False
+    )  # 报名对应订单项的价格总和
+
+    class Meta:
+        # 🧐为什么要加这个联合索引？
+        # 答：课程列表使用 (date, id) 游标分页（见api/pagination.py），有索引时翻页是索引范围扫描
+        indexes = [models.Index(fields=["date", "id"], name="course_date_id_idx")]
+
     def __str__(self):
         return self.title
 
@@ -208,18 +252,28 @@ class Course(models.Model):
                 if update_fields:
                     kwargs['update_fields'] = list(update_fields) + ['slug']
             
+            # 🧐为什么已有记录默认不写统计字段？
+            # 答：统计字段由api/counters.py用F()原地加减，这个实例读出来之后可能已经有新的报名/评价，
+            # 整行保存会把旧的数字写回去（后台编辑、课程更新接口都会整行保存）
+            if (
+                kwargs.get("update_fields") is None
+                and not kwargs.get("force_insert")
+                and not self._state.adding
+            ):
+                kwargs["update_fields"] = counters.fields_without_counters(Course)
+
             # 执行正常保存
             super().save(*args, **kwargs)
 
     # 🧐写这个方法有什么用？
     # 答：获取购买了这个课程的所有学生
     def students(self):
-        return EnrolledCourse.objects.filter(course=self)
+        return self.enrolledcourse_set.all()
 
     # 🧐写这个方法有什么用？
     # 答：获取这个课程的课程大纲（章节列表）
     def curriculum(self):
-        return Variant.objects.filter(course=self)
+        return self.variant_set.all()
 
     # 🧐写这个方法有什么用？
     # 答：获取这个课程的所有讲座/视频
@@ -229,22 +283,23 @@ class Course(models.Model):
     # 🧐写这个方法有什么用？
     # 答：计算这个课程的平均评分
     def average_rating(self):
-        average_rating = Review.objects.filter(course=self, active=True).aggregate(
-            avg_rating=models.Avg("rating")
-        )
-        return average_rating[
-            "avg_rating"
-            # 因为得到的是一个键值对，例如：{'avg_rating': 34.35}，所以这里要通过：average_rating["avg_rating"]拿到计算得到的平均分数
-        ]
+        # 直接用冗余的评分总和/评价数量计算，不需要再查Review表；没有评价时返回None
+        if not self.review_count:
+            return None
+        return self.rating_sum / self.review_count
 
     # 🧐写这个方法有什么用？
     # 答：获取这个课程的评价总数
     def rating_count(self):
-        return Review.objects.filter(course=self, active=True).count()
+        return self.review_count
 
     # 🧐写这个方法有什么用？
     # 答：获取这个课程的所有评价
+    # 🧐active_reviews是哪来的？
+    # 答：是CourseSerializer.setup_eager_loading中Prefetch(to_attr="active_reviews")预加载的有效评价列表
     def reviews(self):
+        if hasattr(self, "active_reviews"):
+            return self.active_reviews
         return Review.objects.filter(course=self, active=True)
 
     # 显示当前课程是否已经在指定用户的购物车当中
@@ -320,6 +375,10 @@ class VariantItem(models.Model):
         max_length=1000, null=True, blank=True
     )  # 格式化的时长显示
     preview = models.BooleanField(default=False)  # 是否允许预览（免费观看）
+    # 视频时长由后台进程池探测（见api/media_probe.py），没有视频文件时为空
+    probe_status = models.CharField(
+        max_length=20, choices=PROBE_STATUS, null=True, blank=True
+    )
     variant_item_id = ShortUUIDField(
         unique=True, length=10, max_length=20, alphabet="1234567890"
     )
@@ -328,25 +387,44 @@ class VariantItem(models.Model):
     def __str__(self):
         return f"{self.variant.title} - {self.title}"  # "第1章 - Python基础"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记住从数据库读出来时的文件名，save时用来判断视频是否被替换
+        instance._saved_file_name = instance.__dict__.get("file")
+        return instance
+
+    def file_changed(self):
+        return (self.file.name or None) != (getattr(self, "_saved_file_name", None) or None)
+
     def save(self, *args, **kwargs):
+        """
+        🧐为什么这里不再直接计算视频时长？
+        答：读取视频时长很慢，这里只把状态标记为Pending，
+        事务提交后由后台进程池探测并写回 duration/content_duration（见api/media_probe.py）
+        """
+        update_fields = kwargs.get("update_fields")
+        needs_probe = self.file_changed() and (
+            update_fields is None or "file" in update_fields
+        )
+        if needs_probe:
+            self.duration = None
+            self.content_duration = None
+            self.probe_status = media_probe.PROBE_PENDING if self.file else None
+            if update_fields is not None:
+                kwargs["update_fields"] = list(update_fields) + [
+                    "duration",
+                    "content_duration",
+                    "probe_status",
+                ]
+
         super().save(
             *args, **kwargs
         )  # 必须要加这一行，否则你在admin页面中添加VariantItemjilu的时候，会添加不了。这行的意思是将记录保存到数据库中。
-        """自动计算视频时长"""
-        if self.file:
-            # 🧐为什么要加path？
-            # 答：.path获取文件在磁盘上的实际路径，VideoFileClip需要文件路径而不是Django对象
-            clip = VideoFileClip(self.file.path)
-            duration_seconds = clip.duration
-            minutes, seconds = divmod(
-                duration_seconds, 60
-            )  # 除法和取余，转换为分钟和秒
-            minutes = math.floor(minutes)
-            seconds = math.floor(seconds)
-
-            duration_text = f"{minutes}m {seconds}s"  # "5m 30s"
-            self.content_duration = duration_text
-            super().save(update_fields=["content_duration"])
+        self._saved_file_name = self.file.name
+
+        if needs_probe and self.file:
+            media_probe.schedule_probe(self)
 
 
 class Question_Answer(models.Model):
@@ -434,7 +512,13 @@ class Cart(models.Model):
     cart_id = ShortUUIDField(
         length=10, max_length=20, alphabet="1234567890"
     )  # 这里只要cart_id的最大长度不要超过20即可，就算只传递1位都不会报错，但是默认生辰的是6位的。
-    date = models.DateTimeField(default=timezone.now)
+    date = models.DateTimeField(default=timezone.now)  # 最近一次加入/更新的时间，过期清理以它为准
+
+    class Meta:
+        # 🧐为什么要索引？
+        # 答：购物车的所有查询都是 filter(cart_id=...)，加入购物车还要再按课程查一次；
+        # 匿名购物车的过期清理（api/carts.py）也按 cart_id 分组
+        indexes = [models.Index(fields=["cart_id", "course"], name="cart_cart_id_course_idx")]
 
     def __str__(self):
         return self.course.title
@@ -540,10 +624,28 @@ class CartOrderItem(models.Model):
 
     class Meta:
         ordering = ["-date"]
+        indexes = [
+            models.Index(fields=["date", "id"], name="cartorderitem_date_id_idx")
+        ]
 
     def __str__(self):
         return self.cart_order_item_id
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记住读出来时的价格，价格变化时同步课程收入（见api/counters.py）
+        counters.remember_state(
+            instance, counters.ORDER_ITEM_FIELDS, counters.order_item_state
+        )
+        return instance
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            counters.order_item_saved(self, adding)
+
 
 class Certificate(models.Model):
     """🎯 课程证书模型 - 学生完成课程后获得的证书"""
@@ -582,6 +684,16 @@ class CompletedLesson(models.Model):
 
     date = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        # 🧐为什么同一个学生的同一个课时只能有一条完成记录？
+        # 答：批量同步用 bulk_create(ignore_conflicts=True) 写入，
+        # 由唯一约束挡掉已经存在的记录，不用先逐条查询是否已完成
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "variant_item"], name="unique_completed_lesson"
+            )
+        ]
+
     def __str__(self):
         return self.course.title
 
@@ -612,9 +724,52 @@ class EnrolledCourse(models.Model):
     )
     date = models.DateTimeField(default=timezone.now)
 
+    # 🧐下面这几个字段为什么不直接用 lectures()/completed_lesson() 实时统计？
+    # 答：学生的课程列表只需要显示进度，不用把每个课时和完成记录都返回给前端；
+    # 由api/progress.py在完成记录和大纲变化时重算，出现偏差时可以执行 python manage.py rebuild_enrollment_progress
+    completed_lessons = models.PositiveIntegerField(default=0)  # 已完成课时数
+    total_lectures = models.PositiveIntegerField(default=0)  # 课程的课时总数
+    last_completed_lesson = models.ForeignKey(
+        "VariantItem",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )  # 最近一次标记完成的课时，用来“继续学习”
+    progress_percent = models.PositiveSmallIntegerField(default=0)  # 学习进度（0-100）
+    completed_at = models.DateTimeField(null=True, blank=True)  # 第一次学完全部课时的时间
+
+    class Meta:
+        # 🧐为什么一个订单项只能有一条报名记录？
+        # 答：支付回调可能重复到达、开通任务可能被重试，由数据库唯一约束保证同一笔购买只报名一次
+        constraints = [
+            models.UniqueConstraint(
+                fields=["order_item"], name="unique_enrollment_per_order_item"
+            )
+        ]
+
     def __str__(self):
         return self.course.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记住读出来时对课程报名人次/收入的贡献（见api/counters.py）
+        counters.remember_state(
+            instance, counters.ENROLLMENT_FIELDS, counters.enrollment_state
+        )
+        return instance
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            counters.enrollment_saved(self, adding)
+            if adding:
+                # 新报名的课程可能之前就学过一部分（比如重新购买），按实际记录算一次进度
+                progress.refresh(EnrolledCourse.objects.filter(pk=self.pk))
+                self.refresh_from_db(fields=progress.PROGRESS_FIELDS)
+
     def lectures(self):
         """获取课程的所有课时"""
         # 🧐为什么这里要用：variant__course？
@@ -683,12 +838,30 @@ class Review(models.Model):
     reply = models.CharField(max_length=1000, null=True, blank=True)  # 教师回复
     active = models.BooleanField(default=False)  # 是否显示（需要审核）
 
+    class Meta:
+        indexes = [models.Index(fields=["date", "id"], name="review_date_id_idx")]
+
     def __str__(self):
         return self.course.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记住读出来时对课程评分的贡献，active切换或评分修改时只更新差值（见api/counters.py）
+        counters.remember_state(instance, counters.REVIEW_FIELDS, counters.review_state)
+        return instance
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            counters.review_saved(self, adding)
+
     def profile(self):
-        """获取评价者的个人资料"""
-        return Profile.objects.get(user=self.user)
+        """获取评价者的个人资料，select_related("user__profile")之后不会再查询数据库"""
+        if self.user_id is None:
+            raise Profile.DoesNotExist("评价者账号已被删除")
+        return self.user.profile
 
 
 class Notification(models.Model):
@@ -747,6 +920,17 @@ class Coupon(models.Model):
     discount = models.IntegerField(default=1)  # 折扣百分比
     date = models.DateTimeField(default=timezone.now)
     active = models.BooleanField(default=False)  # 是否激活
+    # 🧐什么是一次性优惠券？
+    # 答：活动批量生成的优惠券（见api/coupons.py的generate_coupons），任何一个学生用过之后就不能再用
+    single_use = models.BooleanField(default=False)
+
+    class Meta:
+        # 🧐为什么是按教师唯一，而不是全局唯一？
+        # 答：不同教师可以各自创建同名的优惠券（比如都叫SAVE20），使用时按订单里的教师区分；
+        # 唯一约束同时也是索引，code 放在前面，只按代码查找时也能用上
+        constraints = [
+            models.UniqueConstraint(fields=["code", "teacher"], name="unique_teacher_coupon_code")
+        ]
 
     def __str__(self):
         return self.code
@@ -775,6 +959,127 @@ class Country(models.Model):
         return self.name
 
 
+class FulfilmentJob(models.Model):
+    """🎯 订单开通任务 - 订单支付成功后创建报名记录和通知，由后台执行（见api/fulfilment.py）"""
+
+    # 🧐为什么是OneToOne？
+    # 答：一个订单只需要开通一次，重复的支付回调拿到的是同一个任务
+    order = models.OneToOneField(
+        CartOrder, on_delete=models.CASCADE, related_name="fulfilment_job"
+    )
+    status = models.CharField(
+        max_length=20, choices=FULFILMENT_STATUS, default="Pending"
+    )
+    attempts = models.PositiveIntegerField(default=0)  # 已执行次数
+    last_error = models.TextField(null=True, blank=True)  # 最近一次失败的原因
+    date = models.DateTimeField(default=timezone.now)
+    updated = models.DateTimeField(default=timezone.now)  # 最近一次状态变化的时间
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # worker按状态和时间找出待执行、失败待重试、执行超时的任务
+        indexes = [
+            models.Index(fields=["status", "updated"], name="fulfilmentjob_status_idx")
+        ]
+
+    def __str__(self):
+        return f"{self.order} ({self.status})"
+
+
+class PaymentEvent(models.Model):
+    """🎯 支付回调事件 - Stripe/PayPal/支付宝的webhook通知，按服务商的事件ID去重（见api/webhooks.py）"""
+
+    provider = models.CharField(max_length=20, choices=PAYMENT_PROVIDER)
+    event_id = models.CharField(max_length=255)  # 服务商的事件ID（支付宝是notify_id）
+    event_type = models.CharField(max_length=100, null=True, blank=True)
+    order = models.ForeignKey(
+        CartOrder, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    result = models.CharField(max_length=30, choices=PAYMENT_EVENT_RESULT)
+    payload = models.JSONField(default=dict)  # 原始通知内容，方便排查
+    date = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # 🧐为什么要唯一约束？
+        # 答：服务商在没收到2xx时会重试推送同一个事件，同一个事件只处理一次
+        constraints = [
+            models.UniqueConstraint(
+                fields=["provider", "event_id"], name="unique_payment_event"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.event_id}"
+
+
+class SalesStat(models.Model):
+    """🎯 销售统计汇总（抽象模型）- 按天/按月预先汇总好的收入、订单数、新学生数、退款金额，维护方式见api/rollups.py"""
+
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)  # 收入（已扣除退款）
+    orders = models.IntegerField(default=0)  # 订单数
+    new_students = models.IntegerField(default=0)  # 第一次购买的学生数
+    refunds = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)  # 退款金额
+
+    class Meta:
+        abstract = True
+
+
+class TeacherDailyStat(SalesStat):
+    """🎯 教师每日销售统计"""
+
+    teacher = models.ForeignKey(Teacher, on_delete=models.CASCADE)
+    day = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["teacher", "day"], name="unique_teacher_daily_stat"
+            )
+        ]
+
+
+class TeacherMonthlyStat(SalesStat):
+    """🎯 教师每月销售统计，month 是当月1号"""
+
+    teacher = models.ForeignKey(Teacher, on_delete=models.CASCADE)
+    month = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["teacher", "month"], name="unique_teacher_monthly_stat"
+            )
+        ]
+
+
+class CourseDailyStat(SalesStat):
+    """🎯 课程每日销售统计"""
+
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    day = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["course", "day"], name="unique_course_daily_stat"
+            )
+        ]
+
+
+class CourseMonthlyStat(SalesStat):
+    """🎯 课程每月销售统计，month 是当月1号"""
+
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    month = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["course", "month"], name="unique_course_monthly_stat"
+            )
+        ]
+
+
 # 🎯 总结：这是一个完整的在线教育平台的数据模型
 # 主要包含：用户管理、课程管理、订单系统、学习进度追踪、评价系统、通知系统等功能
 # 核心流程：教师创建课程 -> 学生购买 -> 注册学习 -> 完成课时 -> 获得证书 -> 评价课程
@@ -0,0 +1,224 @@
+"""
+游标（keyset）分页
+
+🧐为什么不用DRF自带的PageNumberPagination？
+答：页码分页用的是 OFFSET，翻到越后面数据库要跳过的行越多，表到几十万行时越来越慢；
+而且翻页过程中有新数据插入时，页码分页会出现重复或遗漏。
+keyset分页记住上一页最后一行的 (date, id)，下一页直接用
+WHERE (date, id) < (上一页最后的date, 上一页最后的id) 查询，配合 (date, id) 索引，
+无论翻到第几页都是一次索引范围扫描，耗时和返回体积都是常数。
+
+🧐为什么不用DRF自带的CursorPagination？
+答：CursorPagination只用排序的第一个字段定位，遇到date相同的行要靠offset跳过，
+这里把 (date, id) 一起编码进游标，id作为决胜字段，游标是稳定的。
+
+为了兼容现有前端，只有请求带了 cursor 或 page_size 参数时才分页，
+不带参数时接口仍然返回完整列表。
+"""
+
+import base64
+import json
+
+from django.db import models
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    按 (date, id) 倒序的游标分页，最新的数据在前。
+    date_field 可以换成queryset上别的时间字段或注解（比如聚合出来的首次报名时间）
+    """
+
+    date_field = "date"
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    page_size = 20
+    max_page_size = 100
+    invalid_cursor_message = "无效的分页游标"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (
+            self.cursor_query_param not in request.query_params
+            and self.page_size_query_param not in request.query_params
+        ):
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        if cursor is None:
+            reverse = False
+        else:
+            position_date, position_id, reverse = cursor
+            date = self.date_field
+            if reverse:
+                # 往前翻页：取比游标“更新”的数据
+                queryset = queryset.filter(
+                    models.Q(**{f"{date}__gt": position_date})
+                    | models.Q(**{date: position_date, "id__gt": position_id})
+                )
+            else:
+                queryset = queryset.filter(
+                    models.Q(**{f"{date}__lt": position_date})
+                    | models.Q(**{date: position_date, "id__lt": position_id})
+                )
+
+        if reverse:
+            queryset = queryset.order_by(self.date_field, "id")
+        else:
+            queryset = queryset.order_by(f"-{self.date_field}", "-id")
+
+        # 多取一行，用来判断后面是否还有数据，避免额外的count查询
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + "=" * (-len(encoded) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+            position_date = parse_datetime(data["d"])
+            position_id = int(data["i"])
+            reverse = bool(data.get("r", False))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if position_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position_date, position_id, reverse
+
+    def encode_cursor(self, instance, reverse):
+        data = {"d": getattr(instance, self.date_field).isoformat(), "i": instance.id}
+        if reverse:
+            data["r"] = True
+        encoded = base64.urlsafe_b64encode(
+            json.dumps(data, separators=(",", ":")).encode("ascii")
+        ).decode("ascii")
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded.rstrip("="))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param
+            )
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class RankedPagination(KeysetPagination):
+    """
+    保持queryset原有顺序的分页，用于按相关度排好序的搜索结果。
+
+    🧐搜索为什么不用上面的 (date, id) 游标？
+    答：keyset游标要求按 (date, id) 排序，会把相关度排序丢掉，相关度又没法作为游标的位置，
+    所以游标里直接记偏移量。搜索结果的 OFFSET 要重新算一遍匹配和排序，翻得越深越慢，
+    不过搜索结果很少有人翻到几十页以后。
+    queryset本身没有排序时（没有搜索词）按最新的在前。
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (
+            self.cursor_query_param not in request.query_params
+            and self.page_size_query_param not in request.query_params
+        ):
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.offset = self.decode_offset(request)
+        if not queryset.ordered:
+            queryset = queryset.order_by(f"-{self.date_field}", "-id")
+
+        results = list(queryset[self.offset : self.offset + self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.has_previous = self.offset > 0
+        self.page = results[: self.page_size]
+        return self.page
+
+    def decode_offset(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return 0
+        try:
+            padded = encoded + "=" * (-len(encoded) % 4)
+            offset = int(json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))["o"])
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if offset < 0:
+            raise NotFound(self.invalid_cursor_message)
+        return offset
+
+    def encode_offset(self, offset):
+        encoded = base64.urlsafe_b64encode(
+            json.dumps({"o": offset}, separators=(",", ":")).encode("ascii")
+        ).decode("ascii")
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded.rstrip("="))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_offset(self.offset + self.page_size)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        previous = self.offset - self.page_size
+        if previous <= 0:
+            return remove_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param
+            )
+        return self.encode_offset(previous)
@@ -0,0 +1,134 @@
+"""
+报名记录的学习进度：completed_lessons、total_lectures、last_completed_lesson、progress_percent、completed_at
+
+🧐为什么要冗余存储？
+答：原来学生的课程列表对每条报名都要序列化全部课时和全部完成记录，
+前端再用 completed_lesson.length / lectures.length 算进度，课时一多，列表接口返回的数据量就非常大。
+把进度直接存在 EnrolledCourse 上之后，列表页只需要读几个普通的列。
+
+维护方式（和 api/counters.py 一样是冗余字段，但这里每次都按数据库里的实际记录重算，不做增量）：
+- refresh(queryset) 用两条 UPDATE 重算一批报名记录，第一条用子查询算出课时数/完成数/最后完成的课时，
+  第二条根据新的计数算百分比和完成时间；不管多少条报名都是两条SQL
+- 学生标记/取消完成课时（CompletedLesson 的写入）之后由视图调用 refresh_student()
+- 大纲变化（课时新增/删除，包括删除章节时的级联删除）由 api/signals.py 调用 refresh_course_on_commit()，
+  同一个事务里的多次变化合并成提交后的一次刷新
+- 新的报名记录在 EnrolledCourse.save() / 开通任务的 bulk_create 之后刷新
+- 出现偏差时可以执行 `python manage.py rebuild_enrollment_progress` 全部重算
+
+注意：这个模块会被 api/models.py 导入，模块顶层不能 import 模型。
+"""
+
+from django.apps import apps as global_apps
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+PROGRESS_FIELDS = (
+    "completed_lessons",
+    "total_lectures",
+    "last_completed_lesson",
+    "progress_percent",
+    "completed_at",
+)
+
+
+def count_subquery(queryset, group_by):
+    """相关子查询：queryset 按 group_by 分组后的记录数，没有记录时为 0"""
+    return Coalesce(
+        models.Subquery(
+            queryset.order_by()
+            .values(group_by)
+            .annotate(total=models.Count("pk"))
+            .values("total")[:1]
+        ),
+        0,
+    )
+
+
+def refresh(enrollments, apps=global_apps):
+    """按数据库里的课时和完成记录重算这些报名记录的学习进度"""
+    CompletedLesson = apps.get_model("api", "CompletedLesson")
+    VariantItem = apps.get_model("api", "VariantItem")
+
+    lectures = VariantItem.objects.filter(variant__course=models.OuterRef("course_id"))
+    # 只统计还在这门课大纲里的课时
+    completed = CompletedLesson.objects.filter(
+        user=models.OuterRef("user_id"),
+        course=models.OuterRef("course_id"),
+        variant_item__variant__course=models.OuterRef("course_id"),
+    )
+    enrollments.update(
+        total_lectures=count_subquery(lectures, "variant__course"),
+        completed_lessons=count_subquery(completed, "user"),
+        last_completed_lesson=models.Subquery(
+            completed.order_by("-date", "-id").values("variant_item")[:1]
+        ),
+    )
+    # UPDATE 里等号右边读到的是更新前的值，所以百分比要等上一条更新完再算
+    finished = models.Q(total_lectures__gt=0) & models.Q(
+        completed_lessons__gte=models.F("total_lectures")
+    )
+    enrollments.update(
+        # 整数四舍五入：(完成数 * 200 + 总数) / (总数 * 2)，和前端的 Math.round 一致
+        progress_percent=models.Case(
+            models.When(total_lectures=0, then=0),
+            default=(models.F("completed_lessons") * 200 + models.F("total_lectures"))
+            / (models.F("total_lectures") * 2),
+        ),
+        # 已经学完的保留第一次学完的时间
+        completed_at=models.Case(
+            models.When(
+                finished, then=Coalesce(models.F("completed_at"), models.Value(timezone.now()))
+            ),
+            default=None,
+        ),
+    )
+
+
+def refresh_student(user, course):
+    """学生在一门课程里标记/取消完成课时之后调用"""
+    from api.models import EnrolledCourse
+
+    refresh(EnrolledCourse.objects.filter(user=user, course=course))
+
+
+class CourseRefresh:
+    """事务提交后刷新的一组课程，同一个事务里只注册一次"""
+
+    def __init__(self):
+        self.course_ids = set()
+
+    def __call__(self):
+        from api.models import EnrolledCourse
+
+        refresh(EnrolledCourse.objects.filter(course_id__in=self.course_ids))
+
+
+def refresh_course_on_commit(course_id):
+    """
+    课程大纲变化后，刷新这门课所有报名记录的进度。
+
+    删除一个章节会级联删除它的所有课时，每个课时都会发出一次 post_delete；
+    这里把同一个事务里的课程合并到一个 on_commit 回调，提交后每门课只刷新一次。
+    """
+    if not course_id:
+        return
+    connection = transaction.get_connection()
+    if connection.in_atomic_block:
+        for _, callback, _ in connection.run_on_commit:
+            if isinstance(callback, CourseRefresh):
+                callback.course_ids.add(course_id)
+                return
+    callback = CourseRefresh()
+    callback.course_ids.add(course_id)
+    transaction.on_commit(callback)
+
+
+def rebuild_progress(course_ids=None, apps=global_apps):
+    """重算全部（或指定课程的）报名记录的学习进度，返回更新的报名数"""
+    EnrolledCourse = apps.get_model("api", "EnrolledCourse")
+    enrollments = EnrolledCourse.objects.all()
+    if course_ids is not None:
+        enrollments = enrollments.filter(course_id__in=course_ids)
+    refresh(enrollments, apps=apps)
+    return enrollments.count()
@@ -0,0 +1,76 @@
+"""
+SQL查询次数预算
+
+列表/详情这类接口很容易因为序列化器里的方法字段出现N+1查询，
+这里提供一个统计单次请求SQL次数的工具：
+
+- query_budget(limit): 上下文管理器，统计代码块内执行的SQL条数，超出预算时报警或抛异常
+- QueryBudgetMixin: 给APIView使用，设置类属性query_budget即可对整个请求生效
+
+是否抛异常由settings.API_QUERY_BUDGET_STRICT控制（默认跟随DEBUG），
+生产环境只记录warning日志，开发和测试环境直接抛QueryBudgetExceeded，方便在测试里断言。
+"""
+
+import logging
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """请求执行的SQL条数超出了预算"""
+
+
+class QueryCounter:
+    """挂在connection.execute_wrapper上的计数器，每执行一条SQL加一"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def query_budget(limit, label="", strict=None):
+    """
+    统计代码块内的SQL条数，用法：
+
+        with query_budget(15, label="CourseListAPIView") as counter:
+            ...
+        counter.count  # 实际执行的SQL条数
+    """
+    if strict is None:
+        strict = getattr(settings, "API_QUERY_BUDGET_STRICT", settings.DEBUG)
+
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        yield counter
+
+    if counter.count > limit:
+        message = f"{label or 'query_budget'} 执行了 {counter.count} 条SQL，超出预算 {limit} 条"
+        if strict:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class QueryBudgetMixin:
+    """
+    给APIView加上SQL条数预算，例如：
+
+        class CourseListAPIView(QueryBudgetMixin, generics.ListAPIView):
+            query_budget = 15
+    """
+
+    query_budget = None
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.query_budget is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        with query_budget(self.query_budget, label=self.__class__.__name__):
+            return super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,212 @@
+"""
+公开目录接口的响应缓存
+
+🧐为什么要缓存？
+答：分类列表、课程列表、课程详情都是 AllowAny，所有匿名访客看到的内容完全一样，
+但每次请求都要从数据库重新查询、序列化整棵嵌套的课程数据。
+
+缓存后端走 Django 的 cache 框架，别名是 settings.API_RESPONSE_CACHE_ALIAS，
+由 API_RESPONSE_CACHE_BACKEND 选择本地内存（locmem）、文件（file）或者 redis；
+redis 后端只要求服务端兼容 Redis 协议，本地开发可以用任意兼容的替代服务。
+标签版本号和缓存内容放在同一个后端里，所以后端必须在所有 worker 之间共享（默认 file）；
+用 locmem 时失效只对当前进程有效，check_backend() 会在非DEBUG环境下给出警告。
+
+🧐缓存怎么失效？
+答：每条缓存记录都带着若干“标签”（比如 course:12、teacher:3、course-list），
+写入时记下这些标签当时的版本号，读取时再比一次版本号，不一致就当作没命中。
+api/signals.py 在 Course、Variant、VariantItem、Review、Category、Teacher 等模型
+保存/删除时调用 invalidate() 更新相关标签的版本号，只有受影响的缓存会失效。
+用 queryset.update()/bulk_create() 绕过信号的地方需要自己调用 invalidate_course()。
+
+🧐登录用户怎么办？
+答：缓存里保存的永远是匿名版本（isInCart/isInWishlist 都是 False），
+命中之后再用当前用户的购物车和愿望单把这两个字段补上，所以缓存可以在所有用户之间共享。
+"""
+
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+# 课程数据里和当前用户有关的字段
+USER_FIELDS = ("isInCart", "isInWishlist")
+
+KEY_PREFIX = "api-response"
+TAG_PREFIX = "api-response-tag"
+
+
+def get_cache():
+    return caches[settings.API_RESPONSE_CACHE_ALIAS]
+
+
+def check_backend(app_configs=None, **kwargs):
+    """系统检查（manage.py check / 启动时）：生产环境不应该用进程内的 locmem 后端"""
+    backend = settings.CACHES[settings.API_RESPONSE_CACHE_ALIAS]["BACKEND"]
+    if (
+        settings.API_RESPONSE_CACHE_ENABLED
+        and not settings.DEBUG
+        and backend.endswith("LocMemCache")
+    ):
+        return [
+            checks.Warning(
+                "接口响应缓存使用了 locmem 后端，每个进程各有一份缓存，"
+                "多个 worker 时修改课程后其他 worker 最多会返回 API_RESPONSE_CACHE_TIMEOUT 秒的旧数据",
+                hint="设置 API_RESPONSE_CACHE_BACKEND=file 或 redis，"
+                "或者用 API_RESPONSE_CACHE_ENABLED=False 关闭缓存",
+                id="api.W001",
+            )
+        ]
+    return []
+
+
+def tag_key(tag):
+    return f"{TAG_PREFIX}:{tag}"
+
+
+def new_version():
+    return uuid.uuid4().hex
+
+
+def current_versions(tags):
+    """读取标签的当前版本号，没有版本号的标签新建一个"""
+    cache = get_cache()
+    keys = {tag_key(tag): tag for tag in tags}
+    versions = cache.get_many(keys)
+    for key in keys.keys() - versions.keys():
+        # add 不会覆盖别的进程刚刚写入的版本号
+        cache.add(key, new_version(), None)
+    if len(versions) < len(keys):
+        versions = cache.get_many(keys)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def bump(tags):
+    get_cache().set_many({tag_key(tag): new_version() for tag in tags}, None)
+
+
+def invalidate(*tags):
+    """让带有这些标签的缓存失效；在事务中调用时，等事务提交后再失效，避免缓存到提交前的旧数据"""
+    tags = {tag for tag in tags if tag}
+    if tags:
+        transaction.on_commit(lambda: bump(tags))
+
+
+def invalidate_course(course_id, teacher_id=None):
+    """一门课程的数据发生了变化（课程本身、章节、课时、评价……）"""
+    invalidate(
+        "course-list",
+        f"course:{course_id}",
+        f"teacher:{teacher_id}" if teacher_id else None,
+    )
+
+
+def get_entry(key):
+    """取出缓存的响应数据，标签版本号对不上时返回None"""
+    cache = get_cache()
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    content, versions = entry
+    current = cache.get_many([tag_key(tag) for tag in versions])
+    for tag, version in versions.items():
+        if current.get(tag_key(tag)) != version:
+            return None
+    return json.loads(content)
+
+
+def set_entry(key, data, tags):
+    content = JSONRenderer().render(data)
+    get_cache().set(
+        key, (content, current_versions(tags)), settings.API_RESPONSE_CACHE_TIMEOUT
+    )
+
+
+def iter_course_payloads(data):
+    """找出响应数据里所有带用户字段的课程（列表、分页结果或者单个课程）"""
+    if isinstance(data, list):
+        for item in data:
+            yield from iter_course_payloads(item)
+    elif isinstance(data, dict):
+        if "results" in data and "isInCart" not in data:
+            yield from iter_course_payloads(data["results"])
+        elif "isInCart" in data:
+            yield data
+
+
+def reset_user_fields(data):
+    for course in iter_course_payloads(data):
+        for field in USER_FIELDS:
+            course[field] = False
+    return data
+
+
+def merge_user_fields(data, user):
+    """把当前用户的购物车/愿望单状态写回课程数据"""
+    from api import models as api_models
+    from api import serializer as api_serializer
+
+    courses = list(iter_course_payloads(data))
+    if not courses:
+        return data
+    cart_ids = api_serializer.user_course_ids(user, api_models.Cart)
+    wishlist_ids = api_serializer.user_course_ids(user, api_models.Wishlist)
+    for course in courses:
+        # ?fields= 可能没有要 id（见api/sparse.py），这时用户字段保持缓存里的 False
+        if "id" not in course:
+            continue
+        course["isInCart"] = course["id"] in cart_ids
+        course["isInWishlist"] = course["id"] in wishlist_ids
+    return data
+
+
+class ResponseCacheMixin:
+    """
+    给只读的APIView加上响应缓存，例如：
+
+        class CourseDetailAPIView(ResponseCacheMixin, generics.RetrieveAPIView):
+            def get_cache_tags(self, data):
+                return [f"course:{data['id']}"]
+
+    缓存键由 接口名 + 完整URL（含排好序的查询参数）+ 是否匿名 组成。
+    """
+
+    def get_cache_tags(self, data):
+        return []
+
+    def get_cache_key(self, request):
+        params = sorted(request.query_params.lists())
+        raw = json.dumps(
+            [request.get_host(), request.path, params], ensure_ascii=False
+        )
+        digest = hashlib.md5(raw.encode("utf-8")).hexdigest()
+        audience = "user" if request.user.is_authenticated else "anon"
+        return f"{KEY_PREFIX}:{self.__class__.__name__}:{audience}:{digest}"
+
+    def get(self, request, *args, **kwargs):
+        if not settings.API_RESPONSE_CACHE_ENABLED:
+            return super().get(request, *args, **kwargs)
+
+        key = self.get_cache_key(request)
+        data = get_entry(key)
+        if data is not None:
+            cache_status = "HIT"
+        else:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            # 转成普通的dict/list，既能放进任何缓存后端，也方便下面修改用户字段
+            data = reset_user_fields(
+                json.loads(JSONRenderer().render(response.data))
+            )
+            set_entry(key, data, self.get_cache_tags(data))
+            cache_status = "MISS"
+
+        if request.user.is_authenticated:
+            data = merge_user_fields(data, request.user)
+        return Response(data, headers={"X-Cache": cache_status})
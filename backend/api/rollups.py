@@ -0,0 +1,358 @@
+"""
+教师/课程的销售统计汇总表：TeacherDailyStat、TeacherMonthlyStat、CourseDailyStat、CourseMonthlyStat
+
+🧐为什么要汇总表？
+答：原来的每月收入接口每次请求都要把教师所有已支付的订单项按 ExtractMonth/ExtractYear 分组求和，
+订单越多越慢（而且只按月份排序，不同年份的同一个月会混在一起）。
+现在订单变成 Paid 的那一刻，就把这笔订单的收入、订单数、新学生数累加到对应的天和月上。
+查询任意日期范围时，整月的部分读月表，首尾不满一个月的部分读日表，
+读取的行数只和时间桶的数量有关，和订单数量无关。
+
+维护方式：
+- 订单从 Processing 变成 Paid 要走 mark_order_paid()（PaymentSuccessAPIView 调用），
+  条件 UPDATE 保证同一个订单的支付回调重复到达时只统计一次
+- 退款走 mark_order_refunded()（后台 CartOrder 的“标记为退款”操作），
+  收入和订单数从原来那一天扣掉，退款金额记在同一天；新学生数不扣回
+- 统计按订单项的 date 归到本地时区（settings.TIME_ZONE）的日期
+- 历史数据或者直接改数据库造成的偏差，执行 `python manage.py rebuild_sales_rollups` 重新计算
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.apps import apps as global_apps
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import serializers
+
+STAT_FIELDS = ("revenue", "orders", "new_students", "refunds")
+
+# 付过款的订单，退款的订单也算（用来判断是不是第一次购买）
+PAID_STATUSES = ("Paid", "Refunded")
+
+
+def rollup_models(apps=global_apps):
+    """{统计对象: (日表, 月表)}，apps 参数让迁移可以传入历史模型"""
+    return {
+        "teacher": (
+            apps.get_model("api", "TeacherDailyStat"),
+            apps.get_model("api", "TeacherMonthlyStat"),
+        ),
+        "course": (
+            apps.get_model("api", "CourseDailyStat"),
+            apps.get_model("api", "CourseMonthlyStat"),
+        ),
+    }
+
+
+def empty_totals():
+    return {
+        "revenue": Decimal("0.00"),
+        "orders": 0,
+        "new_students": 0,
+        "refunds": Decimal("0.00"),
+    }
+
+
+def add_totals(target, row):
+    for field in STAT_FIELDS:
+        target[field] += row[field] or 0
+    return target
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def local_day(value):
+    """订单项时间对应的本地日期，和数据库里 TruncDate 的结果一致"""
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+# ---------------------------------------
+# 增量维护
+
+
+def add_to_bucket(model, key, deltas):
+    """给一个时间桶加上差值，行不存在时创建；并发创建撞上唯一约束时改成更新"""
+    values = {field: models.F(field) + delta for field, delta in deltas.items() if delta}
+    if not values:
+        return
+    if model.objects.filter(**key).update(**values):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **deltas)
+    except IntegrityError:
+        model.objects.filter(**key).update(**values)
+
+
+def order_deltas(order, sign):
+    """
+    一个订单对各个时间桶的贡献：{("teacher", 教师id, 日期): {"revenue": ..., ...}, ("course", 课程id, 日期): {...}}
+    sign=1 是支付，sign=-1 是退款
+    """
+    from api.models import CartOrderItem
+
+    items = list(
+        CartOrderItem.objects.filter(order=order).values(
+            "teacher_id", "course_id", "price", "date"
+        )
+    )
+    returning = set()
+    if sign > 0 and order.student_id:
+        # 这个学生在别的订单里买过的教师和课程，一条查询取出来
+        previous = (
+            CartOrderItem.objects.filter(
+                order__student_id=order.student_id,
+                order__payment_status__in=PAID_STATUSES,
+            )
+            .exclude(order=order)
+            .filter(
+                models.Q(teacher_id__in={item["teacher_id"] for item in items})
+                | models.Q(course_id__in={item["course_id"] for item in items})
+            )
+            .values_list("teacher_id", "course_id")
+            .distinct()
+        )
+        for teacher_id, course_id in previous:
+            returning.update({("teacher", teacher_id), ("course", course_id)})
+
+    deltas = defaultdict(lambda: dict.fromkeys(STAT_FIELDS, 0))
+    counted = set()
+    for item in items:
+        day = local_day(item["date"])
+        for owner in (("teacher", item["teacher_id"]), ("course", item["course_id"])):
+            bucket = deltas[(*owner, day)]
+            bucket["revenue"] += sign * item["price"]
+            if sign < 0:
+                bucket["refunds"] += item["price"]
+            # 一个订单里同一个教师的多门课程只算一个订单
+            if owner in counted:
+                continue
+            counted.add(owner)
+            bucket["orders"] += sign
+            if sign > 0 and order.student_id and owner not in returning:
+                bucket["new_students"] += 1
+    return deltas
+
+
+def apply_order(order, sign):
+    models_by_owner = rollup_models()
+    for (owner, owner_id, day), values in order_deltas(order, sign).items():
+        daily, monthly = models_by_owner[owner]
+        add_to_bucket(daily, {f"{owner}_id": owner_id, "day": day}, values)
+        add_to_bucket(monthly, {f"{owner}_id": owner_id, "month": month_start(day)}, values)
+
+
+def transition_order(order, from_status, to_status, sign):
+    from api.models import CartOrder
+
+    with transaction.atomic():
+        # 条件UPDATE：并发的请求里只有一个能把状态改掉，只有它会去累加统计
+        changed = CartOrder.objects.filter(
+            id=order.id, payment_status=from_status
+        ).update(payment_status=to_status)
+        if changed:
+            order.payment_status = to_status
+            apply_order(order, sign)
+    return bool(changed)
+
+
+def mark_order_paid(order):
+    """把订单从 Processing 改成 Paid 并累加统计，返回状态是否真的发生了变化"""
+    return transition_order(order, "Processing", "Paid", 1)
+
+
+def mark_order_refunded(order):
+    """把订单从 Paid 改成 Refunded 并扣减统计，返回状态是否真的发生了变化"""
+    return transition_order(order, "Paid", "Refunded", -1)
+
+
+# ---------------------------------------
+# 全量重算
+
+
+def rebuild_rollups(teacher_ids=None, apps=global_apps):
+    """
+    根据订单项重新生成汇总表，返回生成的日表行数。
+    每种统计是两条 GROUP BY 查询（按天的收入/订单/退款，按学生的首次购买时间），月表由日表累加得到。
+    """
+    CartOrderItem = apps.get_model("api", "CartOrderItem")
+    Course = apps.get_model("api", "Course")
+
+    items = CartOrderItem.objects.filter(order__payment_status__in=PAID_STATUSES)
+    scopes = {"teacher": items, "course": items}
+    if teacher_ids is not None:
+        scopes = {
+            "teacher": items.filter(teacher_id__in=teacher_ids),
+            "course": items.filter(course__teacher_id__in=teacher_ids),
+        }
+
+    paid = models.Q(order__payment_status="Paid")
+    daily_rows = defaultdict(empty_totals)
+    for owner, queryset in scopes.items():
+        sales = (
+            queryset.annotate(day=TruncDate("date"))
+            .values(owner, "day")
+            .annotate(
+                revenue=models.Sum("price", filter=paid),
+                orders=models.Count("order", distinct=True, filter=paid),
+                refunds=models.Sum(
+                    "price", filter=models.Q(order__payment_status="Refunded")
+                ),
+            )
+            .order_by()
+        )
+        for row in sales:
+            bucket = daily_rows[(owner, row[owner], row["day"])]
+            bucket["revenue"] = row["revenue"] or Decimal("0.00")
+            bucket["orders"] = row["orders"]
+            bucket["refunds"] = row["refunds"] or Decimal("0.00")
+
+        firsts = (
+            queryset.filter(order__student__isnull=False)
+            .values(owner, "order__student")
+            .annotate(first=models.Min("date"))
+            .order_by()
+        )
+        for row in firsts:
+            daily_rows[(owner, row[owner], local_day(row["first"]))]["new_students"] += 1
+
+    monthly_rows = defaultdict(empty_totals)
+    for (owner, owner_id, day), values in daily_rows.items():
+        add_totals(monthly_rows[(owner, owner_id, month_start(day))], values)
+
+    models_by_owner = rollup_models(apps)
+    with transaction.atomic():
+        for owner, (daily, monthly) in models_by_owner.items():
+            for model in (daily, monthly):
+                stale = model.objects.all()
+                if teacher_ids is not None:
+                    if owner == "teacher":
+                        stale = stale.filter(teacher_id__in=teacher_ids)
+                    else:
+                        stale = stale.filter(
+                            course__in=Course.objects.filter(teacher_id__in=teacher_ids)
+                        )
+                stale.delete()
+
+        for rows, index, period in ((daily_rows, 0, "day"), (monthly_rows, 1, "month")):
+            by_model = defaultdict(list)
+            for (owner, owner_id, bucket), values in rows.items():
+                model = models_by_owner[owner][index]
+                by_model[model].append(
+                    model(**{f"{owner}_id": owner_id, period: bucket}, **values)
+                )
+            for model, objs in by_model.items():
+                model.objects.bulk_create(objs)
+    return len(daily_rows)
+
+
+# ---------------------------------------
+# 查询
+
+
+def date_range(params):
+    """从查询参数 ?start=2024-01-01&end=2024-03-31 读取日期范围（闭区间），不传表示不限"""
+    values = []
+    for name in ("start", "end"):
+        raw = params.get(name)
+        try:
+            value = parse_date(raw) if raw else None
+        except ValueError:
+            value = None
+        if raw and value is None:
+            raise serializers.ValidationError({name: "日期格式应为 YYYY-MM-DD"})
+        values.append(value)
+    start, end = values
+    if start and end and start > end:
+        raise serializers.ValidationError({"end": "结束日期不能早于开始日期"})
+    return start, end
+
+
+def range_filters(start, end):
+    """
+    把 [start, end] 拆成整月的部分（读月表）和首尾零散的天（读日表），
+    返回 (月表过滤条件, 日表过滤条件)，不需要查的一边是 None
+    """
+    # 第一个完整的月，和最后一个完整的月的下一个月
+    first_month = start if start is None or start.day == 1 else next_month(start)
+    if end is None:
+        stop_month = None
+    elif end + timedelta(days=1) == next_month(end):
+        stop_month = next_month(end)
+    else:
+        stop_month = month_start(end)
+
+    if first_month and stop_month and first_month >= stop_month:
+        return None, models.Q(day__range=(start, end))
+
+    month_q = models.Q()
+    if first_month:
+        month_q &= models.Q(month__gte=first_month)
+    if stop_month:
+        month_q &= models.Q(month__lt=stop_month)
+
+    day_ranges = []
+    if start and start != first_month:
+        day_ranges.append((start, first_month - timedelta(days=1)))
+    if stop_month and stop_month <= end:
+        day_ranges.append((stop_month, end))
+    day_q = None
+    for day_range in day_ranges:
+        q = models.Q(day__range=day_range)
+        day_q = q if day_q is None else day_q | q
+    return month_q, day_q
+
+
+def sales_totals(owner, start=None, end=None, group_by=None, **filters):
+    """
+    日期范围 [start, end] 内的销售合计，例如 sales_totals("teacher", teacher=teacher)；
+    group_by="course" 时按课程分组，返回 {课程id: 合计}
+    """
+    daily, monthly = rollup_models()[owner]
+    month_q, day_q = range_filters(start, end)
+    querysets = []
+    if month_q is not None:
+        querysets.append(monthly.objects.filter(month_q, **filters))
+    if day_q is not None:
+        querysets.append(daily.objects.filter(day_q, **filters))
+
+    sums = {field: models.Sum(field) for field in STAT_FIELDS}
+    totals = defaultdict(empty_totals)
+    for queryset in querysets:
+        if group_by:
+            rows = queryset.values(group_by).annotate(**sums).order_by()
+        else:
+            rows = [queryset.aggregate(**sums)]
+        for row in rows:
+            add_totals(totals[row.get(group_by)], row)
+    if group_by:
+        return dict(totals)
+    return totals[None]
+
+
+def monthly_series(teacher, start=None, end=None):
+    """教师每个月的销售数据 [(当月1号, 合计), ...]，按年月排序；首尾不满一个月的部分由日表汇总"""
+    daily, monthly = rollup_models()["teacher"]
+    month_q, day_q = range_filters(start, end)
+    months = defaultdict(empty_totals)
+    if month_q is not None:
+        for row in monthly.objects.filter(month_q, teacher=teacher).values(
+            "month", *STAT_FIELDS
+        ):
+            add_totals(months[row["month"]], row)
+    if day_q is not None:
+        for row in daily.objects.filter(day_q, teacher=teacher).values(
+            "day", *STAT_FIELDS
+        ):
+            add_totals(months[month_start(row["day"])], row)
+    return sorted(months.items())
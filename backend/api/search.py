@@ -0,0 +1,240 @@
+"""
+课程全文搜索
+
+🧐为什么不继续用 title__icontains？
+答：icontains 会被翻译成 LIKE '%xxx%'，前面有通配符用不上索引，每次搜索都是全表扫描，
+而且只搜标题，搜不到描述、分类和老师名字。
+
+这里维护一张独立的倒排索引表（和 api_course 一一对应，course_id 为主键）：
+- SQLite：FTS5 虚拟表 api_course_search，bm25() 排序
+- PostgreSQL：api_course_search 表的 tsvector 列 + GIN 索引，ts_rank() 排序
+- 其他数据库：退回 icontains
+
+索引内容是 Course.title、Course.description、Category.title、Teacher.full_name，
+由 api/signals.py 在课程/分类/教师保存和删除时增量更新，
+历史数据在迁移 0012 中回填，也可以调用 rebuild_index() 重建。
+
+中文没有空格分词，这里把每个中日韩字符拆成单独的词（unigram），
+查询时再把连续的汉字拼成短语，这样“基础”能匹配到“Python基础教程”。
+所有查询词都做前缀匹配，输入 "pyth" 就能搜到 "Python"。
+"""
+
+import re
+
+from django.db import connection
+
+from api import models as api_models
+
+SEARCH_TABLE = "api_course_search"
+
+# 中日韩字符（汉字、假名、谚文）
+CJK_PATTERN = re.compile(
+    r"([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff])"
+)
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def segment(text):
+    """在每个中日韩字符两边加空格，让分词器把它们当成独立的词"""
+    return CJK_PATTERN.sub(r" \1 ", text or "")
+
+
+def query_terms(query):
+    """
+    把用户输入拆成查询词，每个词是一个token列表：
+    "Python 基础" -> [["python"], ["基", "础"]]
+    """
+    terms = []
+    # \w+ 会把相邻的汉字连成一个词，再拆成单字后作为短语一起匹配
+    for word in WORD_PATTERN.findall((query or "").lower()):
+        tokens = segment(word).split()
+        if tokens:
+            terms.append(tokens)
+    return terms
+
+
+def course_document(course):
+    """生成需要写入索引的各个字段"""
+    return {
+        "title": segment(course.title),
+        "description": segment(course.description),
+        "category": segment(course.category.title if course.category else ""),
+        "teacher": segment(course.teacher.full_name if course.teacher else ""),
+    }
+
+
+class SqliteSearchBackend:
+    """SQLite FTS5 倒排索引"""
+
+    def create_table(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            "title, description, category, teacher, "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+
+    def drop_table(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+    def upsert(self, cursor, course_id, document):
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [course_id])
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, title, description, category, teacher) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [
+                course_id,
+                document["title"],
+                document["description"],
+                document["category"],
+                document["teacher"],
+            ],
+        )
+
+    def delete(self, cursor, course_id):
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [course_id])
+
+    def match_expression(self, terms):
+        # 每个词写成带引号的短语再加 * 做前缀匹配，引号同时避免了 FTS5 语法注入
+        return " ".join('"{}"*'.format(" ".join(tokens)) for tokens in terms)
+
+    def rank(self, queryset, terms):
+        # bm25 的权重依次对应 title, description, category, teacher；分数越小越相关
+        table = queryset.model._meta.db_table
+        return queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=[f"{SEARCH_TABLE}.rowid = {table}.id", f"{SEARCH_TABLE} MATCH %s"],
+            params=[self.match_expression(terms)],
+            select={"search_rank": f"bm25({SEARCH_TABLE}, 10.0, 2.0, 4.0, 4.0)"},
+        ).order_by("search_rank", "-id")
+
+
+class PostgresSearchBackend:
+    """PostgreSQL tsvector + GIN 倒排索引"""
+
+    def create_table(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+            "course_id bigint PRIMARY KEY REFERENCES api_course(id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_gin "
+            f"ON {SEARCH_TABLE} USING GIN (document)"
+        )
+
+    def drop_table(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+    def upsert(self, cursor, course_id, document):
+        # setweight 的 A/B/C 对应 ts_rank 的权重，标题最重要
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (course_id, document) VALUES (%s, "
+            "setweight(to_tsvector('simple', %s), 'A') || "
+            "setweight(to_tsvector('simple', %s), 'C') || "
+            "setweight(to_tsvector('simple', %s), 'B') || "
+            "setweight(to_tsvector('simple', %s), 'B')) "
+            "ON CONFLICT (course_id) DO UPDATE SET document = EXCLUDED.document",
+            [
+                course_id,
+                document["title"],
+                document["description"],
+                document["category"],
+                document["teacher"],
+            ],
+        )
+
+    def delete(self, cursor, course_id):
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE course_id = %s", [course_id])
+
+    def match_expression(self, terms):
+        # 连续汉字用 <-> 表示相邻，最后一个token加 :* 做前缀匹配
+        return " & ".join(
+            "({}:*)".format(" <-> ".join(tokens)) for tokens in terms
+        )
+
+    def rank(self, queryset, terms):
+        table = queryset.model._meta.db_table
+        expression = self.match_expression(terms)
+        return queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=[
+                f"{SEARCH_TABLE}.course_id = {table}.id",
+                f"{SEARCH_TABLE}.document @@ to_tsquery('simple', %s)",
+            ],
+            params=[expression],
+            select={
+                "search_rank": f"ts_rank({SEARCH_TABLE}.document, to_tsquery('simple', %s))"
+            },
+            select_params=[expression],
+        ).order_by("-search_rank", "-id")
+
+
+BACKENDS = {
+    "sqlite": SqliteSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+def get_backend(vendor=None):
+    """根据数据库类型选择索引实现，不支持的数据库返回None"""
+    backend_class = BACKENDS.get(vendor or connection.vendor)
+    return backend_class() if backend_class else None
+
+
+def index_course(course):
+    """新增或更新一门课程的索引"""
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        backend.upsert(cursor, course.id, course_document(course))
+
+
+def index_courses(courses):
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        for course in courses:
+            backend.upsert(cursor, course.id, course_document(course))
+
+
+def remove_course(course_id):
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        backend.delete(cursor, course_id)
+
+
+def rebuild_index():
+    """清空并重建整个索引"""
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        backend.drop_table(cursor)
+        backend.create_table(cursor)
+    index_courses(
+        api_models.Course.objects.select_related("category", "teacher").iterator()
+    )
+
+
+def search_courses(queryset, query):
+    """
+    在queryset范围内搜索课程，按相关度排序（相关度相同时新课程在前）
+
+    🧐为什么不先从索引里取出课程id再 id__in 过滤？
+    答：那样要给id列表设上限（否则热门词会把整张表的id都取出来、拼出巨大的 Case/When），
+    超过上限的结果就悄悄丢掉了。现在倒排索引表直接和课程表JOIN，匹配、过滤、排序在一条SQL里完成，
+    分页时 LIMIT/OFFSET 也在同一条SQL里，匹配多少门课程都能翻到
+    """
+    terms = query_terms(query)
+    if not terms:
+        return queryset
+
+    backend = get_backend()
+    if backend is None:
+        return queryset.filter(title__icontains=query)
+
+    return backend.rank(queryset, terms)
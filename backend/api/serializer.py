@@ -6,9 +6,13 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rich.console import Console
 
 from userauths.models import User, Profile
+from django.conf import settings
 from django.contrib.auth.password_validation import validate_password
 
 from api import models as api_models
+from api import sparse
+from api.sparse import SparseModelSerializer
+from django.db import models
 
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
@@ -55,7 +59,7 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         return token
 
 
-class RegisterSerializer(serializers.ModelSerializer):
+class RegisterSerializer(SparseModelSerializer):
     password = serializers.CharField(
         write_only=True, required=True, validators=[validate_password]
     )
@@ -81,14 +85,14 @@ class RegisterSerializer(serializers.ModelSerializer):
         fields = ["full_name", "email", "password", "password2"]
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseModelSerializer):
 
     class Meta:
         model = User
         fields = "__all__"
 
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(SparseModelSerializer):
 
     class Meta:
         model = Profile
@@ -96,7 +100,7 @@ class ProfileSerializer(serializers.ModelSerializer):
 
 
 # ---------------------------------------
-class TeacherSerializer(serializers.ModelSerializer):
+class TeacherSerializer(SparseModelSerializer):
     """你可以很明显的看到,在models中,一些模型是有很多自定义函数的
     这些函数也要写到下面的fields中,如果不写,可以单拎出来,写到外面,
     它也会被自动加入到Meta的fields中
@@ -154,7 +158,7 @@ class TeacherSerializer(serializers.ModelSerializer):
         ]
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseModelSerializer):
     # 如果需要显示课程列表，使用简化的课程信息避免循环引用
     courses = serializers.SerializerMethodField()
 
@@ -186,7 +190,7 @@ class CategorySerializer(serializers.ModelSerializer):
         ]
 
 
-class VariantItemSerializer(serializers.ModelSerializer):
+class VariantItemSerializer(SparseModelSerializer):
 
     class Meta:
         model = api_models.VariantItem
@@ -198,13 +202,14 @@ class VariantItemSerializer(serializers.ModelSerializer):
             "file",
             "duration",
             "content_duration",
+            "probe_status",
             "preview",
             "variant_item_id",
             "date",
         ]
 
 
-class VariantSerializer(serializers.ModelSerializer):
+class VariantSerializer(SparseModelSerializer):
     variant_items = VariantItemSerializer(
         many=True
     )  # 实际上,这个field会自动加入到下面的Meta的fields中
@@ -222,7 +227,7 @@ class VariantSerializer(serializers.ModelSerializer):
             self.Meta.depth = 3
 
 
-class Question_Answer_MessageSerializer(serializers.ModelSerializer):
+class Question_Answer_MessageSerializer(SparseModelSerializer):
     profile = ProfileSerializer(many=False)
 
     class Meta:
@@ -230,7 +235,7 @@ class Question_Answer_MessageSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class Question_AnswerSerializer(serializers.ModelSerializer):
+class Question_AnswerSerializer(SparseModelSerializer):
     messages = Question_Answer_MessageSerializer(many=True)
     profile = ProfileSerializer(many=False)  # 🧐为什么这里是False？
     # 答：因为一个问答(Question_Answer)只关联一个用户的个人资料(Profile)，这是一对一的关系
@@ -251,21 +256,21 @@ class Question_AnswerSerializer(serializers.ModelSerializer):
             self.Meta.depth = 3
 
 
-class CertificateSerializer(serializers.ModelSerializer):
+class CertificateSerializer(SparseModelSerializer):
 
     class Meta:
         model = api_models.Certificate
         fields = "__all__"
 
 
-class NoteSerializer(serializers.ModelSerializer):
+class NoteSerializer(SparseModelSerializer):
 
     class Meta:
         model = api_models.Note
         fields = "__all__"
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseModelSerializer):
 
     profile = ProfileSerializer(
         many=False
@@ -284,7 +289,7 @@ class ReviewSerializer(serializers.ModelSerializer):
             self.Meta.depth = 3
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(SparseModelSerializer):
 
     class Meta:
         model = api_models.Notification
@@ -299,21 +304,43 @@ class NotificationSerializer(serializers.ModelSerializer):
             self.Meta.depth = 3
 
 
-class CouponSerializer(serializers.ModelSerializer):
+class CouponSerializer(SparseModelSerializer):
 
     class Meta:
         model = api_models.Coupon
         fields = "__all__"
 
+    def validate(self, attrs):
+        # 同一个教师的优惠券代码不能重复（数据库有唯一约束，这里提前返回可读的错误）
+        teacher = attrs.get("teacher", getattr(self.instance, "teacher", None))
+        code = attrs.get("code", getattr(self.instance, "code", None))
+        if teacher is not None and code:
+            duplicates = api_models.Coupon.objects.filter(teacher=teacher, code=code)
+            if self.instance is not None:
+                duplicates = duplicates.exclude(id=self.instance.id)
+            if duplicates.exists():
+                raise serializers.ValidationError({"code": "该优惠券代码已存在"})
+        return attrs
+
+
+class CouponBatchSerializer(serializers.Serializer):
+    """批量生成优惠券的请求参数（TeacherCouponListCreateAPIView）"""
+
+    quantity = serializers.IntegerField(min_value=1, max_value=settings.COUPON_BATCH_MAX)
+    discount = serializers.IntegerField(min_value=1, max_value=100)
+    prefix = serializers.CharField(max_length=20, required=False, default="")
+    # 默认不启用，教师确认活动开始后再启用
+    active = serializers.BooleanField(required=False, default=False)
 
-class CountrySerializer(serializers.ModelSerializer):
+
+class CountrySerializer(SparseModelSerializer):
 
     class Meta:
         model = api_models.Country
         fields = "__all__"
 
 
-class TeacherCourseListSerializer(serializers.ModelSerializer):
+class TeacherCourseListSerializer(SparseModelSerializer):
     # 自定义复杂字段的序列化
     teacher = serializers.SerializerMethodField()
     lectures_count = serializers.SerializerMethodField()
@@ -355,7 +382,40 @@ class TeacherCourseListSerializer(serializers.ModelSerializer):
         return None
 
 
-class CourseSerializer(serializers.ModelSerializer):
+def prefetched_lectures(course):
+    """
+    获取课程的所有课时：如果已经预加载了 variant_set__variant_items，就直接从缓存里拼出来，
+    否则退回到 course.lectures() 查询。按id排序，和 VariantItem.objects.filter(...) 的顺序保持一致
+    """
+    cache = getattr(course, "_prefetched_objects_cache", {})
+    if "variant_set" not in cache:
+        return course.lectures()
+    items = [item for variant in course.variant_set.all() for item in variant.variant_items.all()]
+    return sorted(items, key=lambda item: item.id)
+
+
+def user_course_ids(user, model):
+    """用户购物车（Cart）或愿望单（Wishlist）里的课程id集合，一条查询"""
+    if not user or not user.is_authenticated:
+        return set()
+    return set(model.objects.filter(user=user).values_list("course_id", flat=True))
+
+
+def context_course_ids(context, model):
+    """
+    🧐为什么要把id集合放在context里？
+    答：原来每序列化一门课程，isInCart和isInWishlist就各执行一次EXISTS查询。
+    context是整棵序列化器树共享的同一个dict（CartSerializer、WishlistSerializer等嵌套的
+    CourseSerializer也是），第一次用到时查一次当前用户的全部课程id，之后都从集合里判断。
+    """
+    key = f"{model._meta.model_name}_course_ids"
+    if key not in context:
+        request = context.get("request")
+        context[key] = user_course_ids(getattr(request, "user", None), model)
+    return context[key]
+
+
+class CourseSerializer(SparseModelSerializer):
     teacher = TeacherSerializer(many=False)  # 🧐为什么这里要这样？
     # 答：many=False是正确的，因为一个课程只属于一个教师(一对一关系)。
     # Course模型中teacher字段是外键，指向Teacher模型，每个课程只有一个教师，
@@ -390,8 +450,77 @@ class CourseSerializer(serializers.ModelSerializer):
             for student in students
         ]
 
+    @classmethod
+    def setup_eager_loading(cls, queryset, context=None, path=""):
+        """
+        一次性预加载序列化课程所需的全部关联数据
+
+        🧐为什么需要这个方法？
+        答：CourseSerializer里students、curriculum、lectures、average_rating、reviews
+        以及嵌套的TeacherSerializer都会访问关联表，不预加载的话每个课程都要查十几次数据库。
+        这里用select_related把一对一/外键关系JOIN进来，用prefetch_related把一对多关系
+        每种只查一次，模型方法（Course.reviews()、Course.students()等）会优先读取这些缓存；
+        平均分和评价数直接读Course上的冗余字段（见api/counters.py）。
+
+        传入序列化器的 context 时，只预加载 ?fields= 要求返回的关系（见api/sparse.py）；
+        path 是课程在序列化器树里的路径，例如购物车里的课程是 "course"，
+        对应的查询集是 Cart，关联查询都要加上 course__ 前缀。
+        """
+
+        def wanted(name):
+            return sparse.field_requested(context, sparse.join_path(path, name))
+
+        relation = path.replace(".", "__")
+
+        def lookup(name):
+            return f"{relation}__{name}" if relation else name
+
+        user_relations = ["groups", "user_permissions"]
+        if relation:
+            queryset = queryset.select_related(relation)
+        if wanted("category"):
+            queryset = queryset.select_related(lookup("category"))
+        if wanted("teacher"):
+            queryset = queryset.select_related(lookup("teacher__user"))
+            if wanted("teacher.user"):
+                queryset = queryset.prefetch_related(
+                    *[lookup(f"teacher__user__{name}") for name in user_relations]
+                )
+            if wanted("teacher.courses") or wanted("teacher.review"):
+                queryset = queryset.prefetch_related(lookup("teacher__course_set"))
+            if wanted("teacher.students"):
+                queryset = queryset.prefetch_related(
+                    models.Prefetch(
+                        lookup("teacher__cartorderitem_set"),
+                        queryset=api_models.CartOrderItem.objects.select_related("course"),
+                    )
+                )
+        if wanted("students"):
+            queryset = queryset.prefetch_related(
+                models.Prefetch(
+                    lookup("enrolledcourse_set"),
+                    queryset=api_models.EnrolledCourse.objects.select_related("user"),
+                )
+            )
+        if wanted("curriculum") or wanted("lectures"):
+            queryset = queryset.prefetch_related(lookup("variant_set__variant_items"))
+        if wanted("reviews"):
+            queryset = queryset.prefetch_related(
+                models.Prefetch(
+                    lookup("review_set"),
+                    queryset=api_models.Review.objects.filter(active=True)
+                    .select_related("user__profile")
+                    .prefetch_related(
+                        "user__groups__permissions",
+                        "user__user_permissions__content_type",
+                    ),
+                    to_attr="active_reviews",
+                )
+            )
+        return queryset
+
     def get_lectures(self, obj):
-        lectures = obj.lectures()
+        lectures = prefetched_lectures(obj)
         # 返回简化的讲座数据，避免过深的嵌套
         return [
             {
@@ -401,6 +530,7 @@ class CourseSerializer(serializers.ModelSerializer):
                 "file": item.file.url if item.file else None,
                 "duration": str(item.duration) if item.duration else None,
                 "content_duration": item.content_duration,
+                "probe_status": item.probe_status,
                 "preview": item.preview,
                 "variant_item_id": item.variant_item_id,
                 "date": item.date,
@@ -414,17 +544,11 @@ class CourseSerializer(serializers.ModelSerializer):
 
     def get_isInCart(self, obj):
         """获取课程是否在当前用户的购物车中"""
-        request = self.context.get("request")
-        if request and hasattr(request, "user"):
-            return obj.isInCart(request.user)
-        return False
+        return obj.id in context_course_ids(self.context, api_models.Cart)
 
     def get_isInWishlist(self, obj):
         """获取课程是否在当前用户的愿望单中"""
-        request = self.context.get("request")
-        if request and hasattr(request, "user"):
-            return obj.isInWishlist(request.user)
-        return False
+        return obj.id in context_course_ids(self.context, api_models.Wishlist)
 
     def get_reviews(self, obj):
         reviews = obj.reviews()
@@ -490,7 +614,7 @@ class CourseSerializer(serializers.ModelSerializer):
         ]
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(SparseModelSerializer):
     course = CourseSerializer(many=False)
 
     class Meta:
@@ -498,7 +622,7 @@ class CartSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class CartOrderItemSerializer(serializers.ModelSerializer):
+class CartOrderItemSerializer(SparseModelSerializer):
     course = CourseSerializer(many=False)
 
     class Meta:
@@ -506,7 +630,7 @@ class CartOrderItemSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class CartOrderSerializer(serializers.ModelSerializer):
+class CartOrderSerializer(SparseModelSerializer):
     order_items = CartOrderItemSerializer(many=True)
 
     class Meta:
@@ -514,6 +638,16 @@ class CartOrderSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class FulfilmentJobSerializer(SparseModelSerializer):
+    """订单开通任务的状态，给前端支付成功页轮询用（失败原因只在后台查看）"""
+
+    order_id = serializers.CharField(source="order.cart_order_id")
+
+    class Meta:
+        model = api_models.FulfilmentJob
+        fields = ["order_id", "status", "attempts", "date", "completed_at"]
+
+
 class StudentSummarySerializer(serializers.Serializer):
     """
     学生统计摘要序列化器
@@ -530,6 +664,26 @@ class StudentSummarySerializer(serializers.Serializer):
     achieved_certificates = serializers.IntegerField(default=0)  # 获得证书数
 
 
+class CartBatchSerializer(serializers.Serializer):
+    """批量加入购物车的请求参数（CartBatchAPIView）"""
+
+    cart_id = serializers.CharField(max_length=20)
+    course_ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=100
+    )
+    user_id = serializers.IntegerField(required=False, allow_null=True)
+    country_name = serializers.CharField(required=False, allow_blank=True)
+
+
+class CartSummarySerializer(serializers.Serializer):
+    """购物车汇总（api/carts.py 的 cart_summary），金额按两位小数的字符串返回，不会变成有误差的浮点数"""
+
+    count = serializers.IntegerField()
+    price = serializers.DecimalField(max_digits=12, decimal_places=2)
+    tax = serializers.DecimalField(max_digits=12, decimal_places=2)
+    total = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
 class TeacherSummarySerializer(serializers.Serializer):
     total_courses = serializers.IntegerField(default=0)
     total_students = serializers.IntegerField(default=0)
@@ -537,7 +691,7 @@ class TeacherSummarySerializer(serializers.Serializer):
     monthly_revenue = serializers.IntegerField(default=0)
 
 
-class CompletedLessonSerializer(serializers.ModelSerializer):
+class CompletedLessonSerializer(SparseModelSerializer):
     variant_item = VariantItemSerializer(many=False)
 
     class Meta:
@@ -545,7 +699,7 @@ class CompletedLessonSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class EnrolledCourseSerializer(serializers.ModelSerializer):
+class EnrolledCourseSerializer(SparseModelSerializer):
     lectures = VariantItemSerializer(many=True, read_only=True)
     completed_lesson = CompletedLessonSerializer(many=True, read_only=True)
     curriculum = VariantSerializer(many=True, read_only=True)
@@ -563,7 +717,72 @@ class EnrolledCourseSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class WishlistSerializer(serializers.ModelSerializer):
+class CourseCardSerializer(SparseModelSerializer):
+    """课程卡片：列表页显示一门课程需要的字段，不包含学生、大纲、课时和评价"""
+
+    class Meta:
+        model = api_models.Course
+        fields = [
+            "id",
+            "course_id",
+            "title",
+            "slug",
+            "image",
+            "language",
+            "level",
+            "price",
+            "average_rating",
+            "rating_count",
+        ]
+
+
+class StudentCourseSummarySerializer(SparseModelSerializer):
+    """
+    学生课程列表用的精简版报名记录：课程卡片 + 教师名字 + 学习进度（见api/progress.py）
+
+    🧐为什么不用 EnrolledCourseSerializer？
+    答：它嵌套了完整的 CourseSerializer（所有学生、课时、评价）、TeacherSerializer（教师的全部订单项和课程）、
+    大纲、笔记和整门课的问答，一个学生的课程列表动辄几MB；列表页只需要卡片和进度，完整的树留给详情接口。
+
+    可以用 ?fields=course,progress_percent 只返回指定的字段，
+    用 ?expand=curriculum,note 额外返回 EnrolledCourseSerializer 里的重字段（见api/sparse.py）
+    """
+
+    course = CourseCardSerializer(read_only=True)
+    teacher_name = serializers.CharField(
+        source="teacher.full_name", default=None, read_only=True
+    )
+    last_completed_lesson = serializers.CharField(
+        source="last_completed_lesson.variant_item_id", default=None, read_only=True
+    )
+
+    # 可以通过 ?expand= 加上的字段，和 EnrolledCourseSerializer 的同名字段一样
+    expandable_fields = {
+        "lectures": lambda: VariantItemSerializer(many=True, read_only=True),
+        "completed_lesson": lambda: CompletedLessonSerializer(many=True, read_only=True),
+        "curriculum": lambda: VariantSerializer(many=True, read_only=True),
+        "note": lambda: NoteSerializer(many=True, read_only=True),
+        "question_answer": lambda: Question_AnswerSerializer(many=True, read_only=True),
+        "review": lambda: ReviewSerializer(many=False, read_only=True),
+    }
+
+    class Meta:
+        model = api_models.EnrolledCourse
+        fields = [
+            "id",
+            "enrollment_id",
+            "date",
+            "course",
+            "teacher_name",
+            "completed_lessons",
+            "total_lectures",
+            "progress_percent",
+            "last_completed_lesson",
+            "completed_at",
+        ]
+
+
+class WishlistSerializer(SparseModelSerializer):
     course = CourseSerializer(many=False)
 
     class Meta:
@@ -571,7 +790,7 @@ class WishlistSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class CourseCreateSerializer(serializers.ModelSerializer):
+class CourseCreateSerializer(SparseModelSerializer):
     """专门用于课程创建的序列化器"""
 
     class Meta:
@@ -593,7 +812,7 @@ class CourseCreateSerializer(serializers.ModelSerializer):
         return api_models.Course.objects.create(**validated_data)
 
 
-class CourseUpdateSerializer(serializers.ModelSerializer):
+class CourseUpdateSerializer(SparseModelSerializer):
     """
     简化的课程更新序列化器，主要用于数据返回
     实际的更新逻辑在APIView中处理
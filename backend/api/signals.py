@@ -0,0 +1,169 @@
+"""
+api 应用的信号处理
+
+🧐为什么把信号处理单独放在一个文件里？
+答：模型保存/删除之后需要同步更新的派生数据（比如搜索索引、响应缓存、课程统计字段）都集中在这里，
+models.py 只负责定义表结构；这个模块在 ApiConfig.ready() 里导入，导入时完成注册。
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from api import carts
+from api import counters
+from api import coupons
+from api import models as api_models
+from api import progress
+from api import response_cache
+from api import search
+
+
+# ---------------------------------------
+# 课程搜索索引
+@receiver(post_save, sender=api_models.Course)
+def index_course_on_save(sender, instance, raw=False, **kwargs):
+    if raw:  # loaddata 导入fixture时不处理
+        return
+    search.index_course(instance)
+
+
+@receiver(post_delete, sender=api_models.Course)
+def remove_course_from_index(sender, instance, **kwargs):
+    search.remove_course(instance.id)
+
+
+@receiver(post_save, sender=api_models.Category)
+@receiver(post_save, sender=api_models.Teacher)
+def reindex_related_courses(sender, instance, raw=False, **kwargs):
+    """分类名称或教师名字变化时，重新索引它们下面的课程"""
+    if raw:
+        return
+    search.index_courses(
+        instance.course_set.select_related("category", "teacher")
+    )
+
+
+@receiver(pre_delete, sender=api_models.Category)
+def remember_category_courses(sender, instance, **kwargs):
+    # 分类删除后课程的category会被SET_NULL（直接执行UPDATE，不触发课程的信号），先记下受影响的课程
+    instance._indexed_course_ids = list(instance.course_set.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=api_models.Category)
+def reindex_category_courses(sender, instance, **kwargs):
+    course_ids = getattr(instance, "_indexed_course_ids", [])
+    if course_ids:
+        search.index_courses(
+            api_models.Course.objects.filter(id__in=course_ids).select_related(
+                "category", "teacher"
+            )
+        )
+
+
+# ---------------------------------------
+# 公开目录接口的响应缓存（标签含义见api/response_cache.py）
+@receiver(post_save, sender=api_models.Course)
+@receiver(post_delete, sender=api_models.Course)
+def invalidate_course_cache(sender, instance, **kwargs):
+    # 分类列表里也有课程的标题、价格等信息
+    response_cache.invalidate_course(instance.id, instance.teacher_id)
+    response_cache.invalidate("categories")
+
+
+@receiver(post_save, sender=api_models.Variant)
+@receiver(post_delete, sender=api_models.Variant)
+@receiver(post_save, sender=api_models.Review)
+@receiver(post_delete, sender=api_models.Review)
+@receiver(post_save, sender=api_models.EnrolledCourse)
+@receiver(post_delete, sender=api_models.EnrolledCourse)
+def invalidate_course_child_cache(sender, instance, **kwargs):
+    if instance.course_id:
+        response_cache.invalidate_course(instance.course_id)
+
+
+@receiver(post_save, sender=api_models.VariantItem)
+@receiver(post_delete, sender=api_models.VariantItem)
+def invalidate_variant_item_cache(sender, instance, **kwargs):
+    response_cache.invalidate_course(instance.variant.course_id)
+
+
+@receiver(post_save, sender=api_models.CartOrderItem)
+@receiver(post_delete, sender=api_models.CartOrderItem)
+def invalidate_teacher_students_cache(sender, instance, **kwargs):
+    # 课程数据里嵌套的教师信息包含教师的购买记录
+    if instance.teacher_id:
+        response_cache.invalidate("course-list", f"teacher:{instance.teacher_id}")
+
+
+@receiver(post_save, sender=api_models.Teacher)
+@receiver(post_delete, sender=api_models.Teacher)
+def invalidate_teacher_cache(sender, instance, **kwargs):
+    response_cache.invalidate("course-list", f"teacher:{instance.id}")
+
+
+@receiver(post_save, sender=api_models.Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    response_cache.invalidate(
+        "categories",
+        "course-list",
+        *[
+            f"course:{course_id}"
+            for course_id in instance.course_set.values_list("id", flat=True)
+        ],
+    )
+
+
+@receiver(post_delete, sender=api_models.Category)
+def invalidate_deleted_category_cache(sender, instance, **kwargs):
+    # 受影响的课程在 remember_category_courses 里已经记下来了
+    response_cache.invalidate(
+        "categories",
+        "course-list",
+        *[
+            f"course:{course_id}"
+            for course_id in getattr(instance, "_indexed_course_ids", [])
+        ],
+    )
+
+
+# ---------------------------------------
+# 课程统计字段（保存时由模型的save()维护，删除包括级联删除都在这里处理）
+@receiver(post_delete, sender=api_models.Review)
+def update_counters_on_review_delete(sender, instance, **kwargs):
+    counters.review_deleted(instance)
+
+
+@receiver(post_delete, sender=api_models.EnrolledCourse)
+def update_counters_on_enrollment_delete(sender, instance, **kwargs):
+    counters.enrollment_deleted(instance)
+
+
+# ---------------------------------------
+# 报名记录的学习进度（见api/progress.py）：课时新增/删除会改变课时总数和进度百分比
+@receiver(post_save, sender=api_models.VariantItem)
+def refresh_progress_on_lecture_created(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        progress.refresh_course_on_commit(instance.variant.course_id)
+
+
+@receiver(post_delete, sender=api_models.VariantItem)
+def refresh_progress_on_lecture_deleted(sender, instance, **kwargs):
+    progress.refresh_course_on_commit(instance.variant.course_id)
+
+
+# ---------------------------------------
+# 进程内的国家税率表（见api/carts.py）
+@receiver(post_save, sender=api_models.Country)
+@receiver(post_delete, sender=api_models.Country)
+def invalidate_tax_rates(sender, instance, **kwargs):
+    # 提交之后再清，避免事务还没提交时别的请求又读到旧数据缓存起来
+    transaction.on_commit(carts.invalidate_tax_rates)
+
+
+# ---------------------------------------
+# 进程内的优惠券代码缓存（见api/coupons.py）
+@receiver(post_save, sender=api_models.Coupon)
+@receiver(post_delete, sender=api_models.Coupon)
+def invalidate_coupon_cache(sender, instance, **kwargs):
+    transaction.on_commit(coupons.invalidate_cache)
@@ -0,0 +1,99 @@
+"""
+稀疏字段（sparse fieldsets）：?fields= 和 ?expand=
+
+🧐为什么需要？
+答：序列化器默认返回全部字段和全部嵌套关系，比如购物车列表 CartSerializer → 完整的 CourseSerializer
+→ TeacherSerializer → 教师的每一条订单项，前端往往只用到课程标题和价格。
+让前端声明自己要渲染的字段之后，不要的嵌套关系既不用序列化，也不用从数据库预加载。
+
+两个查询参数（只对GET请求生效，不传时和原来完全一样）：
+- ?fields=id,title,teacher.full_name
+  只返回列出的字段；用点号指定嵌套对象里的字段，只写 teacher 表示教师对象的全部字段
+- ?expand=curriculum,course.xxx
+  加上序列化器 expandable_fields 里声明的、默认不返回的重字段
+
+序列化器继承 SparseModelSerializer 即可；嵌套的序列化器在 get_fields() 时根据自己在树里的路径
+（例如 course.teacher）找到对应的参数，所以同一个序列化器嵌在哪里都能正确裁剪。
+查询集的预加载用 field_requested(context, "teacher.students") 判断某个字段是否需要（见CourseSerializer.setup_eager_loading）。
+"""
+
+from rest_framework import serializers
+
+
+def query_param_set(context, name):
+    """?fields=a,b 这类逗号分隔的参数，返回集合；没有传（或者不是GET请求）时返回None"""
+    request = (context or {}).get("request")
+    if request is None or request.method != "GET":
+        return None
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    return {item.strip() for item in value.split(",") if item.strip()}
+
+
+def join_path(prefix, name):
+    return f"{prefix}.{name}" if prefix else name
+
+
+def requested_children(fields, prefix):
+    """
+    ?fields= 在 prefix 这一层要求的字段名集合；没有限制时返回None。
+    例如 fields={"id", "teacher.full_name"}：根上是 {"id", "teacher"}，teacher 下面是 {"full_name"}
+    """
+    if fields is None or prefix in fields:
+        return None
+    start = prefix + "." if prefix else ""
+    names = {entry[len(start):].split(".")[0] for entry in fields if entry.startswith(start)}
+    if prefix and not names:
+        return None
+    return names
+
+
+def field_requested(context, path):
+    """按 ?fields= 判断 path（例如 teacher.students）是否需要返回"""
+    fields = query_param_set(context, "fields")
+    prefix = ""
+    for name in path.split("."):
+        children = requested_children(fields, prefix)
+        if children is None:
+            return True
+        if name not in children:
+            return False
+        prefix = join_path(prefix, name)
+    return True
+
+
+def field_expanded(context, path):
+    return path in (query_param_set(context, "expand") or ())
+
+
+def serializer_path(serializer):
+    """序列化器在整棵树里的路径，根是空字符串；many=True 的子序列化器和列表用同一个路径"""
+    names = []
+    node = serializer
+    while node.parent is not None:
+        if node.field_name:
+            names.append(node.field_name)
+        node = node.parent
+    return ".".join(reversed(names))
+
+
+class SparseFieldsMixin:
+    # 默认不返回、需要 ?expand= 才加上的字段：{字段名: 返回字段实例的函数}
+    expandable_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        path = serializer_path(self)
+        for name, factory in self.expandable_fields.items():
+            if field_expanded(self.context, join_path(path, name)):
+                fields[name] = factory()
+        only = requested_children(query_param_set(self.context, "fields"), path)
+        if only is not None:
+            for name in set(fields) - only:
+                fields.pop(name)
+        return fields
+
+
+class SparseModelSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    pass
@@ -1,3 +1,703 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api import carts
+from api import coupons
+from api import models as api_models
+from api import orders
+from api import progress
+from api.views import COURSE_QUERY_BUDGET
+from userauths.models import User
+from utils import paypal
+from utils.paypal_fake import FakePayPalServer
+
+
+def create_teacher(username="teacher"):
+    user = User.objects.create(
+        email=f"{username}@example.com", username=username, full_name=username
+    )
+    return api_models.Teacher.objects.create(user=user, full_name=username)
+
+
+def create_student(username):
+    return User.objects.create(
+        email=f"{username}@example.com", username=username, full_name=username
+    )
+
+
+def create_course(teacher, title="Course", variants=2, items=3):
+    """一门已发布的课程，带 variants 个章节、每个章节 items 个课时"""
+    category, _ = api_models.Category.objects.get_or_create(title="Programming")
+    course = api_models.Course.objects.create(
+        teacher=teacher,
+        category=category,
+        title=title,
+        price=Decimal("10.00"),
+        platform_status="Published",
+        teacher_course_status="Published",
+    )
+    for v in range(variants):
+        variant = api_models.Variant.objects.create(course=course, title=f"Chapter {v}")
+        for i in range(items):
+            api_models.VariantItem.objects.create(variant=variant, title=f"Lecture {v}-{i}")
+    return course
+
+
+def enroll(student, course, price=Decimal("10.00")):
+    """已支付订单 + 报名记录"""
+    order = api_models.CartOrder.objects.create(student=student, payment_status="Paid")
+    order_item = api_models.CartOrderItem.objects.create(
+        order=order, course=course, teacher=course.teacher, price=price
+    )
+    return api_models.EnrolledCourse.objects.create(
+        course=course, user=student, teacher=course.teacher, order_item=order_item
+    )
+
+
+@override_settings(API_RESPONSE_CACHE_ENABLED=False, MEDIA_PROBE_ASYNC=False)
+class CurriculumSyncTests(TestCase):
+    def setUp(self):
+        self.teacher = create_teacher()
+        self.course = create_course(self.teacher)
+        self.client = APIClient()
+
+    def update_url(self):
+        return f"/api/v1/teacher/course-update/{self.teacher.id}/{self.course.course_id}/"
+
+    def submit_tree(self, titles):
+        """按数据库里现有的章节和课时提交完整的大纲，章节标题换成 titles"""
+        data = {"title": self.course.title}
+        for v, variant in enumerate(self.course.variant_set.order_by("id")):
+            data[f"variants[{v}][variant_title]"] = titles[v]
+            data[f"variants[{v}][variant_id]"] = variant.variant_id
+            for i, item in enumerate(variant.variant_items.order_by("id")):
+                data[f"variants[{v}][items][{i}][title]"] = item.title
+                data[f"variants[{v}][items][{i}][variant_item_id]"] = item.variant_item_id
+                data[f"variants[{v}][items][{i}][file]"] = "null"
+        return self.client.patch(self.update_url(), data, format="multipart")
+
+    def test_blank_chapter_title_keeps_chapter_and_lectures(self):
+        student = create_student("student")
+        enroll(student, self.course)
+        first = self.course.variant_set.order_by("id").first()
+        lecture = first.variant_items.first()
+        api_models.CompletedLesson.objects.create(
+            user=student, course=self.course, variant_item=lecture
+        )
+
+        response = self.submit_tree(["", "Chapter 1"])
+
+        self.assertEqual(response.status_code, 200, response.content)
+        first.refresh_from_db()
+        self.assertEqual(first.title, "")
+        self.assertEqual(first.variant_items.count(), 3)
+        self.assertEqual(self.course.variant_set.count(), 2)
+        self.assertTrue(
+            api_models.CompletedLesson.objects.filter(variant_item=lecture).exists()
+        )
+        self.assertEqual(response.json()["curriculum_changes"]["variants"]["deleted"], 0)
+
+    def test_omitted_chapter_is_deleted(self):
+        variant = self.course.variant_set.order_by("id").last()
+        data = {
+            "title": self.course.title,
+            "variants[0][variant_title]": "Chapter 0",
+            "variants[0][variant_id]": self.course.variant_set.order_by("id")
+            .first()
+            .variant_id,
+        }
+        response = self.client.patch(self.update_url(), data, format="multipart")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertFalse(api_models.Variant.objects.filter(id=variant.id).exists())
+
+    def test_update_without_curriculum_keeps_tree(self):
+        response = self.client.patch(
+            self.update_url(), {"title": "Renamed"}, format="multipart"
+        )
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            api_models.VariantItem.objects.filter(variant__course=self.course).count(), 6
+        )
+
+
+@override_settings(API_RESPONSE_CACHE_ENABLED=False)
+class CouponBatchTests(TestCase):
+    def setUp(self):
+        self.teacher = create_teacher()
+        self.client = APIClient()
+        self.url = f"/api/v1/teacher/coupon-list/{self.teacher.id}/"
+        self.data = {"quantity": 5, "discount": 20, "prefix": "FALL"}
+
+    def test_anonymous_request_is_rejected(self):
+        response = self.client.post(self.url, self.data, format="json")
+
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(api_models.Coupon.objects.exists())
+
+    def test_other_user_is_rejected(self):
+        self.client.force_authenticate(create_student("student"))
+
+        response = self.client.post(self.url, self.data, format="json")
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(api_models.Coupon.objects.exists())
+
+    def test_owner_gets_inactive_single_use_coupons(self):
+        self.client.force_authenticate(self.teacher.user)
+
+        response = self.client.post(self.url, self.data, format="json")
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()["count"], 5)
+        coupons = api_models.Coupon.objects.filter(teacher=self.teacher)
+        self.assertEqual(coupons.count(), 5)
+        self.assertFalse(coupons.filter(active=True).exists())
+        self.assertFalse(coupons.filter(single_use=False).exists())
+        self.assertTrue(all(c.code.startswith("FALL") for c in coupons))
+
+
+class CartMergeTests(TestCase):
+    def setUp(self):
+        self.teacher = create_teacher()
+        self.courses = [create_course(self.teacher, f"Course {i}") for i in range(3)]
+        self.user = create_student("student")
+        self.cart_id = carts.user_cart_id(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add(self, cart_id, course, user=None):
+        return api_models.Cart.objects.create(
+            cart_id=cart_id, course=course, user=user, price=course.price
+        )
+
+    def test_user_cart_id_matches_frontend_hash(self):
+        # 前端 generateUserBasedCartId("1") / ("123456789") 的结果
+        self.assertEqual(carts.user_cart_id(User(id=1)), "0000000049")
+        self.assertEqual(carts.user_cart_id(User(id=123456789)), "1867378635")
+
+    def test_merge_drops_courses_already_in_user_cart(self):
+        kept = self.add(self.cart_id, self.courses[0], self.user)
+        self.add("5550001", self.courses[0])
+        self.add("5550001", self.courses[1])
+
+        response = self.client.post(
+            "/api/v1/cart/merge/", {"anonymous_cart_id": "5550001"}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["merged"], 1)
+        self.assertEqual(response.json()["duplicates"], 1)
+        self.assertEqual(response.json()["count"], 2)
+        rows = api_models.Cart.objects.filter(cart_id=self.cart_id)
+        self.assertEqual(
+            set(rows.values_list("course_id", flat=True)),
+            {self.courses[0].id, self.courses[1].id},
+        )
+        self.assertFalse(rows.exclude(user=self.user).exists())
+        self.assertTrue(rows.filter(id=kept.id).exists())
+        self.assertFalse(api_models.Cart.objects.filter(cart_id="5550001").exists())
+
+    def test_client_cart_id_cannot_redirect_merge(self):
+        victim = create_student("victim")
+        victim_cart_id = carts.user_cart_id(victim)
+        self.add("5550002", self.courses[2])
+
+        response = self.client.post(
+            "/api/v1/cart/merge/",
+            {"anonymous_cart_id": "5550002", "cart_id": victim_cart_id},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["cart_id"], self.cart_id)
+        self.assertFalse(api_models.Cart.objects.filter(cart_id=victim_cart_id).exists())
+
+    def test_other_users_rows_are_not_merged(self):
+        other = create_student("other")
+        self.add("5550003", self.courses[0], other)
+
+        response = self.client.post(
+            "/api/v1/cart/merge/", {"anonymous_cart_id": "5550003"}, format="json"
+        )
+
+        self.assertEqual(response.json()["merged"], 0)
+        self.assertEqual(
+            api_models.Cart.objects.get(cart_id="5550003").user_id, other.id
+        )
+
+
+class CartSweepTests(TestCase):
+    def setUp(self):
+        teacher = create_teacher()
+        self.course = create_course(teacher, variants=0)
+        self.old = timezone.now() - timedelta(days=60)
+
+    def add(self, cart_id, date, user=None):
+        api_models.Cart.objects.create(
+            cart_id=cart_id, course=self.course, user=user, date=date
+        )
+
+    def test_sweeps_abandoned_anonymous_carts_in_batches(self):
+        for i in range(5):
+            self.add(f"900{i}", self.old)
+        self.add("9100", timezone.now())
+        self.add("9200", self.old, create_student("student"))
+
+        result = carts.sweep_abandoned_carts(ttl_days=30, batch_size=2)
+
+        self.assertEqual((result.carts, result.rows, result.batches), (5, 5, 3))
+        self.assertEqual(
+            set(api_models.Cart.objects.values_list("cart_id", flat=True)),
+            {"9100", "9200"},
+        )
+
+    def test_recent_activity_keeps_cart(self):
+        self.add("9300", self.old)
+        self.add("9300", timezone.now())
+
+        result = carts.sweep_abandoned_carts(ttl_days=30)
+
+        self.assertEqual(result.rows, 0)
+        self.assertEqual(api_models.Cart.objects.filter(cart_id="9300").count(), 2)
+
+    def test_max_batches_limits_one_run(self):
+        for i in range(5):
+            self.add(f"940{i}", self.old)
+
+        result = carts.sweep_abandoned_carts(ttl_days=30, batch_size=2, max_batches=1)
+
+        self.assertEqual((result.carts, result.batches), (2, 1))
+        self.assertEqual(api_models.Cart.objects.count(), 3)
+
+
+@override_settings(API_RESPONSE_CACHE_ENABLED=False)
+class CouponApplyTests(TestCase):
+    def setUp(self):
+        coupons.invalidate_cache()
+        self.teacher = create_teacher()
+        self.other_teacher = create_teacher("other-teacher")
+        self.courses = [create_course(self.teacher, f"Course {i}", variants=0) for i in range(2)]
+        self.other_course = create_course(self.other_teacher, "Other", variants=0)
+        self.coupon = api_models.Coupon.objects.create(
+            teacher=self.teacher, code="SAVE20", discount=20, active=True
+        )
+        self.client = APIClient()
+
+    def create_order(self, student, courses):
+        order = api_models.CartOrder.objects.create(student=student)
+        for course, price in courses:
+            api_models.CartOrderItem.objects.create(
+                order=order, course=course, teacher=course.teacher, price=price, total=price
+            )
+        order.total = sum((price for _, price in courses), Decimal("0.00"))
+        order.save()
+        return order
+
+    def apply(self, order, code="SAVE20"):
+        return self.client.post(
+            "/api/v1/order/coupon/",
+            {"cart_order_id": order.cart_order_id, "coupon_code": code},
+            format="json",
+        )
+
+    def test_discount_applies_to_every_course_of_the_teacher(self):
+        order = self.create_order(
+            create_student("student"),
+            [
+                (self.courses[0], Decimal("10.00")),
+                (self.courses[1], Decimal("33.33")),
+                (self.other_course, Decimal("50.00")),
+            ],
+        )
+
+        response = self.apply(order)
+
+        self.assertEqual(response.status_code, 201, response.content)
+        items = {item.course_id: item for item in order.orderItem.all()}
+        self.assertEqual(items[self.courses[0].id].total, Decimal("8.00"))
+        self.assertEqual(items[self.courses[1].id].total, Decimal("26.66"))
+        self.assertEqual(items[self.courses[1].id].saved, Decimal("6.67"))
+        self.assertEqual(items[self.other_course.id].total, Decimal("50.00"))
+        self.assertFalse(items[self.other_course.id].applied_coupon)
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal("84.66"))
+        self.assertEqual(order.saved, Decimal("8.67"))
+
+    def test_applying_twice_is_rejected(self):
+        order = self.create_order(create_student("student"), [(self.courses[0], Decimal("10.00"))])
+        self.apply(order)
+
+        response = self.apply(order)
+
+        self.assertEqual(response.json()["message"], "Coupon Already Applied.")
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal("8.00"))
+
+    def test_abandoned_order_does_not_use_up_coupon(self):
+        student = create_student("student")
+        abandoned = self.create_order(student, [(self.courses[0], Decimal("10.00"))])
+        self.apply(abandoned)
+
+        order = self.create_order(student, [(self.courses[0], Decimal("10.00"))])
+        response = self.apply(order)
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertFalse(self.coupon.used_by.exists())
+
+    def test_paid_order_uses_up_coupon_for_the_student(self):
+        student = create_student("student")
+        paid = self.create_order(student, [(self.courses[0], Decimal("10.00"))])
+        self.apply(paid)
+        self.assertTrue(orders.confirm_payment(paid))
+        self.assertTrue(self.coupon.used_by.filter(id=student.id).exists())
+
+        response = self.apply(self.create_order(student, [(self.courses[1], Decimal("10.00"))]))
+        self.assertEqual(response.json()["message"], "Coupon Already Used.")
+
+        other = self.create_order(create_student("other"), [(self.courses[1], Decimal("10.00"))])
+        self.assertEqual(self.apply(other).status_code, 201)
+
+    def test_single_use_coupon_only_burns_on_payment(self):
+        self.coupon.single_use = True
+        self.coupon.save()
+        anonymous = self.create_order(None, [(self.courses[0], Decimal("10.00"))])
+        self.apply(anonymous)
+
+        order = self.create_order(create_student("student"), [(self.courses[1], Decimal("10.00"))])
+        self.assertEqual(self.apply(order).status_code, 201)
+
+        orders.confirm_payment(anonymous)
+        late = self.create_order(create_student("late"), [(self.courses[1], Decimal("10.00"))])
+        self.assertEqual(self.apply(late).json()["message"], "Coupon Already Used.")
+
+
+@override_settings(API_RESPONSE_CACHE_ENABLED=False)
+class CourseSearchTests(TestCase):
+    def setUp(self):
+        self.teacher = create_teacher()
+        self.client = APIClient()
+
+    def search(self, **params):
+        return self.client.get("/api/v1/course/search/", params)
+
+    def test_title_match_ranks_above_description_match(self):
+        described = create_course(self.teacher, "Cooking", variants=0)
+        described.description = "A little python on the side"
+        described.save()
+        titled = create_course(self.teacher, "Python Basics", variants=0)
+        create_course(self.teacher, "Gardening", variants=0)
+
+        ids = [course["id"] for course in self.search(query="python").json()]
+
+        self.assertEqual(ids, [titled.id, described.id])
+
+    def test_pages_cover_every_match_in_order(self):
+        created = {create_course(self.teacher, f"Django {i}", variants=0).id for i in range(25)}
+        hidden = create_course(self.teacher, "Django draft", variants=0)
+        hidden.platform_status = "Draft"
+        hidden.save()
+        full = [course["id"] for course in self.search(query="django").json()]
+
+        seen = []
+        response = self.search(query="django", page_size=10).json()
+        while True:
+            seen += [course["id"] for course in response["results"]]
+            if not response["next"]:
+                break
+            response = self.client.get(response["next"]).json()
+
+        self.assertEqual(set(full), created)
+        self.assertEqual(seen, full)
+
+
+class CompletedSyncTests(TestCase):
+    def setUp(self):
+        self.course = create_course(create_teacher())
+        self.student = create_student("student")
+        enroll(self.student, self.course)
+        self.lectures = list(
+            api_models.VariantItem.objects.filter(variant__course=self.course)
+            .order_by("id")
+            .values_list("variant_item_id", flat=True)
+        )
+        self.client = APIClient()
+
+    def sync(self, completed_variant_ids):
+        return self.client.post(
+            "/api/v1/student/course-completed-sync/",
+            {
+                "user_id": self.student.id,
+                "course_id": self.course.course_id,
+                "completed_variant_ids": completed_variant_ids,
+            },
+            format="json",
+        )
+
+    def test_stale_lecture_ids_are_ignored(self):
+        response = self.sync(self.lectures[:3] + ["deleted-lecture"])
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["ignored_ids"], ["deleted-lecture"])
+        self.assertEqual(response.json()["created_count"], 3)
+        self.assertEqual(response.json()["progress"], 50)
+        self.assertEqual(
+            api_models.CompletedLesson.objects.filter(user=self.student).count(), 3
+        )
+
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        teacher = create_teacher()
+        api_models.Country.objects.create(name="Utopia", tax_rate=7)
+        carts.invalidate_tax_rates()
+        self.courses = [create_course(teacher, f"Course {i}", variants=0) for i in range(3)]
+        for course, price in zip(self.courses, ["0.10", "0.20", "19.99"]):
+            course.price = Decimal(price)
+            course.save()
+        self.client = APIClient()
+
+    def test_totals_render_as_exact_strings(self):
+        carts.add_courses("7770001", [course.id for course in self.courses], None, "Utopia")
+
+        stats = self.client.get("/api/v1/cart/stats/7770001/").json()
+        state = self.client.get("/api/v1/cart/state/7770001/").json()
+
+        expected = {"count": 3, "price": "20.29", "tax": "1.42", "total": "21.71"}
+        self.assertEqual(stats, expected)
+        self.assertEqual({key: state[key] for key in expected}, expected)
+        self.assertEqual(len(state["items"]), 3)
+
+    def test_empty_cart(self):
+        stats = self.client.get("/api/v1/cart/stats/7770002/").json()
+
+        self.assertEqual(stats, {"count": 0, "price": "0.00", "tax": "0.00", "total": "0.00"})
+
+
+@override_settings(API_RESPONSE_CACHE_ENABLED=False, API_QUERY_BUDGET_STRICT=True)
+class CourseQueryBudgetTests(TestCase):
+    def setUp(self):
+        self.teacher = create_teacher()
+        self.client = APIClient()
+
+    def add_courses(self, count):
+        """带报名、评价的课程，序列化器会用到的关联数据都有"""
+        courses = []
+        for _ in range(count):
+            course = create_course(
+                self.teacher, f"Course {api_models.Course.objects.count()}"
+            )
+            for n in range(2):
+                student = create_student(f"student-{course.id}-{n}")
+                enroll(student, course)
+                api_models.Review.objects.create(
+                    course=course, user=student, review="Good", rating=5, active=True
+                )
+            courses.append(course)
+        return courses
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(ctx.captured_queries)
+
+    def test_course_list_stays_within_budget(self):
+        self.add_courses(2)
+        few = self.count_queries("/api/v1/course/course-list/")
+        self.add_courses(4)
+        many = self.count_queries("/api/v1/course/course-list/")
+
+        self.assertLessEqual(many, COURSE_QUERY_BUDGET)
+        # 课程数量变多，查询条数不变（没有N+1）
+        self.assertEqual(few, many)
+
+    def test_course_detail_stays_within_budget(self):
+        course = self.add_courses(1)[0]
+
+        queries = self.count_queries(f"/api/v1/course/course-detail/{course.slug}")
+
+        self.assertLessEqual(queries, COURSE_QUERY_BUDGET)
+
+
+@override_settings(API_RESPONSE_CACHE_ENABLED=False)
+class EnrollmentProgressTests(TransactionTestCase):
+    """大纲变化后的进度刷新是 on_commit 回调，这里用真实提交的事务"""
+
+    def setUp(self):
+        self.course = create_course(create_teacher())
+        self.student = create_student("student")
+        self.enrollment = enroll(self.student, self.course)
+        self.lectures = list(
+            api_models.VariantItem.objects.filter(variant__course=self.course).order_by("id")
+        )
+        for lecture in self.lectures[:3]:
+            api_models.CompletedLesson.objects.create(
+                user=self.student, course=self.course, variant_item=lecture
+            )
+        progress.refresh_student(self.student, self.course)
+
+    def assert_progress(self, completed, total, percent):
+        self.enrollment.refresh_from_db()
+        self.assertEqual(
+            (
+                self.enrollment.completed_lessons,
+                self.enrollment.total_lectures,
+                self.enrollment.progress_percent,
+            ),
+            (completed, total, percent),
+        )
+
+    def test_adding_a_lecture_lowers_progress(self):
+        self.assert_progress(3, 6, 50)
+
+        api_models.VariantItem.objects.create(variant=self.lectures[0].variant, title="Bonus")
+
+        self.assert_progress(3, 7, 43)
+
+    def test_removing_a_completed_lecture_updates_progress(self):
+        self.lectures[0].delete()
+
+        self.assert_progress(2, 5, 40)
+
+    def test_removing_a_chapter_refreshes_once(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.lectures[0].variant.delete()
+
+        # 三个课时的级联删除合并成提交后的一次刷新
+        refreshes = [
+            query for query in ctx.captured_queries
+            if query["sql"].startswith('UPDATE "api_enrolledcourse" SET "total_lectures"')
+        ]
+        self.assertEqual(len(refreshes), 1)
+        self.assert_progress(0, 3, 0)
+
+    def test_finishing_the_remaining_lectures_completes_course(self):
+        for lecture in self.lectures[3:]:
+            api_models.CompletedLesson.objects.create(
+                user=self.student, course=self.course, variant_item=lecture
+            )
+        progress.refresh_student(self.student, self.course)
+
+        self.assert_progress(6, 6, 100)
+        self.assertIsNotNone(self.enrollment.completed_at)
+
+
+class TaxRateCacheTests(TestCase):
+    def setUp(self):
+        self.country = api_models.Country.objects.create(name="Utopia", tax_rate=10)
+        carts.invalidate_tax_rates()
+
+    def test_rates_are_read_once(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(carts.resolve_country("Utopia"), ("Utopia", Decimal("0.1")))
+            self.assertEqual(carts.resolve_country("Nowhere"), (carts.DEFAULT_COUNTRY, 0))
+
+    def test_saving_a_country_invalidates_after_commit(self):
+        carts.resolve_country("Utopia")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.country.tax_rate = 20
+            self.country.save()
+            # 提交之前还是旧的税率
+            self.assertEqual(carts.resolve_country("Utopia")[1], Decimal("0.1"))
+
+        self.assertEqual(carts.resolve_country("Utopia")[1], Decimal("0.2"))
+
+    @override_settings(TAX_RATE_CACHE_TIMEOUT=0)
+    def test_expired_rates_are_read_again(self):
+        carts.resolve_country("Utopia")
+        # 不经过信号直接改数据库，模拟别的进程改了税率
+        api_models.Country.objects.filter(id=self.country.id).update(tax_rate=20)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(carts.resolve_country("Utopia")[1], Decimal("0.2"))
+
+    def test_switching_country_recomputes_cart(self):
+        teacher = create_teacher()
+        courses = [create_course(teacher, f"Course {i}", variants=0) for i in range(2)]
+        api_models.Country.objects.create(name="Freeland", tax_rate=0)
+        carts.add_courses("8880001", [course.id for course in courses], None, "Utopia")
+
+        # 一条 SELECT ... FOR UPDATE、一条 bulk_update，加上测试事务里的 SAVEPOINT/RELEASE
+        with self.assertNumQueries(4):
+            updated = carts.recompute_taxes("8880001", "Freeland")
+
+        self.assertEqual(updated, 2)
+        self.assertEqual(
+            carts.cart_summary("8880001"),
+            {"count": 2, "price": Decimal("20.00"), "tax": Decimal("0.00"), "total": Decimal("20.00")},
+        )
+
+
+@override_settings(API_RESPONSE_CACHE_ENABLED=False)
+class PayPalTests(TestCase):
+    """支付校验走 utils/paypal_fake.py 的假 PayPal 服务，不访问外网"""
+
+    def setUp(self):
+        self.server = FakePayPalServer(
+            orders={"PAID-ORDER": "COMPLETED", "OPEN-ORDER": "APPROVED"}
+        ).start()
+        self.addCleanup(self.server.stop)
+        settings = override_settings(
+            PAYPAL_API_URL=self.server.url,
+            PAYPAL_CLIENT_ID=self.server.client_id,
+            PAYPAL_SECRET_ID=self.server.secret,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_access_token_is_reused(self):
+        client = paypal.get_client()
+
+        for _ in range(3):
+            self.assertEqual(client.get_order("PAID-ORDER")["status"], "COMPLETED")
+
+        self.assertEqual(self.server.token_requests, 1)
+
+    def test_revoked_token_is_refreshed_once(self):
+        client = paypal.get_client()
+        client.get_order("PAID-ORDER")
+        self.server.revoke_tokens()
+
+        self.assertEqual(client.get_order("PAID-ORDER")["status"], "COMPLETED")
+        self.assertEqual(self.server.token_requests, 2)
+
+    def test_wrong_credentials_raise(self):
+        with override_settings(PAYPAL_SECRET_ID="wrong"):
+            with self.assertRaises(paypal.PayPalError) as error:
+                paypal.get_client().get_order("PAID-ORDER")
+        self.assertEqual(error.exception.status_code, 401)
+
+    def pay(self, paypal_order_id):
+        student = create_student("student")
+        order = api_models.CartOrder.objects.create(student=student)
+        client = APIClient()
+        client.force_authenticate(student)
+        response = client.post(
+            "/api/v1/payment/payment-success/",
+            {
+                "cart_order_id": order.cart_order_id,
+                "session_id": "null",
+                "paypal_order_id": paypal_order_id,
+            },
+            format="json",
+        )
+        order.refresh_from_db()
+        return response.json()["message"], order.payment_status
+
+    def test_completed_paypal_order_marks_order_paid(self):
+        self.assertEqual(self.pay("PAID-ORDER"), ("Payment Successful", "Paid"))
+
+    def test_uncompleted_paypal_order_is_not_paid(self):
+        self.assertEqual(self.pay("OPEN-ORDER"), ("Payment Failed", "Processing"))
+
+    def test_unknown_paypal_order_is_an_error(self):
+        self.assertEqual(self.pay("MISSING"), ("Paypal Error Occured", "Processing"))
@@ -25,7 +25,11 @@ urlpatterns = [
     ),
     path("course/course-detail/<slug>", api_views.CourseDetailAPIView.as_view()),
     path("cart/add-cart/", api_views.CartAPIView.as_view()),
+    path("cart/add-cart/batch/", api_views.CartBatchAPIView.as_view()),
+    path("cart/country/<cart_id>/", api_views.CartCountryAPIView.as_view()),
+    path("cart/merge/", api_views.CartMergeAPIView.as_view()),
     path("cart/cart-list/<cart_id>", api_views.CartListAPIView.as_view()),
+    path("cart/state/<cart_id>/", api_views.CartStateAPIView.as_view()),
     path(
         "cart/cart-item-delete/<cart_id>/<item_id>/",
         api_views.CartItemDeleteAPIView.as_view(),
@@ -58,6 +62,13 @@ urlpatterns = [
         "payment/payment-success/",
         api_views.PaymentSuccessAPIView.as_view(),
     ),
+    path(
+        "order/fulfilment/<cart_order_id>/",
+        api_views.FulfilmentJobStatusAPIView.as_view(),
+    ),
+    path("payment/webhooks/stripe/", api_views.stripe_webhook),
+    path("payment/webhooks/paypal/", api_views.paypal_webhook),
+    path("payment/webhooks/alipay/", api_views.alipay_webhook),
     # Student Endpoint  👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈👈
     path(
         "student/summary/<user_id>/",
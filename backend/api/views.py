@@ -1,5 +1,4 @@
 import random
-import requests
 import stripe
 import decimal
 import traceback
@@ -10,22 +9,42 @@ from datetime import datetime, timedelta
 
 from api import serializer as api_serializer
 from api import models as api_models
+from api.query_budget import QueryBudgetMixin
+from api.response_cache import ResponseCacheMixin
+from api.pagination import KeysetPagination, RankedPagination
+from api import search
+from api import response_cache
+from api import teacher_stats
+from api import rollups
+from api import orders
+from api import carts
+from api import coupons
+from api import fulfilment
+from api import webhooks
+from api import progress
+from utils import paypal
+from api import curriculum
 
 from userauths.models import User, Profile
 
-from django.db.models.functions import ExtractMonth, ExtractYear
 from django.core.files.uploadedfile import InMemoryUploadedFile
-from django.http import Http404
+from django.http import Http404, HttpResponse
 from django.shortcuts import redirect, render, get_object_or_404
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string  # 确保已导入
 from django.conf import settings
 from django.contrib.auth.hashers import check_password
 from django.db import models, transaction
+from django.utils import timezone
 
-from rest_framework.decorators import api_view
+from rest_framework.decorators import (
+    api_view,
+    authentication_classes,
+    permission_classes,
+)
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework import generics, status, viewsets, serializers
+from rest_framework.exceptions import NotAuthenticated, PermissionDenied
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.response import Response
@@ -37,26 +56,10 @@ from decimal import Decimal
 console = Console()
 
 
-def strtobool(val):
-    """
-    Convert a string representation of truth to true (1) or false (0).
-
-    True values are 'y', 'yes', 't', 'true', 'on', and '1'; false values
-    are 'n', 'no', 'f', 'false', 'off', and '0'.  Raises ValueError if
-    'val' is anything else.
-    """
-    val = val.lower()
-    if val in ("y", "yes", "t", "true", "on", "1"):
-        return 1
-    elif val in ("n", "no", "f", "false", "off", "0"):
-        return 0
-    else:
-        raise ValueError(f"invalid truth value {val!r}")
-
-
 stripe.api_key = settings.STRIPE_SECRET_KEY
-PAYPAL_CLIENT_ID = settings.PAYPAL_CLIENT_ID
-PAYPAL_SECRET_ID = settings.PAYPAL_SECRET_ID
+
+# 课程列表/详情/搜索接口的SQL条数预算：预加载之后与课程数量无关，是一个常数
+COURSE_QUERY_BUDGET = 20
 
 
 class MyTokenObtainPairView(TokenObtainPairView):
@@ -214,31 +217,53 @@ class ChangePasswordAPIView(generics.CreateAPIView):
             )
 
 
-class CategoryListAPIView(generics.ListAPIView):
+class CategoryListAPIView(ResponseCacheMixin, generics.ListAPIView):
     queryset = api_models.Category.objects.filter(active=True)  # 获取有效状态的分类
     serializer_class = api_serializer.CategorySerializer
     permission_classes = [AllowAny]
 
+    def get_cache_tags(self, data):
+        return ["categories"]
 
-class CourseListAPIView(generics.ListAPIView):
-    queryset = api_models.Course.objects.filter(
-        platform_status="Published", teacher_course_status="Published"
-    )
+
+class CourseListAPIView(QueryBudgetMixin, ResponseCacheMixin, generics.ListAPIView):
     serializer_class = api_serializer.CourseSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    query_budget = COURSE_QUERY_BUDGET
+
+    def get_queryset(self):
+        # 🧐为什么不直接写queryset类属性？
+        # 答：需要经过setup_eager_loading预加载关联数据，否则每个课程都会触发N+1查询
+        # 只预加载 ?fields= 要求返回的关系（见api/sparse.py）
+        return api_serializer.CourseSerializer.setup_eager_loading(
+            api_models.Course.objects.filter(
+                platform_status="Published", teacher_course_status="Published"
+            ),
+            self.get_serializer_context(),
+        )
+
+    def get_cache_tags(self, data):
+        return ["course-list"]
 
 
-class CourseDetailAPIView(generics.RetrieveAPIView):
+class CourseDetailAPIView(QueryBudgetMixin, ResponseCacheMixin, generics.RetrieveAPIView):
     serializer_class = api_serializer.CourseSerializer
     permission_classes = [AllowAny]
+    query_budget = COURSE_QUERY_BUDGET
 
     def get_object(self):
         slug = self.kwargs["slug"]  # 🧐这行代码是什么意思?
-        course = api_models.Course.objects.get(
-            slug=slug, platform_status="Published", teacher_course_status="Published"
-        )
+        course = api_serializer.CourseSerializer.setup_eager_loading(
+            api_models.Course.objects.all(), self.get_serializer_context()
+        ).get(slug=slug, platform_status="Published", teacher_course_status="Published")
+        self.course = course
         return course
 
+    def get_cache_tags(self, data):
+        # 课程详情里嵌套了教师信息（包括教师的其他课程），教师的数据变了也要失效
+        return [f"course:{self.course.id}", f"teacher:{self.course.teacher_id}"]
+
 
 class CartAPIView(generics.CreateAPIView):
     """🧐这个APIView似乎有很大的优化空间,有很多重复的代码"""
@@ -268,48 +293,118 @@ class CartAPIView(generics.CreateAPIView):
             user = User.objects.filter(id=user_id).first()
         else:
             user = None  # 这里当user_id前端传过来“undefined“的时候，user会被赋值为None，但是后续却会使用到user，也就是说，后续会将None作为user使用，这说明支持匿名购物车的功能，详见Cart模型的user字段，null是True，说明确实支持匿名购物车的功能，所以这里当user_id为“undefined“时，也就是在这个else逻辑中，不需要对user进行错误处理
-        try:
-            country_object = api_models.Country.objects.filter(
-                name=country_name
-            ).first()
-            country = country_object.name
-        except:
-            country_object = None
-            country = "China"
-
-        if country_object:
-            tax_rate = country_object.tax_rate / 100
-        else:
-            tax_rate = 0
+
+        # 🧐原来每次都按国家名查一次Country表？
+        # 答：现在用进程内缓存的税率表（见api/carts.py），找不到国家时和原来一样记为China、不收税
+        country, tax_rate = carts.resolve_country(country_name)
 
         cart = api_models.Cart.objects.filter(cart_id=cart_id, course=course).first()
-        if cart:
-            cart.course = course
-            cart.user = user
-            cart.price = price
-            cart.tax_fee = Decimal(price) * Decimal(tax_rate)
-            cart.country = country
-            cart.cart_id = cart_id
-            cart.total = Decimal(cart.price) + Decimal(cart.tax_fee)
-            cart.save()
+        created = cart is None
+        if created:
+            cart = api_models.Cart(cart_id=cart_id, course=course)
+        cart.user = user
+        cart.country = country
+        cart.date = timezone.now()  # 最近活动时间，匿名购物车过期清理用
+        carts.apply_price(cart, price, tax_rate)
+        cart.save()
+
+        if created:
+            return Response(
+                {"message": "Cart Created Successfully!"},
+                status=status.HTTP_201_CREATED,
+            )
+        return Response(
+            {"message": "Cart Updated Successfully!"}, status=status.HTTP_200_OK
+        )
+
+
+class CartBatchAPIView(generics.GenericAPIView):
+    """一次把多门课程加入同一个购物车，价格取课程当前的价格"""
 
+    serializer_class = api_serializer.CartBatchSerializer
+    permission_classes = [AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        data = request.data.copy()
+        # 和 CartAPIView 一样，匿名购物车的 user_id 前端会传 "undefined"
+        if data.get("user_id") in ("undefined", ""):
+            data["user_id"] = None
+        serializer = self.get_serializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        user = None
+        if params.get("user_id") is not None:
+            user = User.objects.filter(id=params["user_id"]).first()
+        # 去重并保持顺序
+        course_ids = list(dict.fromkeys(params["course_ids"]))
+        created, updated, missing = carts.add_courses(
+            params["cart_id"], course_ids, user, params.get("country_name")
+        )
+        return Response(
+            {
+                "message": "Cart Updated Successfully!",
+                "created": created,
+                "updated": updated,
+                "missing_course_ids": missing,
+            },
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+
+class CartMergeAPIView(generics.GenericAPIView):
+    """登录后把登录前的匿名购物车并进用户的购物车"""
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        anonymous_cart_id = request.data.get("anonymous_cart_id")
+        # 🧐为什么不用前端传的 cart_id？
+        # 答：前端传什么就并到哪里的话，任何登录用户都能把购物车项并进别人的购物车
+        # （用户的 cart_id 是按用户ID算出来的，别人也能算出来，空购物车也查不出属于谁）。
+        # 所以目标购物车只能是当前用户自己的，按和前端一样的算法在后端算出来
+        cart_id = carts.user_cart_id(request.user)
+        if carts.owned_by_other_user(cart_id, request.user):
             return Response(
-                {"message": "Cart Updated Successfully!"}, status=status.HTTP_200_OK
+                {"message": "Cart belongs to another user"},
+                status=status.HTTP_403_FORBIDDEN,
             )
-        else:
-            cart = api_models.Cart()
-            cart.course = course
-            cart.user = user
-            cart.price = price
-            cart.tax_fee = Decimal(price) * Decimal(tax_rate)
-            cart.country = country
-            cart.cart_id = cart_id
-            cart.total = Decimal(cart.price) + Decimal(cart.tax_fee)
-            cart.save()
+        merged, duplicates = carts.merge_anonymous_cart(
+            anonymous_cart_id, cart_id, request.user
+        )
+        return Response(
+            {
+                "message": "Cart Merged Successfully!",
+                "merged": merged,
+                "duplicates": duplicates,
+                "cart_id": cart_id,
+                "count": api_models.Cart.objects.filter(cart_id=cart_id).count(),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class CartCountryAPIView(generics.GenericAPIView):
+    """购物者切换国家后按新国家的税率重算购物车的税费和总价"""
+
+    permission_classes = [AllowAny]
+
+    def post(self, request, cart_id, *args, **kwargs):
+        country_name = request.data.get("country_name")
+        if not country_name:
             return Response(
-                {"message": "Cart Created Successfully!"},
-                status=status.HTTP_201_CREATED,
+                {"message": "country_name is required"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
+        updated = carts.recompute_taxes(cart_id, country_name)
+        return Response(
+            {
+                "message": "Cart Taxes Updated",
+                "updated": updated,
+                **api_serializer.CartSummarySerializer(carts.cart_summary(cart_id)).data,
+            },
+            status=status.HTTP_200_OK,
+        )
 
 
 class CartListAPIView(generics.ListAPIView):
@@ -319,7 +414,10 @@ class CartListAPIView(generics.ListAPIView):
     def get_queryset(self):
         cart_id = self.kwargs["cart_id"]
         query_set = api_models.Cart.objects.filter(cart_id=cart_id)
-        return query_set
+        # 购物车里的课程按 ?fields=course.xxx 预加载（见api/sparse.py）
+        return api_serializer.CourseSerializer.setup_eager_loading(
+            query_set, self.get_serializer_context(), path="course"
+        )
 
 
 class CartCountAPIView(generics.GenericAPIView):
@@ -429,15 +527,15 @@ class CartStatsAPIView(generics.GenericAPIView):
         这个get方法实现了购物车统计功能:
 
         1. 方法流程:
-           - 获取指定cart_id的所有购物车项(queryset)
-           - 遍历每个购物车项,累加价格、税费和总额
+           - 用一条aggregate()查询对指定cart_id的购物车项求和（见api/carts.py）
            - 返回聚合后的统计数据
 
         2. 计算逻辑:
-           - total_price: 累加所有商品的价格
-           - total_tax: 累加所有商品的税费
-           - total_total: 累加所有商品的最终金额
-           - 使用round()函数保证金额精度为2位小数
+           - count: 购物车项数量
+           - price: 所有商品的价格之和
+           - tax: 所有商品的税费之和
+           - total: 所有商品的最终金额之和
+           - 在数据库里用Decimal求和，不再转成float累加，没有浮点误差
 
         3. 为什么使用GenericAPIView:
            - GenericAPIView提供了基础的API视图功能
@@ -445,25 +543,34 @@ class CartStatsAPIView(generics.GenericAPIView):
            - 提供了灵活性来实现自定义的响应逻辑
 
         4. 返回数据格式:
-           {"price": 总价格, "tax": 总税费, "total": 总金额}
+           {"count": 件数, "price": 总价格, "tax": 总税费, "total": 总金额}
+           金额是两位小数的字符串，例如 "19.99"（见CartSummarySerializer）
 
         5. 使用场景:
            - GET /api/cart/{cart_id}/stats/ 获取购物车统计信息
            - 前端可以实时显示购物车的费用明细
         """
-        queryset = api_models.Cart.objects.filter(cart_id=cart_id)
-        total_price = 0.00
-        total_tax = 0.00
-        total_total = 0.00
+        return Response(
+            api_serializer.CartSummarySerializer(carts.cart_summary(cart_id)).data
+        )
+
 
-        for cart_item in queryset:
-            total_price += round(float(cart_item.price), 2)
-            total_tax += round(float(cart_item.tax_fee), 2)
-            total_total += round(float(cart_item.total), 2)
+class CartStateAPIView(CartListAPIView):
+    """
+    购物车页面需要的全部数据：购物车项 + 件数 + 价格/税费/总计
 
-        data = {"price": total_price, "tax": total_tax, "total": total_total}
+    🧐为什么要合并？
+    答：购物车页面原来要分别请求 cart-list、stats、cart-count 三个接口，
+    现在一次请求、两条查询（购物车项，汇总的 aggregate）就够了。
+    购物车项同样支持 ?fields=id,price,course.title 只返回页面用到的字段（见api/sparse.py）。
+    """
 
-        return Response(data)
+    def list(self, request, *args, **kwargs):
+        items = self.get_serializer(self.get_queryset(), many=True).data
+        summary = carts.cart_summary(self.kwargs["cart_id"])
+        return Response(
+            {"items": items, **api_serializer.CartSummarySerializer(summary).data}
+        )
 
 
 class CreateOrderAPIView(generics.CreateAPIView):
@@ -483,81 +590,13 @@ class CreateOrderAPIView(generics.CreateAPIView):
         else:
             user = None
 
-        # 🧐为什么这里要获取cart_items？
-        # 答：因为需要将购物车中的商品转换为订单项。购物车只是临时存储，用户确认购买后
-        # 需要创建正式的订单，并将购物车中的每个商品创建为对应的订单项（CartOrderItem）
-        cart_items = api_models.Cart.objects.filter(cart_id=cart_id)
-        total_price = Decimal(0.00)
-        total_tax = Decimal(0.00)
-        total_initial_total = Decimal(0.00)
-        total_total = Decimal(0.00)
-
-        # 🧐这里在干什么？
-        # 答：这里创建一个新的订单对象，包含基本的订单信息（客户姓名、邮箱、国家、用户）
-        # 但还没有包含具体的商品信息和金额统计，这些将在下面的循环中补充
-        order = api_models.CartOrder.objects.create(
-            full_name=full_name, email=email, country=country, student=user
+        # 🧐订单是怎么创建的？
+        # 答：见api/orders.py，一条查询取出购物车，订单项批量插入，金额用Decimal一次算完，
+        # 整个订单在一个事务里创建，购物车有多少门课程查询次数都一样
+        order, _ = orders.create_order(
+            cart_id, student=user, full_name=full_name, email=email, country=country
         )
 
-        for item in cart_items:
-
-            # 🧐上面已经创建了一个订单order，为什么这里又要创建CartOrderItem?有什么用？
-            # 答：这是订单系统的标准设计模式：
-            # - CartOrder（订单头）：存储订单的基本信息（客户信息、总金额等）
-            # - CartOrderItem（订单项）：存储订单中每个具体商品的详细信息
-            # 一个订单可以包含多个商品，所以需要一对多的关系来存储每个商品的价格、税费等信息
-
-            # 🧐 “一个订单可以包含多个商品” 是不是可以理解为：“一个订单头（ CartOrder ）可以包含多个订单项（ CartOrderItem ）”？
-            # 答：是的，完全正确！
-            # 这是典型的主从表设计模式：
-            # CartOrder（订单头）：存储订单级别的信息（客户姓名、邮箱、总金额等）
-            # CartOrderItem（订单项）：存储商品级别的详细信息（具体课程、价格、税费等）
-            # 通过order=order建立的外键关系，实现了一对多的关联：一个订单头可以关联多个订单项，这样就能在一次购买中包含多个不同的课程。
-
-            # 说白了，这里就是在创建一个订单中具体的某些课程的信息，因为一个订单中可能有很多的课程，所以需要通过循环来创建，cart_items是从Cart购物车中查询的，而它又需要通过我们传入的具体的cart_id才能查到，你在django admin中也可以看到，一个cart_id可以对应多个课程，其实应该来讲只能有一个cart_id的，因为购物车只有一个
-            # 然后购物车里面有很多的课程，当我们选中课程的时候，调用此视图，进行创建订单，然后知道选中了几个课程，订单里就会有几个CartOrderItem，循环也就相应进行几次
-            api_models.CartOrderItem.objects.create(
-                order=order,
-                course=item.course,
-                price=item.price,
-                tax_fee=item.tax_fee,
-                total=item.total,
-                initial_total=item.total,
-                teacher=item.course.teacher,
-            )
-
-            # 因为刚说过，一个订单可能有很多个订单项（多个课程子项，也就是CartOrderItem），所以每个课程的信息，包括价格，税费，总价都要计算
-            # 这里用 += 是因为最后要统计到 order 当中
-            total_price += Decimal(item.price)
-            total_tax += Decimal(item.tax_fee)
-            total_initial_total += Decimal(item.total)
-            total_total += Decimal(item.total)
-
-            # 这里在干什么？上面的create中已经使用了item.course.teacher和order了，然后这里才来add teacher吗？
-            # 还有，add有什么作用？是谁的方法？
-            # 答：
-            # 1. 上面 CartOrderItem 的 teacher 字段是存储单个订单项对应的老师
-            # 2. 这里的order.teacher.add()是将老师添加到订单的多对多关系中
-            # 3. add()是Django多对多字段的方法，用于建立多对多关系
-            # 4. 目的：一个订单可能包含多个不同老师的课程，所以订单需要记录所有相关的老师
-            # 5. 顺序没问题：先创建订单项（存储具体信息），再建立订单与老师的关联关系
-            order.teacher.add(item.course.teacher)
-
-        # 🧐为什么下面对order做了这么多的操作，但是上面的循环中已经使用到了order了，顺序是不是反了？
-        # 答：顺序是正确的，这是分步骤构建订单的过程：
-        # 1. 先创建订单基本信息（客户信息）
-        # 2. 循环处理每个购物车项，创建订单项并累加金额
-        # 3. 最后将累加的总金额更新到订单对象中
-        # 这样设计的好处是：即使中途出错，订单的基本信息已经存在，便于错误处理和调试
-
-        # 🧐为什么要对订单做这么多信息的赋值操作呢？
-        # 答：因为我们最终要显示出订单的状态呀，显示总价格，税费什么的，要展示给用户看的。
-        order.sub_total = total_price
-        order.tax_fee = total_tax
-        order.initial_total = total_initial_total
-        order.total = total_total
-        order.save()
-
         return Response(
             {"message": "Order Created Successfully!", "order_id": order.cart_order_id},
             status=status.HTTP_201_CREATED,
@@ -589,49 +628,25 @@ class CouponApplyAPIView(generics.CreateAPIView):
             return Response(
                 {"message": "当前订单未找到"}, status=status.HTTP_404_NOT_FOUND
             )
-        try:
-            coupon = get_object_or_404(api_models.Coupon, code=coupon_code)
-        except Http404:
+        # 🧐为什么不直接 get(code=coupon_code)？
+        # 答：优惠券代码只在同一个教师下唯一，不同教师可能有同名的优惠券，要按订单里的教师挑；
+        # 查找走进程内缓存（见api/coupons.py）
+        coupon_id = coupons.find_coupon(coupon_code, order)
+        if coupon_id is None:
             return Response(
                 {"message": "当前优惠券未找到"}, status=status.HTTP_404_NOT_FOUND
             )
+        # 校验、计算折扣、保存都在 api/coupons.py 里，订单里这个教师的所有课程一起打折
         try:
-            order_items = api_models.CartOrderItem.objects.filter(
-                order=order, teacher=coupon.teacher
-            )  # 获取所有相同订单的订单项（一个订单里可能有很多个课程）。teacher=coupon.teacher是因为coupon是老师创建的，和老师有关。
-        except Http404:
+            coupons.apply_coupon(order, coupon_id, coupon_code)
+        except coupons.CouponError as e:
             return Response(
-                {"message": "当前订单项未找到"}, status=status.HTTP_404_NOT_FOUND
+                {"message": e.message, "icon": "warning"}, status=status.HTTP_200_OK
             )
-        for item in order_items:
-            if not coupon in item.coupons.all():
-                discount = item.total * Decimal(coupon.discount / 100)
-                item.total -= discount
-                item.price -= discount
-                item.saved += discount
-                item.applied_coupon = True
-                item.coupons.add(
-                    coupon
-                )  # 将当前的coupon应用到coupons中，表示应用了这个coupon
-
-                order.coupons.add(coupon)
-                order.total -= discount
-                order.saved += discount
-
-                item.save()
-                order.save()
-
-                coupon.used_by.add(order.student)
-
-                return Response(
-                    {"message": "Coupon Found and Activated.", "icon": "success"},
-                    status=status.HTTP_201_CREATED,
-                )
-            else:
-                return Response(
-                    {"message": "Coupon Already Applied.", "icon": "warning"},
-                    status=status.HTTP_201_CREATED,
-                )
+        return Response(
+            {"message": "Coupon Found and Activated.", "icon": "success"},
+            status=status.HTTP_201_CREATED,
+        )
 
 
 class StripeCheckoutAPIView(generics.CreateAPIView):
@@ -662,6 +677,8 @@ class StripeCheckoutAPIView(generics.CreateAPIView):
                     }
                 ],
                 mode="payment",
+                # webhook 通过 client_reference_id 找回订单
+                client_reference_id=order.cart_order_id,
                 success_url=settings.FRONTEND_SITE_URL
                 + "/payment-success/"
                 + order.cart_order_id
@@ -670,6 +687,7 @@ class StripeCheckoutAPIView(generics.CreateAPIView):
             )
             print("checkout_session:", checkout_session)
             order.stripe_session_id = checkout_session.id
+            order.save(update_fields=["stripe_session_id"])
 
             return redirect(checkout_session.url)
         except stripe.StripeError as e:
@@ -691,62 +709,47 @@ class PaymentSuccessAPIView(generics.CreateAPIView):
         paypal_order_id = request.data["paypal_order_id"]
 
         order = api_models.CartOrder.objects.get(cart_order_id=cart_order_id)
-        order_items = api_models.CartOrderItem.objects.filter(order=order)
 
         # 通用的支付成功处理逻辑
         def process_payment_success():
             """处理支付成功后的通用逻辑"""
-            if order.payment_status == "Processing":
-                order.payment_status = "Paid"
-                order.save()
-                api_models.Notification.objects.create(
-                    user=order.student,
-                    order=order,
-                    type="Course Enrollment Completed",
-                )  # 为了通知学生，他们买了一门新课程
-                for item in order_items:
-                    api_models.Notification.objects.create(
-                        teacher=item.teacher,
-                        order=order,
-                        order_item=item,
-                        type="New Order",
-                    )
-                    # 检查是否已经存在注册记录，避免重复创建
-                    existing_enrollment = api_models.EnrolledCourse.objects.filter(
-                        course=item.course, user=order.student, order_item=item
-                    ).first()
-
-                    if not existing_enrollment:
-                        api_models.EnrolledCourse.objects.create(
-                            teacher=item.teacher,
-                            course=item.course,
-                            user=order.student,
-                            order_item=item,
-                        )
-                return Response({"message": "Payment Successful"})
-            else:
-                return Response({"message": "Already Paid."})
+            # 🧐为什么不直接改 payment_status 再 save()？
+            # 答：mark_order_paid 用条件UPDATE把 Processing 改成 Paid，支付回调重复到达时只有一个请求会成功，
+            # 成功的那一次在同一个事务里把这笔订单累加到教师/课程的销售汇总表（见api/rollups.py）
+            # 🧐报名记录和通知去哪里了？
+            # 答：放到开通任务（FulfilmentJob）里，事务提交后在后台执行（见api/fulfilment.py），
+            # 这里不用再等逐条创建，前端通过 order/fulfilment/<cart_order_id>/ 轮询开通状态
+            # webhook（见api/webhooks.py）也走 orders.confirm_payment，哪边先到都只会确认一次
+            paid = orders.confirm_payment(order)
+            return Response(
+                {
+                    "message": "Payment Successful" if paid else "Already Paid.",
+                    "fulfilment_status": fulfilment.job_status(order),
+                }
+            )
+
+        # webhook 已经确认过的订单不用再去问 Stripe/PayPal
+        if order.payment_status == "Paid":
+            return Response(
+                {
+                    "message": "Already Paid.",
+                    "fulfilment_status": fulfilment.job_status(order),
+                }
+            )
 
         # Paypal payment success
         if paypal_order_id != "null":
-            paypal_api_url = (
-                f"https://api-m.sandbox.paypal.com/v2/checkout/orders/{paypal_order_id}"
-            )
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {get_access_token(PAYPAL_CLIENT_ID,PAYPAL_SECRET_ID)}",
-            }
-            response = requests.get(paypal_api_url, headers=headers)
+            # access token 在进程内缓存复用，请求走连接池并且有超时（见utils/paypal.py）
+            try:
+                paypal_order_data = paypal.get_client().get_order(paypal_order_id)
+            except paypal.PayPalError:
+                return Response({"message": "Paypal Error Occured"})
 
-            if response.status_code == 200:
-                paypal_order_data = response.json()
-                paypay_payment_status = paypal_order_data["status"]
-                if paypay_payment_status == "COMPLETED":
-                    return process_payment_success()
-                else:
-                    return Response({"message": "Payment Failed"})
+            paypay_payment_status = paypal_order_data["status"]
+            if paypay_payment_status == "COMPLETED":
+                return process_payment_success()
             else:
-                return Response({"message": "Paypal Error Occured"})
+                return Response({"message": "Payment Failed"})
 
         # Stripe payment success
         elif session_id != "null":  # 使用elif避免两种支付方式同时执行
@@ -763,31 +766,78 @@ class PaymentSuccessAPIView(generics.CreateAPIView):
         )
 
 
-class SearchCourseAPIView(generics.ListAPIView):
+class FulfilmentJobStatusAPIView(generics.RetrieveAPIView):
+    """订单开通任务的状态：Pending / Running / Completed / Failed"""
+
+    serializer_class = api_serializer.FulfilmentJobSerializer
+    permission_classes = [AllowAny]
+    queryset = api_models.FulfilmentJob.objects.select_related("order")
+    lookup_field = "order__cart_order_id"
+    lookup_url_kwarg = "cart_order_id"
+
+
+# 🧐webhook 为什么不用登录？
+# 答：调用方是 Stripe/PayPal/支付宝 的服务器，没有我们的JWT；通知是否可信靠验签判断（见api/webhooks.py）。
+# 验签用的是原始请求体，所以要先读 request.body，再去碰 request.data
+@api_view(("POST",))
+@authentication_classes([])
+@permission_classes([AllowAny])
+def stripe_webhook(request):
+    body = request.body
+    try:
+        notice = webhooks.parse_stripe(body, request.headers.get("Stripe-Signature"))
+        event, created = webhooks.process("stripe", notice, request.data)
+    except webhooks.WebhookError as e:
+        return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({"result": event.result, "duplicate": not created})
+
+
+@api_view(("POST",))
+@authentication_classes([])
+@permission_classes([AllowAny])
+def paypal_webhook(request):
+    body = request.body
+    try:
+        notice = webhooks.parse_paypal(body, request.headers)
+        event, created = webhooks.process("paypal", notice, request.data)
+    except webhooks.WebhookError as e:
+        return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({"result": event.result, "duplicate": not created})
+
+
+@api_view(("POST",))
+@authentication_classes([])
+@permission_classes([AllowAny])
+def alipay_webhook(request):
+    # 支付宝的异步通知是表单格式，只认响应体 success，其他内容都会重复推送
+    params = request.POST.dict()
+    try:
+        notice = webhooks.parse_alipay(params)
+        webhooks.process("alipay", notice, params)
+    except webhooks.WebhookError:
+        return HttpResponse("fail")
+    return HttpResponse("success")
+
+
+class SearchCourseAPIView(QueryBudgetMixin, generics.ListAPIView):
     serializer_class = api_serializer.CourseSerializer
     permission_classes = [AllowAny]
+    # 分页时保持相关度顺序（见api/pagination.py的RankedPagination）
+    pagination_class = RankedPagination
+    query_budget = COURSE_QUERY_BUDGET
 
     def get_queryset(self):
         query = self.request.GET.get("query")  # 🧐为什么这个request可以直接调用？
-        return api_models.Course.objects.filter(
-            title__icontains=query,
-            platform_status="Published",
-            teacher_course_status="Published",
+        # 通过全文索引搜索标题、描述、分类和教师名字，结果按相关度排序（见api/search.py）
+        queryset = search.search_courses(
+            api_models.Course.objects.filter(
+                platform_status="Published",
+                teacher_course_status="Published",
+            ),
+            query,
         )
-
-
-def get_access_token(client_id, secret_key):
-    token_url = "https://api.sandbox.paypal.com/v1/oauth2/token"
-    data = {"grant_type": "client_credentials"}
-    auth = (client_id, secret_key)
-    response = requests.post(token_url, data=data, auth=auth)
-
-    if response.status_code == 200:
-        print("Access Token =====", response.json()["access_token"])
-        return response.json()["access_token"]
-    else:
-        raise Exception(
-            f"Failed to get access token from paypal {response.status_code}"
+        return api_serializer.CourseSerializer.setup_eager_loading(
+            queryset, self.get_serializer_context()
         )
 
 
@@ -835,13 +885,17 @@ class StudentSummaryAPIView(generics.ListAPIView):
 
 
 class StudentCourseListAPIView(generics.ListAPIView):
-    serializer_class = api_serializer.EnrolledCourseSerializer
+    # 列表只返回课程卡片和学习进度，课时/大纲/笔记/问答可以用 ?expand= 按需加上，
+    # 完整的数据在 StudentCourseDetailAPIView（见StudentCourseSummarySerializer）
+    serializer_class = api_serializer.StudentCourseSummarySerializer
     permission_classes = [AllowAny]
 
     def get_queryset(self):
         user_id = self.kwargs["user_id"]
         user = User.objects.get(id=user_id)
-        return api_models.EnrolledCourse.objects.filter(user=user)
+        return api_models.EnrolledCourse.objects.filter(user=user).select_related(
+            "course", "teacher", "last_completed_lesson"
+        )
 
 
 class StudentCourseDetailAPIView(generics.RetrieveAPIView):
@@ -883,14 +937,19 @@ class StudentCourseCompletedCreateAPIView(generics.CreateAPIView):
         ).first()  # 🧐这里用get行吗？
 
         # 如果completed_lessons存在的话，说明已经是标记为完成的状态了，那么触发当前的api视图就要把它从数据库中删去
+        # 完成记录变化后重算报名记录上的学习进度（见api/progress.py）
         if completed_lessons:
-            completed_lessons.delete()
+            with transaction.atomic():
+                completed_lessons.delete()
+                progress.refresh_student(user, course)
             return Response({"message": "当前小节标记为未完成❌"})
         else:
             # 否则，我们就去创建这条记录，也就是将当前的小节：variant_item标记为完成，同时返回一个message提示
-            api_models.CompletedLesson.objects.create(
-                user=user, course=course, variant_item=variant_item
-            )
+            with transaction.atomic():
+                api_models.CompletedLesson.objects.create(
+                    user=user, course=course, variant_item=variant_item
+                )
+                progress.refresh_student(user, course)
             return Response({"message": "当前小节标记为完成✅"})
 
 
@@ -910,70 +969,77 @@ class StudentCourseCompletedSyncAPIView(generics.GenericAPIView):
             user = get_object_or_404(api_models.User, id=user_id)
             course = get_object_or_404(api_models.Course, course_id=course_id)
 
-            # 获取该课程的所有VariantItem
-            all_variant_items = api_models.VariantItem.objects.filter(
-                variant__course=course
-            )
-
-            # 获取当前已完成的记录
+            # 🧐为什么不再对每个新完成的课时 get_object_or_404 + create？
+            # 答：一次同步可能带几百个课时，逐条查询/插入就是几百条SQL。现在：
+            # 1. 一条查询取出这门课所有课时的 (variant_item_id, 主键, 是否已完成)，
+            #    同时得到课时总数用来换算进度；是否已完成用 Exists 子查询在同一条SQL里算出来
+            # 2. 需要删除的用一条 DELETE，需要新增的用一条 bulk_create 插入，
+            #    (user, variant_item) 唯一约束 + ignore_conflicts 挡掉并发同步时已经插入的记录
             current_completed = api_models.CompletedLesson.objects.filter(
                 user=user, course=course
             )
-            # 获取当前已完成的variant_item_id集合
-            # values_list() 是Django ORM的方法，用于从QuerySet中提取特定字段的值
-            # 第一个参数 'variant_item__variant_item_id'：指定要提取的字段路径
-            #   - 使用双下划线 __ 进行 跨表关联 查询
-            #   - variant_item 是 CompletedLesson 模型的外键字段
-            #   - variant_item_id 是 VariantItem 模型的字段
-            #   - 完整路径表示：获取CompletedLesson关联的VariantItem的variant_item_id字段值
-
-            # 第二个参数 flat=True：将返回结果扁平化
-            #   - 如果为False（默认）：返回元组列表 [('id1',), ('id2',), ...]
-            #   - 如果为True：返回扁平列表 ['id1', 'id2', ...]
-            # set() 将列表转换为集合，用于后续的集合运算（求差集、交集等），提高查找效率
-            current_completed_ids = set(
-                current_completed.values_list(
-                    "variant_item__variant_item_id", flat=True
+            lectures = {}
+            current_pks = set()
+            for variant_item_id, pk, done in (
+                api_models.VariantItem.objects.filter(variant__course=course)
+                .annotate(
+                    done=models.Exists(
+                        current_completed.filter(variant_item=models.OuterRef("pk"))
+                    )
                 )
-            )
-
-            # 目标完成状态
-            # 将前端传来的completed_variant_ids列表转换为集合
-            # 使用set便于与current_completed_ids进行集合运算
+                .values_list("variant_item_id", "id", "done")
+            ):
+                lectures[variant_item_id] = pk
+                if done:
+                    current_pks.add(pk)
+
+            # 目标完成状态：前端传来的 variant_item_id 换成这门课里对应课时的主键
+            # 使用set便于与当前已完成的记录做集合运算（求差集）
             target_completed_ids = set(completed_variant_ids)
+            # 🧐不属于这门课的课时为什么不直接报错？
+            # 答：教师删掉课时之后，前端缓存里可能还留着旧的课时ID，一个过期的ID不应该让整次同步失败，
+            # 这里跳过它们，在 ignored_ids 里返回给前端
+            ignored_ids = sorted(target_completed_ids - lectures.keys(), key=str)
+            target_pks = {
+                lectures[variant_item_id]
+                for variant_item_id in target_completed_ids
+                if variant_item_id in lectures
+            }
+
             # 需要删除的记录（当前已完成但目标未完成）
-            # 例子：current_completed_ids = {'lesson_1', 'lesson_2', 'lesson_3'}
-            #       target_completed_ids = {'lesson_1', 'lesson_4', 'lesson_5'}
-            #       to_delete_ids = {'lesson_2', 'lesson_3'}  # 数据库中有但前端没有的
-            to_delete_ids = current_completed_ids - target_completed_ids
-
-            if to_delete_ids:
-                api_models.CompletedLesson.objects.filter(
-                    user=user,
-                    course=course,
-                    variant_item__variant_item_id__in=to_delete_ids,
-                ).delete()
-
-            # 需要创建的记录（目标已完成但当前未完成）
-            # 例子：current_completed_ids = {'lesson_1', 'lesson_2', 'lesson_3'}
-            #       target_completed_ids = {'lesson_1', 'lesson_4', 'lesson_5'}
-            #       to_create_ids = {'lesson_4', 'lesson_5'}  # 前端有但数据库中没有的
-            to_create_ids = target_completed_ids - current_completed_ids
-            if to_create_ids:
-                for variant_item_id in to_create_ids:
-                    variant_item = get_object_or_404(
-                        api_models.VariantItem, variant_item_id=variant_item_id
-                    )
-                    api_models.CompletedLesson.objects.create(
-                        user=user, course=course, variant_item=variant_item
+            # 例子：current_pks = {1, 2, 3}，target_pks = {1, 4, 5}
+            #       to_delete_pks = {2, 3}  # 数据库中有但前端没有的
+            #       to_create_pks = {4, 5}  # 前端有但数据库中没有的
+            to_delete_pks = current_pks - target_pks
+            to_create_pks = target_pks - current_pks
+
+            with transaction.atomic():
+                if to_delete_pks:
+                    current_completed.filter(variant_item_id__in=to_delete_pks).delete()
+                if to_create_pks:
+                    api_models.CompletedLesson.objects.bulk_create(
+                        [
+                            api_models.CompletedLesson(
+                                user=user, course=course, variant_item_id=pk
+                            )
+                            for pk in to_create_pks
+                        ],
+                        ignore_conflicts=True,
                     )
+                if to_delete_pks or to_create_pks:
+                    # 报名记录上的学习进度（见api/progress.py）
+                    progress.refresh_student(user, course)
 
+            # 同步之后已完成的课时正好是目标集合，进度不用再查一次数据库
+            percent = round(len(target_pks) * 100 / len(lectures)) if lectures else 0
             return Response(
                 {
                     "message": "课程完成状态同步成功",
-                    "total_completed": len(target_completed_ids),
-                    "deleted_count": len(to_delete_ids),
-                    "created_count": len(to_create_ids),
+                    "total_completed": len(target_pks),
+                    "deleted_count": len(to_delete_pks),
+                    "created_count": len(to_create_pks),
+                    "progress": percent,
+                    "ignored_ids": ignored_ids,
                 }
             )
 
@@ -1117,7 +1183,11 @@ class StudentWishListListCreateAPIView(generics.ListCreateAPIView):
         user_id = self.kwargs["user_id"]
         user = get_object_or_404(api_models.User, id=user_id)
 
-        return api_models.Wishlist.objects.filter(user=user)
+        return api_serializer.CourseSerializer.setup_eager_loading(
+            api_models.Wishlist.objects.filter(user=user),
+            self.get_serializer_context(),
+            path="course",
+        )
 
     def create(self, request, *args, **kwargs):
         user_id = self.kwargs["user_id"]
@@ -1254,60 +1324,16 @@ class QuestionAnswerMessageSendAPIView(generics.CreateAPIView):
 @api_view(("GET",))
 def TeacherSummaryAPIView(request, teacher_id):
     teacher = get_object_or_404(api_models.Teacher, id=teacher_id)
-
-    one_month_ago = datetime.today() - timedelta(
-        days=28
-    )  # 🧐为什么days=28? 答：28天正好是4周（28÷7=4），比30天更准确地代表一个月的时间，避免月份天数不同的影响
-    total_courses = api_models.Course.objects.filter(teacher=teacher).count()
-    total_revenue = (
-        api_models.CartOrderItem.objects.filter(
-            teacher=teacher, order__payment_status="Paid"
-        ).aggregate(total_revenue=models.Sum("price"))["total_revenue"]
-        or 0
-    )  # 🧐这里为什么是：total_revenue=？还有这里aggregate的后面的写法都看不懂
-    # 答：aggregate是Django的聚合函数，total_revenue=是给聚合结果起的别名。models.Sum("price")计算price字段的总和。
-    # aggregate返回一个字典，如{"total_revenue": 1000.00}，所以用["total_revenue"]取出具体值。
-    # "or 0"是因为如果没有记录，Sum返回None，这时用0代替
-    monthly_revenue = (
-        api_models.CartOrderItem.objects.filter(
-            teacher=teacher, order__payment_status="Paid", date__gte=one_month_ago
-        ).aggregate(total_revenue=models.Sum("price"))["total_revenue"]
-        or 0
-    )  # 🧐date__gte是什么？ 答：Django查询语法，gte = Greater Than or Equal，即"大于等于"，date__gte=one_month_ago表示日期大于等于一个月前
-    enrolled_courses = api_models.EnrolledCourse.objects.filter(teacher=teacher)
-    unique_student_ids = set()
-    students = []
-
-    for course in enrolled_courses:
-        # 🧐这里难道不是:course.user.id? enrolled_courses没有user_id这个属性啊？
-        # 答：Django的外键字段会自动生成一个_id属性，如user外键会有user_id属性直接存储关联对象的ID，
-        # 使用course.user_id比course.user.id更高效，因为前者不需要查询数据库获取User对象
-        if course.user_id not in unique_student_ids:
-            user = User.objects.get(id=course.user_id)
-            student = {
-                "full_name": user.profile.full_name,
-                "image": user.profile.image.url,  # 🧐profile.image有url属性？ 答：Django的FileField和ImageField都有url属性，返回文件的可访问URL路径
-                "country": user.profile.country,
-                "date": course.date,
-            }
-            students.append(student)
-            unique_student_ids.add(course.user_id)
-
-    return Response(
-        [
-            {
-                "total_courses": total_courses,
-                "total_revenue": total_revenue,
-                "monthly_revenue": monthly_revenue,
-                "total_students": len(students),
-            }
-        ]
-    )
+    # 课程数、收入、学生数都由数据库聚合（见api/teacher_stats.py），查询次数和学生数量无关
+    # ?start=YYYY-MM-DD&end=YYYY-MM-DD 可以额外查询任意一段时间的销售数据
+    start, end = rollups.date_range(request.query_params)
+    return Response([teacher_stats.teacher_summary(teacher, start, end)])
 
 
 class TeacherCourseListAPIView(generics.ListAPIView):
     serializer_class = api_serializer.TeacherCourseListSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         teacher_id = self.kwargs["teacher_id"]
@@ -1318,6 +1344,7 @@ class TeacherCourseListAPIView(generics.ListAPIView):
 class TeacherReviewListAPIView(generics.ListAPIView):
     serializer_class = api_serializer.ReviewSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         teacher_id = self.kwargs["teacher_id"]
@@ -1345,29 +1372,26 @@ class TeacherReviewDetailAPIView(generics.RetrieveUpdateAPIView):
         )
 
 
-class TeacherStudentsListAPIView(viewsets.ViewSet):
+class TeacherStudentPagination(KeysetPagination):
+    # 学生列表按首次报名时间排序，见teacher_stats.teacher_students
+    date_field = "first_enrolled"
 
-    def list(self, request, teacher_id=None):
-        teacher = api_models.Teacher.objects.get(id=teacher_id)
 
-        enrolled_courses = api_models.EnrolledCourse.objects.filter(teacher=teacher)
-        unique_student_ids = set()
-        students = []
-
-        for course in enrolled_courses:
-            if course.user_id not in unique_student_ids:
-                user = User.objects.get(id=course.user_id)
-                student = {
-                    "full_name": user.profile.full_name,
-                    "image": user.profile.image.url,
-                    "country": user.profile.country,
-                    "date": course.date,
-                }
+class TeacherStudentsListAPIView(viewsets.GenericViewSet):
+    pagination_class = TeacherStudentPagination
 
-                students.append(student)
-                unique_student_ids.add(course.user_id)
+    def list(self, request, teacher_id=None):
+        teacher = get_object_or_404(api_models.Teacher, id=teacher_id)
 
-        return Response(students)
+        # 🧐为什么不再遍历报名记录逐个查询学生？
+        # 答：一条GROUP BY查询就能拿到去重后的学生资料和首次报名时间，学生再多也只有一条查询
+        students = teacher_stats.teacher_students(teacher)
+        page = self.paginate_queryset(students)
+        if page is not None:
+            return self.get_paginated_response(
+                [teacher_stats.student_row(profile) for profile in page]
+            )
+        return Response([teacher_stats.student_row(profile) for profile in students])
 
 
 # 🧐为什么这里要用 @api_view ？用generics.RetriveView然后重写get_object方法不可以吗？
@@ -1392,32 +1416,12 @@ class TeacherStudentsListAPIView(viewsets.ViewSet):
 @api_view(("GET",))
 def TeacherAllMonthEarningAPIView(request, teacher_id):
     teacher = get_object_or_404(api_models.Teacher, id=teacher_id)
-    # 🧐帮我解释一下monthly_earning_tracker，其中有很多不懂的函数，它们分别在做什么？
-
-    # 答：这是一个复杂的Django ORM查询，逐步解析如下：
-    # 1. filter(teacher=teacher, order__payment_status="Paid")
-    #    - 筛选属于该教师且订单状态为"已支付"的购物车订单项
-    #    - order__payment_status使用双下划线跨表查询，访问关联订单的支付状态
-    # 2. .annotate(month=ExtractMonth("date"))
-    #    - 为每条记录添加一个名为"month"的计算字段
-    #    - ExtractMonth从date字段中提取月份数字(1-12)
-    # 3. .values("month")
-    #    - 按月份分组，只选择month字段，准备进行分组聚合
-    # 4. .annotate(total_earning=models.Sum("price"))
-    #    - 对每个月份分组计算price字段的总和，命名为total_earning
-    # 5. .order_by("month")
-    #    - 按月份排序，确保结果按时间顺序返回
-    # 最终返回：[{"month": 1, "total_earning": 1000}, {"month": 2, "total_earning": 1500}, ...]
-    # 👉👉👉👉👉👀 具体步骤流程看文档:/Users/huangwenxin/scripts/typoraDocuments/全栈/Python Web开发/React+Django课程管理项目(LMS)/技术课程项目.md -> Django ORM查询 monthly_earning_tracker 详解
-    monthly_earning_tracker = (
-        api_models.CartOrderItem.objects.filter(
-            teacher=teacher, order__payment_status="Paid"
-        )
-        .annotate(month=ExtractMonth("date"), year=ExtractYear("date"))
-        .values("month", "year")
-        .annotate(total_earning=models.Sum("price"))
-        .order_by("month")
-    )
+    # 🧐为什么不直接按月聚合 CartOrderItem？
+    # 答：原来的 monthly_earning_tracker 查询每次请求都要扫描教师全部已支付的订单项，
+    # 而且只按 month 排序，不同年份的同一个月会混在一起。
+    # 现在读按月预先汇总好的 TeacherMonthlyStat（见api/rollups.py），按年月排序，
+    # 支持 ?start=YYYY-MM-DD&end=YYYY-MM-DD 查询任意一段时间，首尾不满一个月的部分从日表汇总
+    start, end = rollups.date_range(request.query_params)
     MONTH_NAMES = {
         1: "January",
         2: "February",
@@ -1433,10 +1437,18 @@ def TeacherAllMonthEarningAPIView(request, teacher_id):
         12: "December",
     }
 
-    # 在返回Response前处理数据
-    for item in monthly_earning_tracker:
-        item["month_name"] = MONTH_NAMES[item["month"]]
-
+    monthly_earning_tracker = [
+        {
+            "year": month.year,
+            "month": month.month,
+            "month_name": MONTH_NAMES[month.month],
+            "total_earning": totals["revenue"],
+            "orders": totals["orders"],
+            "new_students": totals["new_students"],
+            "refunds": totals["refunds"],
+        }
+        for month, totals in rollups.monthly_series(teacher, start, end)
+    ]
     return Response(monthly_earning_tracker)
 
 
@@ -1445,42 +1457,49 @@ class TeacherBestSellingCourseAPIView(viewsets.ViewSet):
 
     def list(self, request, teacher_id=None):
         teacher = get_object_or_404(api_models.Teacher, id=teacher_id)
-        courses_with_total_price = []
-        courses = api_models.Course.objects.filter(teacher=teacher)
-
-        for course in courses:
-            # 🧐为什么是course.enrolledcourse_set？course并没有enrolledcourse也没有enrolledcourse_set这个字段呀？
-            # 答：这是Django的反向关系查询机制：
-            # 1. 在EnrolledCourse模型中有：course = models.ForeignKey(Course, on_delete=models.CASCADE)
-            # 2. Django自动为Course模型创建反向查询管理器：enrolledcourse_set
-            # 3. 命名规则：小写的模型名 + _set，所以EnrolledCourse -> enrolledcourse_set
-            # 4. 通过这个管理器可以查询到所有购买了该课程的注册记录
-            # 5. 相当于：EnrolledCourse.objects.filter(course=course)
-            revenue = (
-                course.enrolledcourse_set.aggregate(
-                    total_price=models.Sum("order_item__price")
-                )["total_price"]
-                or 0
+        # 🧐为什么不再对每门课程的enrolledcourse_set做聚合？
+        # 答：收入（revenue）和销量（enrollment_count）是Course上的冗余字段（见api/counters.py），
+        # 一条查询就能取出并在SQL里按收入排序
+        courses = api_models.Course.objects.filter(teacher=teacher).order_by(
+            "-revenue", "-enrollment_count", "id"
+        )
+        start, end = rollups.date_range(request.query_params)
+        if start or end:
+            # 指定了 ?start=&end= 时按这段时间的销售汇总（见api/rollups.py）排序
+            totals = rollups.sales_totals(
+                "course", start, end, group_by="course", course__teacher=teacher
             )
-            # 这个sales是什么意思？
-            # 答：sales表示该课程的销售数量，即有多少人购买了这个课程
-            # count()统计该课程的注册学习记录数量，每条记录代表一次购买
-            sales = course.enrolledcourse_set.count()
-
-            courses_with_total_price.append(
+            empty = rollups.empty_totals()
+            courses_with_total_price = [
                 {
                     "course_image": course.image.url,
                     "course_title": course.title,
-                    "revenue": revenue,  # 该课程的总收入
-                    "sales": sales,  # 该课程的销售数量
+                    "revenue": totals.get(course.id, empty)["revenue"],
+                    "sales": totals.get(course.id, empty)["orders"],
                 }
+                for course in courses
+            ]
+            courses_with_total_price.sort(
+                key=lambda row: (-row["revenue"], -row["sales"])
             )
+            return Response(courses_with_total_price)
+
+        courses_with_total_price = [
+            {
+                "course_image": course.image.url,
+                "course_title": course.title,
+                "revenue": course.revenue,  # 该课程的总收入
+                "sales": course.enrollment_count,  # 该课程的销售数量
+            }
+            for course in courses
+        ]
         return Response(courses_with_total_price)
 
 
 class TeacherCourseOrdersListAPIView(generics.ListAPIView):
     serializer_class = api_serializer.CartOrderItemSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         teacher_id = self.kwargs["teacher_id"]
@@ -1511,6 +1530,28 @@ class TeacherCouponListCreateAPIView(generics.ListCreateAPIView):
         teacher = get_object_or_404(api_models.Teacher, id=teacher_id)
         return api_models.Coupon.objects.filter(teacher=teacher)
 
+    def create(self, request, *args, **kwargs):
+        # 带 quantity 时是给活动批量生成一次性优惠券，否则和原来一样创建一张
+        if "quantity" not in request.data:
+            return super().create(request, *args, **kwargs)
+        # 批量生成的优惠券可以直接拿去用，只允许教师本人生成
+        if not request.user.is_authenticated:
+            raise NotAuthenticated()
+        teacher = get_object_or_404(api_models.Teacher, id=self.kwargs["teacher_id"])
+        if teacher.user_id != request.user.id:
+            raise PermissionDenied("只能给自己生成优惠券")
+        serializer = api_serializer.CouponBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        new_coupons = coupons.generate_coupons(teacher, **serializer.validated_data)
+        return Response(
+            {
+                "message": "Coupons Generated Successfully!",
+                "count": len(new_coupons),
+                "codes": [coupon.code for coupon in new_coupons],
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
 
 class TeacherCouponDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
     """使用RetrieveUpdateDestroyAPIView是因为教师可以更新，获取，删除优惠券"""
@@ -1581,72 +1622,14 @@ class CourseCreateAPIView(generics.CreateAPIView):
                 f"Course created with ID: {course_instance.id}, Title: '{course_instance.title}'"
             )
 
-            # 重构后的variant数据处理逻辑
-            variant_data = []
-
-            # 首先收集所有variant的标题
-            variant_titles = {}
-            for key, value in self.request.data.items():
-                if key.startswith("variants") and "[variant_title]" in key:
-                    # 提取variant索引：variants[0][variant_title] -> 0
-                    index = key.split("[")[1].split("]")[0]
-                    variant_titles[index] = value
-            console.print(f"variant_titles: {variant_titles}")
-
-            # 为每个variant处理其items
-            for variant_index, variant_title in variant_titles.items():
-                console.print(f"Processing variant {variant_index}: {variant_title}")
-                # 收集该variant下的所有items
-                items_data = {}  # {item_index: {field_name: value}}
-
-                for key, value in self.request.data.items():
-                    # 匹配格式：variants[0][items][0][title]
-                    if f"variants[{variant_index}][items]" in key:
-                        # 解析item索引和字段名
-                        parts = key.split("][")
-                        if len(parts) >= 3:
-                            item_index = parts[2].split("]")[0]  # 获取item索引
-                            field_name = parts[3].split("]")[0]  # 获取字段名
-
-                            if item_index not in items_data:
-                                items_data[item_index] = {}
-                            items_data[item_index][field_name] = value
-
-                # 转换为列表格式
-                item_data_list = []
-                for item_index in sorted(items_data.keys()):
-                    item_data_list.append(items_data[item_index])
-
-                variant_data.append(
-                    {
-                        "variant_data": {"title": variant_title},
-                        "variant_item_data": item_data_list,
-                    }
-                )
-
-            console.print(f"Total variants processed: {len(variant_data)}")
-
-            # 处理variant数据（在同一个事务中）
-            for data_entry in variant_data:
-                variant = api_models.Variant.objects.create(
-                    title=data_entry["variant_data"]["title"], course=course_instance
-                )
-
-                for item_data in data_entry["variant_item_data"]:
-                    preview_value = item_data.get("preview")
-                    preview = (
-                        bool(strtobool(str(preview_value)))
-                        if preview_value is not None
-                        else False
-                    )
-
-                    api_models.VariantItem.objects.create(
-                        variant=variant,
-                        title=item_data.get("title"),
-                        description=item_data.get("description"),
-                        file=item_data.get("file"),
-                        preview=preview,
-                    )
+            # 一次遍历解析出所有章节和课时，再批量插入（见api/curriculum.py）
+            curriculum_data = curriculum.parse_curriculum(self.request.data)
+            variants, items = curriculum.create_curriculum(
+                course_instance, curriculum_data
+            )
+            console.print(
+                f"Total variants processed: {len(variants)}, items: {len(items)}"
+            )
 
     def save_nested_data(self, course_instance, serializer_class, data):
         """这是什么方法？自定义的？它在干嘛？"""
@@ -1689,7 +1672,7 @@ class CourseUpdateAPIView(generics.RetrieveUpdateAPIView):
             )
 
             # 3. 返回完整的更新后数据
-            return self.get_updated_response(course)
+            return self.get_updated_response(course, variants_updated)
 
         except Exception as e:
             console.print(f"[UPDATE] 更新失败: {e}")
@@ -1949,6 +1932,11 @@ class CourseUpdateAPIView(generics.RetrieveUpdateAPIView):
             # 刷新course对象
             course.refresh_from_db()
 
+            # update()不会发出post_save信号，需要手动更新搜索索引和响应缓存
+            search.index_course(course)
+            response_cache.invalidate_course(course.id, course.teacher_id)
+            response_cache.invalidate("categories")
+
             # 验证更新结果
             for field_name in update_data:
                 current_value = getattr(course, field_name)
@@ -1975,8 +1963,8 @@ class CourseUpdateAPIView(generics.RetrieveUpdateAPIView):
             console.print(f"[SAFE_VARIANT] variants错误详情: {traceback.format_exc()}")
             return False
 
-    def get_updated_response(self, course):
-        """获取更新后的完整课程数据"""
+    def get_updated_response(self, course, curriculum_changes=None):
+        """获取更新后的完整课程数据，附带本次大纲的变更统计"""
         # 确保获取最新数据
         course.refresh_from_db()
 
@@ -1988,149 +1976,20 @@ class CourseUpdateAPIView(generics.RetrieveUpdateAPIView):
         console.print(
             f"[UPDATE] 返回完整数据，variants数量: {course.curriculum().count()}"
         )
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data = dict(serializer.data)
+        if curriculum_changes:
+            data["curriculum_changes"] = curriculum_changes
+        return Response(data, status=status.HTTP_200_OK)
 
     def update_variant(self, course, request_data):
-        """更新课程variants - 注意：此方法应该在事务中被调用"""
-        console.print(f"[UPDATE_VARIANT] 开始处理variants更新")
-        console.print(f"[UPDATE_VARIANT] 接收到的数据键: {list(request_data.keys())}")
-
-        # 解析FormData中的variant数据（扁平化格式）
-        variant_titles = {}
-        for key, value in request_data.items():
-            if key.startswith("variants") and "[variant_title]" in key:
-                index = key.split("[")[1].split("]")[0]
-                variant_titles[index] = value
-
-        console.print(f"[UPDATE_VARIANT] 解析到的variant_titles: {variant_titles}")
-
-        for variant_index, variant_title in variant_titles.items():
-            console.print(
-                f"[UPDATE_VARIANT] 处理variant {variant_index}: {variant_title}"
-            )
-
-            # 获取variant_id（如果存在）
-            variant_id_key = f"variants[{variant_index}][variant_id]"
-            variant_id = request_data.get(variant_id_key)
-
-            # 收集该variant下的所有items
-            items_data = {}
-            for key, value in request_data.items():
-                if f"variants[{variant_index}][items]" in key:
-                    parts = key.split("][")
-                    if len(parts) >= 3:
-                        item_index = parts[2].split("]")[0]
-                        field_name = parts[3].split("]")[0]
-                        if item_index not in items_data:
-                            items_data[item_index] = {}
-                        items_data[item_index][field_name] = value
-
-            item_data_list = []
-            for item_index in sorted(items_data.keys()):
-                item_data_list.append(items_data[item_index])
-
-            console.print(
-                f"[UPDATE_VARIANT] variant_id: {variant_id}, items数量: {len(item_data_list)}"
-            )
-
-            existing_variant = None
-            if variant_id:
-                existing_variant = course.variant_set.filter(id=variant_id).first()
-
-            if existing_variant:
-                existing_variant.title = variant_title
-                existing_variant.save()
-                console.print(
-                    f"[UPDATE_VARIANT] 更新现有variant: {existing_variant.title}"
-                )
-
-                for item_data in item_data_list:
-                    preview_value = item_data.get("preview")
-                    preview = (
-                        bool(strtobool(str(preview_value)))
-                        if preview_value is not None
-                        else False
-                    )
-
-                    # 查找现有的variant_item
-                    variant_item_id = item_data.get("variant_item_id")
-                    variant_item = None
-                    if variant_item_id:
-                        variant_item = api_models.VariantItem.objects.filter(
-                            variant_item_id=variant_item_id
-                        ).first()
-
-                    title = item_data.get("title")
-                    description = item_data.get("description")
-                    file_data = item_data.get("file")
-
-                    if variant_item:
-                        # 更新现有item
-                        variant_item.title = title
-                        variant_item.description = description
-                        variant_item.preview = preview
-
-                        # 处理文件更新
-                        if (
-                            file_data
-                            and not str(file_data).startswith("http://")
-                            and str(file_data) != "null"
-                        ):
-                            variant_item.file = file_data
-
-                        variant_item.save()
-                        console.print(
-                            f"[UPDATE_VARIANT] 更新现有item: {variant_item.title}"
-                        )
-                    else:
-                        # 创建新item
-                        file_value = (
-                            file_data
-                            if file_data and str(file_data) != "null"
-                            else None
-                        )
-
-                        variant_item = api_models.VariantItem.objects.create(
-                            variant=existing_variant,
-                            title=title,
-                            description=description,
-                            file=file_value,
-                            preview=preview,
-                        )
-                        console.print(
-                            f"[UPDATE_VARIANT] 创建新item: {variant_item.title}"
-                        )
-
-            else:
-                # 创建新variant
-                new_variant = api_models.Variant.objects.create(
-                    course=course, title=variant_title
-                )
-                console.print(f"[UPDATE_VARIANT] 创建新variant: {new_variant.title}")
-
-                for item_data in item_data_list:
-                    preview_value = item_data.get("preview")
-                    preview = (
-                        bool(strtobool(str(preview_value)))
-                        if preview_value is not None
-                        else False
-                    )
-
-                    file_data = item_data.get("file")
-                    file_value = (
-                        file_data if file_data and str(file_data) != "null" else None
-                    )
-
-                    api_models.VariantItem.objects.create(
-                        variant=new_variant,
-                        title=item_data.get("title"),
-                        description=item_data.get("description"),
-                        file=file_value,
-                        preview=preview,
-                    )
-                    console.print(
-                        f"[UPDATE_VARIANT] 为新variant创建item: {item_data.get('title')}"
-                    )
+        """
+        更新课程variants - 和数据库里的大纲做diff后批量写入（见api/curriculum.py）
+        返回变更统计
+        """
+        curriculum_data = curriculum.parse_curriculum(request_data)
+        changes = curriculum.sync_curriculum(course, curriculum_data)
+        console.print(f"[UPDATE_VARIANT] 大纲变更: {changes}")
+        return changes
 
     def save_nested_data(self, course_instance, serializer_class, data):
         serializer = serializer_class(
@@ -0,0 +1,168 @@
+"""
+支付服务商的 webhook（异步通知）：Stripe、PayPal、支付宝
+
+🧐为什么要 webhook？
+答：原来只能靠浏览器跳回支付成功页再调用 PaymentSuccessAPIView，
+接口里还要同步请求 Stripe 的 Session.retrieve 或 PayPal 的订单接口确认支付结果；
+用户关掉页面订单就一直是 Processing，服务商那边慢一点，用户就要跟着等。
+
+现在服务商支付成功后直接通知我们：
+1. 在本地验签（Stripe 是 HMAC，PayPal 是证书 SHA256withRSA，证书按URL缓存；支付宝是 RSA2），
+   确认通知的过程中不需要再请求服务商
+2. 事件按 (服务商, 事件ID) 写进 PaymentEvent，唯一约束保证服务商重试推送同一个事件时只处理一次
+3. 核对金额后调用 orders.confirm_payment，和支付成功页走同一个入口，先到的那个生效
+
+PayPal 的订单需要前端在 purchase_units 里带上 custom_id（cart_order_id）才能对应到我们的订单。
+"""
+
+import json
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+import stripe
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from api import models as api_models
+from api import orders
+from utils import paypal
+
+
+class WebhookError(Exception):
+    """通知验签失败、没有配置密钥或者内容无法解析"""
+
+
+# order_lookup 是查找 CartOrder 的条件，amount 是通知里的支付金额（元/美元，不是分）
+Notice = namedtuple(
+    "Notice", ["event_id", "event_type", "order_lookup", "amount", "paid"]
+)
+
+STRIPE_PAID_EVENTS = (
+    "checkout.session.completed",
+    "checkout.session.async_payment_succeeded",
+)
+PAYPAL_PAID_EVENTS = ("PAYMENT.CAPTURE.COMPLETED", "CHECKOUT.ORDER.COMPLETED")
+ALIPAY_PAID_STATUSES = ("TRADE_SUCCESS", "TRADE_FINISHED")
+
+
+def to_decimal(value):
+    try:
+        return Decimal(str(value)) if value not in (None, "") else None
+    except InvalidOperation:
+        return None
+
+
+def parse_stripe(body, signature):
+    if not settings.STRIPE_WEBHOOK_SECRET:
+        raise WebhookError("STRIPE_WEBHOOK_SECRET 没有配置")
+    try:
+        event = stripe.Webhook.construct_event(
+            body, signature, settings.STRIPE_WEBHOOK_SECRET
+        )
+    except (ValueError, stripe.SignatureVerificationError) as e:
+        raise WebhookError(f"Stripe webhook 验签失败: {e}")
+
+    session = event["data"]["object"]
+    cart_order_id = session.get("client_reference_id")
+    if cart_order_id:
+        order_lookup = {"cart_order_id": cart_order_id}
+    else:
+        order_lookup = {"stripe_session_id": session.get("id")}
+    amount_total = session.get("amount_total")
+    return Notice(
+        event_id=event["id"],
+        event_type=event["type"],
+        order_lookup=order_lookup,
+        amount=Decimal(amount_total) / 100 if amount_total is not None else None,
+        paid=event["type"] in STRIPE_PAID_EVENTS
+        and session.get("payment_status") == "paid",
+    )
+
+
+def parse_paypal(body, headers):
+    try:
+        verified = paypal.get_client().verify_webhook(
+            headers, body, settings.PAYPAL_WEBHOOK_ID
+        )
+    except paypal.PayPalError as e:
+        raise WebhookError(str(e))
+    if not verified:
+        raise WebhookError("PayPal webhook 验签失败")
+
+    try:
+        event = json.loads(body)
+    except ValueError:
+        raise WebhookError("PayPal webhook 内容不是合法的JSON")
+    event_type = event.get("event_type")
+    resource = event.get("resource") or {}
+    if event_type == "CHECKOUT.ORDER.COMPLETED":
+        # 订单事件：金额和 custom_id 在第一个 purchase_unit 里
+        resource = (resource.get("purchase_units") or [{}])[0]
+    return Notice(
+        event_id=event.get("id"),
+        event_type=event_type,
+        order_lookup={"cart_order_id": resource.get("custom_id")},
+        amount=to_decimal((resource.get("amount") or {}).get("value")),
+        paid=event_type in PAYPAL_PAID_EVENTS,
+    )
+
+
+def parse_alipay(params):
+    # 支付宝SDK在导入时会配置日志，用到时再导入
+    from utils import zhifubao
+
+    alipay = zhifubao.get_alipay()
+    if not alipay.verify_notification(params):
+        raise WebhookError("支付宝通知验签失败")
+    if params.get("app_id") != alipay.config.app_id:
+        raise WebhookError("支付宝通知的 app_id 不匹配")
+    return Notice(
+        event_id=params.get("notify_id"),
+        event_type=params.get("trade_status"),
+        order_lookup={"cart_order_id": params.get("out_trade_no")},
+        amount=to_decimal(params.get("total_amount")),
+        paid=params.get("trade_status") in ALIPAY_PAID_STATUSES,
+    )
+
+
+def resolve(notice):
+    """根据通知确认订单，返回 (处理结果, 订单)"""
+    if not notice.paid:
+        return "ignored", None
+    order = None
+    if all(notice.order_lookup.values()):
+        order = api_models.CartOrder.objects.filter(**notice.order_lookup).first()
+    if order is None:
+        return "order_not_found", None
+    if notice.amount is not None and notice.amount != order.total:
+        return "amount_mismatch", order
+    if orders.confirm_payment(order):
+        return "paid", order
+    return "already_paid", order
+
+
+def process(provider, notice, payload):
+    """
+    记录事件并确认订单，返回 (PaymentEvent, 是否第一次收到)。
+    重复推送的事件直接返回第一次的处理记录，不会再确认一次订单。
+    """
+    if not notice.event_id:
+        raise WebhookError("通知里没有事件ID")
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                event = api_models.PaymentEvent.objects.create(
+                    provider=provider,
+                    event_id=notice.event_id,
+                    event_type=notice.event_type,
+                    result="ignored",
+                    payload=payload,
+                )
+        except IntegrityError:
+            event = api_models.PaymentEvent.objects.get(
+                provider=provider, event_id=notice.event_id
+            )
+            return event, False
+        event.result, event.order = resolve(notice)
+        event.save(update_fields=["result", "order"])
+    return event, True
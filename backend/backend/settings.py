@@ -249,6 +249,33 @@ STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
 MEDIA_URL = "/media/"  # 127.0.0.1/media/avatar.jpg
 MEDIA_ROOT = BASE_DIR / "media"
 
+# 课时视频时长探测（见api/media_probe.py）
+# MEDIA_PROBE_ASYNC为False时在事务提交后同步探测（本地调试/测试用）
+MEDIA_PROBE_ASYNC = env.bool("MEDIA_PROBE_ASYNC", default=True)
+MEDIA_PROBE_WORKERS = env.int("MEDIA_PROBE_WORKERS", default=2)
+
+# 支付成功后的开通任务（见api/fulfilment.py）
+# FULFILMENT_ASYNC为False时在事务提交后同步执行（本地调试/测试用）
+FULFILMENT_ASYNC = env.bool("FULFILMENT_ASYNC", default=True)
+FULFILMENT_WORKERS = env.int("FULFILMENT_WORKERS", default=2)
+
+# 进程内的国家税率表（见api/carts.py）多少秒后重新读取：Country 修改时只有当前进程会立即失效，
+# 其他进程最多延迟这么久读到新的税率
+TAX_RATE_CACHE_TIMEOUT = env.int("TAX_RATE_CACHE_TIMEOUT", default=60)
+
+# 匿名购物车的过期清理（见api/carts.py 和 `python manage.py sweep_carts`）
+# 匿名购物车超过这么多天没有加入/更新课程就删除
+CART_ANONYMOUS_TTL_DAYS = env.int("CART_ANONYMOUS_TTL_DAYS", default=30)
+# 每一批最多删除多少个购物车，批次之间释放锁
+CART_SWEEP_BATCH_SIZE = env.int("CART_SWEEP_BATCH_SIZE", default=500)
+
+# 优惠券（见api/coupons.py）
+# 进程内按代码查找优惠券的LRU缓存：最多缓存多少个代码、多少秒后过期（其他进程修改了优惠券时最多延迟这么久）
+COUPON_CACHE_SIZE = env.int("COUPON_CACHE_SIZE", default=2048)
+COUPON_CACHE_TIMEOUT = env.int("COUPON_CACHE_TIMEOUT", default=60)
+# 一次最多批量生成多少张优惠券
+COUPON_BATCH_MAX = env.int("COUPON_BATCH_MAX", default=10000)
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -305,6 +332,46 @@ REST_FRAMEWORK = {
     ],
 }
 
+# 接口SQL条数预算（见api/query_budget.py）：为True时超出预算直接抛异常，否则只记录warning
+API_QUERY_BUDGET_STRICT = env.bool("API_QUERY_BUDGET_STRICT", default=DEBUG)
+
+# 公开目录接口的响应缓存（见api/response_cache.py）
+# API_RESPONSE_CACHE_BACKEND 可选 locmem / file / redis，redis 需要安装 redis 包，
+# LOCATION 对应文件缓存的目录或者 redis://host:port/db，任何兼容Redis协议的服务都可以
+# 🧐为什么默认是 file 而不是 locmem？
+# 答：失效靠缓存里的标签版本号，locmem 每个进程各有一份，gunicorn 多个 worker 时
+# 只有处理写请求的那个 worker 会失效，其他 worker 要等 API_RESPONSE_CACHE_TIMEOUT 过期。
+# file 在同一台机器的所有 worker 之间共享；多台机器部署时用 redis。locmem 只适合单进程的本地调试
+API_RESPONSE_CACHE_ENABLED = env.bool("API_RESPONSE_CACHE_ENABLED", default=True)
+API_RESPONSE_CACHE_ALIAS = "api_responses"
+API_RESPONSE_CACHE_TIMEOUT = env.int("API_RESPONSE_CACHE_TIMEOUT", default=300)
+API_RESPONSE_CACHE_BACKEND = env("API_RESPONSE_CACHE_BACKEND", default="file")
+API_RESPONSE_CACHE_BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "api-responses"),
+    "file": (
+        "django.core.cache.backends.filebased.FileBasedCache",
+        str(BASE_DIR / "cache" / "api-responses"),
+    ),
+    "redis": ("django.core.cache.backends.redis.RedisCache", "redis://127.0.0.1:6379/1"),
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    API_RESPONSE_CACHE_ALIAS: {
+        "BACKEND": API_RESPONSE_CACHE_BACKENDS[API_RESPONSE_CACHE_BACKEND][0],
+        "LOCATION": env(
+            "API_RESPONSE_CACHE_LOCATION",
+            default=API_RESPONSE_CACHE_BACKENDS[API_RESPONSE_CACHE_BACKEND][1],
+        ),
+        # redis 后端自己管理容量，OPTIONS 会原样传给 redis 客户端
+        "OPTIONS": {}
+        if API_RESPONSE_CACHE_BACKEND == "redis"
+        else {"MAX_ENTRIES": 5000},
+    },
+}
+
 # Swagger配置 - 修复国际化兼容性问题
 SWAGGER_SETTINGS = {
     # 安全认证配置 - 定义API文档中的JWT Bearer Token认证方式
@@ -463,6 +530,8 @@ ALIPAY_SELLER_Id = env("ALIPAY_SELLER_Id", default="")
 # Stripe
 STRIPE_SECRET_KEY = env('STRIPE_SECRET_KEY', default="")
 STRIPE_PUBLIC_KEY = env('STRIPE_PUBLIC_KEY', default="")
+# Stripe webhook 的签名密钥（Dashboard -> Webhooks -> Signing secret，whsec_开头）
+STRIPE_WEBHOOK_SECRET = env('STRIPE_WEBHOOK_SECRET', default="")
 
 FRONTEND_SITE_URL = env('FRONTEND_SITE_URL', default="http://localhost:3000")
 SITE_URL = env('SITE_URL', default="http://localhost:8000")
@@ -472,3 +541,13 @@ PAYPAL_CLIENT_ID = env('PAYPAL_CLIENT_ID', default="")
 PAYPAL_SECRET_ID = env('PAYPAL_SECRET_ID', default="")
 PAYPAL_RECEIVER_EMAIL = env('PAYPAL_RECEIVER_EMAIL', default="")
 PAYPAL_TEST = env.bool('PAYPAL_TEST', default=True)
+# PayPal webhook 的ID（Developer Dashboard -> Webhooks），验签时要用
+PAYPAL_WEBHOOK_ID = env('PAYPAL_WEBHOOK_ID', default="")
+# PayPal REST API 地址，本地离线调试时可以指向 utils/paypal_fake.py 启动的假服务
+PAYPAL_API_URL = env(
+    'PAYPAL_API_URL',
+    default="https://api-m.sandbox.paypal.com" if PAYPAL_TEST else "https://api-m.paypal.com",
+)
+# 请求PayPal的超时时间（秒）：建立连接 / 读取响应
+PAYPAL_CONNECT_TIMEOUT = env.float('PAYPAL_CONNECT_TIMEOUT', default=3.05)
+PAYPAL_READ_TIMEOUT = env.float('PAYPAL_READ_TIMEOUT', default=10)
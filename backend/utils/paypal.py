@@ -0,0 +1,217 @@
+"""
+PayPal REST API 客户端
+
+🧐为什么不每次都 requests.post 获取 access token？
+答：原来的 get_access_token 每校验一次支付都要先请求一次 OAuth 接口，
+而且每次都新建 TCP/TLS 连接，支付成功页的等待时间翻倍。
+PayPal 的 access token 本来就有有效期（expires_in，一般是几个小时），完全可以复用。
+
+现在：
+1. 整个进程共用一个 PayPalClient（get_client()），token 缓存在内存里，
+   到期前 TOKEN_REFRESH_MARGIN 秒就提前刷新，不会拿着快过期的 token 去请求
+2. 刷新时加锁并在锁内再检查一次（single-flight），多个线程同时发现过期也只会请求一次 OAuth 接口
+3. 所有请求走同一个 requests.Session，连接池复用 keep-alive 连接，每个请求都有超时
+4. 收到 401（token 被提前吊销）时丢掉缓存的 token，重新获取后再试一次
+
+webhook 验签（verify_webhook）在本地完成：PayPal 用自己的证书签名，证书按 URL 缓存，
+只有第一次遇到某个证书时才会下载一次。
+
+离线调试可以用 utils/paypal_fake.py 启动一个假的 PayPal 服务，把 PAYPAL_API_URL 指向它。
+"""
+
+import base64
+import binascii
+import threading
+import time
+import zlib
+from urllib.parse import urlparse
+
+import requests
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+# token 到期前多少秒就刷新
+TOKEN_REFRESH_MARGIN = 60
+
+# 连接池大小，和 gunicorn 每个进程的线程数差不多即可
+POOL_SIZE = 10
+
+# 只信任 PayPal 自己域名下的 webhook 证书
+CERT_HOST_SUFFIX = ".paypal.com"
+
+
+class PayPalError(Exception):
+    """请求PayPal失败：网络错误、超时或者非2xx响应"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def build_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class PayPalClient:
+    def __init__(self, client_id, secret, base_url, timeout=None, session=None):
+        self.client_id = client_id
+        self.secret = secret
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout or (
+            settings.PAYPAL_CONNECT_TIMEOUT,
+            settings.PAYPAL_READ_TIMEOUT,
+        )
+        self.session = session or build_session()
+        self._token = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+        self._certificates = {}
+
+    @property
+    def config(self):
+        return (self.client_id, self.secret, self.base_url)
+
+    def _cached_token(self):
+        if self._token and time.monotonic() < self._expires_at:
+            return self._token
+        return None
+
+    def get_access_token(self):
+        """取出缓存的 access token，过期（或快过期）时刷新"""
+        token = self._cached_token()
+        if token:
+            return token
+        with self._lock:
+            # 等锁的时候可能已经有别的线程刷新过了
+            token = self._cached_token()
+            if token:
+                return token
+            return self._fetch_token()
+
+    def invalidate_token(self, token):
+        """丢掉缓存的 token；别的线程已经换了新 token 时不动"""
+        with self._lock:
+            if self._token == token:
+                self._token = None
+
+    def _fetch_token(self):
+        response = self._send(
+            "POST",
+            "/v1/oauth2/token",
+            data={"grant_type": "client_credentials"},
+            auth=(self.client_id, self.secret),
+        )
+        if response.status_code != 200:
+            raise PayPalError(
+                f"Failed to get access token from paypal {response.status_code}",
+                response.status_code,
+            )
+        data = response.json()
+        expires_in = int(data.get("expires_in", 0))
+        self._token = data["access_token"]
+        self._expires_at = time.monotonic() + max(expires_in - TOKEN_REFRESH_MARGIN, 0)
+        return self._token
+
+    def _send(self, method, path, **kwargs):
+        try:
+            return self.session.request(
+                method, self.base_url + path, timeout=self.timeout, **kwargs
+            )
+        except requests.RequestException as e:
+            raise PayPalError(f"Paypal request failed: {e}") from e
+
+    def request(self, method, path, **kwargs):
+        """带 access token 请求PayPal，返回解析后的JSON"""
+        extra_headers = kwargs.pop("headers", {})
+        for retry in (False, True):
+            token = self.get_access_token()
+            headers = {
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {token}",
+                **extra_headers,
+            }
+            response = self._send(method, path, headers=headers, **kwargs)
+            if response.status_code == 401 and not retry:
+                self.invalidate_token(token)
+                continue
+            break
+        if not 200 <= response.status_code < 300:
+            raise PayPalError(
+                f"Paypal responded {response.status_code}", response.status_code
+            )
+        return response.json()
+
+    def get_order(self, order_id):
+        return self.request("GET", f"/v2/checkout/orders/{order_id}")
+
+    def webhook_certificate(self, cert_url):
+        """下载并缓存 webhook 签名证书"""
+        certificate = self._certificates.get(cert_url)
+        if certificate is not None:
+            return certificate
+        parsed = urlparse(cert_url)
+        if parsed.scheme != "https" or not (parsed.hostname or "").endswith(
+            CERT_HOST_SUFFIX
+        ):
+            raise PayPalError(f"Untrusted paypal cert url: {cert_url}")
+        try:
+            response = self.session.get(cert_url, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise PayPalError(f"Paypal request failed: {e}") from e
+        if response.status_code != 200:
+            raise PayPalError(
+                f"Failed to download paypal cert {response.status_code}",
+                response.status_code,
+            )
+        certificate = x509.load_pem_x509_certificate(response.content)
+        self._certificates[cert_url] = certificate
+        return certificate
+
+    def verify_webhook(self, headers, body, webhook_id):
+        """
+        校验 webhook 通知的签名，headers 是请求头（不区分大小写），body 是原始请求体（bytes）。
+        签名原文是 传输ID|传输时间|webhook ID|请求体的CRC32，用 PayPal 证书做 SHA256withRSA 验签。
+        """
+        transmission_id = headers.get("PAYPAL-TRANSMISSION-ID")
+        transmission_time = headers.get("PAYPAL-TRANSMISSION-TIME")
+        signature = headers.get("PAYPAL-TRANSMISSION-SIG")
+        cert_url = headers.get("PAYPAL-CERT-URL")
+        if not (webhook_id and transmission_id and transmission_time and signature and cert_url):
+            return False
+        message = f"{transmission_id}|{transmission_time}|{webhook_id}|{zlib.crc32(body)}"
+        try:
+            self.webhook_certificate(cert_url).public_key().verify(
+                base64.b64decode(signature),
+                message.encode("utf-8"),
+                padding.PKCS1v15(),
+                hashes.SHA256(),
+            )
+        except (InvalidSignature, binascii.Error, ValueError):
+            return False
+        return True
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """进程内共用的客户端；配置变化（比如测试里 override_settings）时重新创建"""
+    global _client
+    config = (
+        settings.PAYPAL_CLIENT_ID,
+        settings.PAYPAL_SECRET_ID,
+        settings.PAYPAL_API_URL.rstrip("/"),
+    )
+    with _client_lock:
+        if _client is None or _client.config != config:
+            _client = PayPalClient(*config)
+        return _client
@@ -0,0 +1,161 @@
+"""
+本地的假 PayPal 服务，用来离线调试/测试支付校验流程
+
+只实现了用到的两个接口：
+- POST /v1/oauth2/token：校验 client_id/secret（HTTP Basic），返回 access token 和 expires_in
+- GET /v2/checkout/orders/<id>：校验 Bearer token，返回 orders 里登记的订单状态
+
+在代码里使用（例如测试）：
+
+    with FakePayPalServer(orders={"5O190127TN364715T": "COMPLETED"}) as server:
+        with override_settings(PAYPAL_API_URL=server.url, PAYPAL_CLIENT_ID=server.client_id,
+                               PAYPAL_SECRET_ID=server.secret):
+            ...
+        server.token_requests  # OAuth 接口被请求的次数
+
+单独运行（配合前端调试，把 .env 里的 PAYPAL_API_URL 设为 http://127.0.0.1:8765）：
+
+    python utils/paypal_fake.py --port 8765 --order 5O190127TN364715T=COMPLETED
+"""
+
+import argparse
+import base64
+import json
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class FakePayPalHandler(BaseHTTPRequestHandler):
+    server_version = "FakePayPal/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.fake.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        fake = self.server.fake
+        length = int(self.headers.get("Content-Length") or 0)
+        form = parse_qs(self.rfile.read(length).decode("utf-8"))
+        if self.path != "/v1/oauth2/token":
+            return self.send_json(404, {"name": "RESOURCE_NOT_FOUND"})
+        expected = base64.b64encode(
+            f"{fake.client_id}:{fake.secret}".encode("utf-8")
+        ).decode("ascii")
+        if self.headers.get("Authorization") != f"Basic {expected}":
+            return self.send_json(401, {"error": "invalid_client"})
+        if form.get("grant_type") != ["client_credentials"]:
+            return self.send_json(400, {"error": "unsupported_grant_type"})
+        self.send_json(200, fake.issue_token())
+
+    def do_GET(self):
+        fake = self.server.fake
+        prefix = "/v2/checkout/orders/"
+        if not self.path.startswith(prefix):
+            return self.send_json(404, {"name": "RESOURCE_NOT_FOUND"})
+        auth = self.headers.get("Authorization", "")
+        if not fake.token_valid(auth.removeprefix("Bearer ")):
+            return self.send_json(401, {"error": "invalid_token"})
+        order_id = self.path[len(prefix):]
+        if order_id not in fake.orders:
+            return self.send_json(404, {"name": "RESOURCE_NOT_FOUND"})
+        self.send_json(200, {"id": order_id, "status": fake.orders[order_id]})
+
+
+class FakePayPalServer:
+    def __init__(
+        self,
+        orders=None,
+        client_id="fake-client-id",
+        secret="fake-secret",
+        expires_in=32400,
+        host="127.0.0.1",
+        port=0,
+        verbose=False,
+    ):
+        self.orders = dict(orders or {})
+        self.client_id = client_id
+        self.secret = secret
+        self.expires_in = expires_in
+        self.verbose = verbose
+        self.token_requests = 0
+        self._tokens = {}
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), FakePayPalHandler)
+        self.httpd.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def issue_token(self):
+        token = secrets.token_urlsafe(24)
+        with self._lock:
+            self.token_requests += 1
+            self._tokens[token] = time.monotonic() + self.expires_in
+        return {
+            "access_token": token,
+            "token_type": "Bearer",
+            "expires_in": self.expires_in,
+        }
+
+    def token_valid(self, token):
+        with self._lock:
+            return self._tokens.get(token, 0) > time.monotonic()
+
+    def revoke_tokens(self):
+        """让已经发出的 token 全部失效，模拟 PayPal 提前吊销"""
+        with self._lock:
+            self._tokens.clear()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地的假 PayPal 服务")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--order",
+        action="append",
+        default=[],
+        metavar="ID=STATUS",
+        help="登记一个订单及其状态，例如 5O190127TN364715T=COMPLETED，可以重复",
+    )
+    args = parser.parse_args()
+    orders = dict(item.split("=", 1) for item in args.order)
+    server = FakePayPalServer(orders=orders, port=args.port, verbose=True)
+    print(f"Fake PayPal listening on {server.url}")
+    print(f"PAYPAL_CLIENT_ID={server.client_id} PAYPAL_SECRET_ID={server.secret}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
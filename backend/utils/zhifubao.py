@@ -1,20 +1,37 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+"""
+支付宝网关
+
+🧐为什么要缓存客户端和密钥？
+答：原来每次 Alipay() 都会新建 AlipayClientConfig 和 DefaultAlipayClient，
+verify_sign 每收到一条异步通知都要把 PEM 格式的支付宝公钥重新解析一遍（base64 解码 + ASN.1 解析），
+大促时大量回调同时到达，CPU 都花在解析同一把密钥上。
+
+现在：
+1. get_alipay() 返回进程内共用的 Alipay 对象，配置变化时才重新创建
+2. 公钥/私钥解析成 rsa.PublicKey / rsa.PrivateKey 之后缓存（load_public_key / load_private_key）
+3. verify_notifications() 批量校验回调，重放的相同回调在同一批里只验一次签
+
+验签/签名的吞吐可以在 backend 目录执行 `python -m utils.zhifubao_bench` 对比（不需要真实的支付宝密钥）。
+"""
+import base64
+import binascii
+import functools
 import logging
+import threading
+from collections import namedtuple
 
+import rsa
 from alipay.aop.api.AlipayClientConfig import AlipayClientConfig
 from alipay.aop.api.DefaultAlipayClient import DefaultAlipayClient
 from alipay.aop.api.domain.AlipayTradePagePayModel import AlipayTradePagePayModel
 from alipay.aop.api.request.AlipayTradePagePayRequest import AlipayTradePagePayRequest
-from alipay.aop.api.util.SignatureUtils import verify_with_rsa
-from backend.settings import (
-    ALIPAY_APP_ID,
-    ALIPAY_APP_PRIVATE_KEY,
-    ALIPAY_PUBLIC_KEY,
-    ALIPAY_SERVER_URL,
-    ALIPAY_RETURN_URL,
-    ALIPAY_NOTIFY_URL,
+from alipay.aop.api.util.SignatureUtils import (
+    fill_private_key_marker,
+    fill_public_key_marker,
 )
+from django.conf import settings
 
 logging.basicConfig(
     level=logging.INFO,
@@ -23,19 +40,68 @@ logging.basicConfig(
 )
 logger = logging.getLogger("")
 
+AlipayConfig = namedtuple(
+    "AlipayConfig",
+    [
+        "server_url",
+        "app_id",
+        "app_private_key",
+        "alipay_public_key",
+        "return_url",
+        "notify_url",
+    ],
+)
+
+# 回调参数里不参与签名的字段
+UNSIGNED_FIELDS = ("sign", "sign_type")
+
+
+def settings_config():
+    return AlipayConfig(
+        server_url=settings.ALIPAY_SERVER_URL,
+        app_id=settings.ALIPAY_APP_ID,
+        app_private_key=settings.ALIPAY_APP_PRIVATE_KEY,
+        alipay_public_key=settings.ALIPAY_PUBLIC_KEY,
+        return_url=settings.ALIPAY_RETURN_URL,
+        notify_url=settings.ALIPAY_NOTIFY_URL,
+    )
+
+
+@functools.lru_cache(maxsize=8)
+def load_public_key(public_key):
+    """解析支付宝公钥（可以不带 BEGIN/END 标记），结果按字符串缓存"""
+    return rsa.PublicKey.load_pkcs1_openssl_pem(fill_public_key_marker(public_key))
+
+
+@functools.lru_cache(maxsize=8)
+def load_private_key(private_key):
+    """解析应用私钥（PKCS#1，可以不带 BEGIN/END 标记），结果按字符串缓存"""
+    return rsa.PrivateKey.load_pkcs1(fill_private_key_marker(private_key), format="PEM")
+
+
+def unsigned_string(params):
+    """回调参数去掉 sign/sign_type，按键排序后拼成 k1=v1&k2=v2，就是待验签的原文"""
+    return "&".join(
+        f"{key}={value}"
+        for key, value in sorted(params.items())
+        if key not in UNSIGNED_FIELDS
+    )
+
 
 class Alipay:
     """
     设置配置，包括支付宝网关地址、app_id、应用私钥、支付宝公钥等，其他配置值可以查看AlipayClientConfig的定义。
+    一般通过 get_alipay() 取得进程内共用的对象，不要每个请求都新建。
     """
 
-    def __init__(self):
+    def __init__(self, config=None):
+        self.config = config or settings_config()
         # 将配置对象改为实例变量，避免共享问题
         self.alipay_client_config = AlipayClientConfig()
-        self.alipay_client_config.server_url = ALIPAY_SERVER_URL
-        self.alipay_client_config.app_id = ALIPAY_APP_ID
-        self.alipay_client_config.app_private_key = ALIPAY_APP_PRIVATE_KEY
-        self.alipay_client_config.alipay_public_key = ALIPAY_PUBLIC_KEY
+        self.alipay_client_config.server_url = self.config.server_url
+        self.alipay_client_config.app_id = self.config.app_id
+        self.alipay_client_config.app_private_key = self.config.app_private_key
+        self.alipay_client_config.alipay_public_key = self.config.alipay_public_key
         """
         得到客户端对象。
         注意，一个alipay_client_config对象对应一个DefaultAlipayClient，定义DefaultAlipayClient对象后，alipay_client_config不得修改，如果想使用不同的配置，请定义不同的DefaultAlipayClient。
@@ -45,11 +111,49 @@ class Alipay:
             alipay_client_config=self.alipay_client_config, logger=logger
         )
 
+    @property
+    def public_key(self):
+        return load_public_key(self.config.alipay_public_key)
+
+    @property
+    def private_key(self):
+        return load_private_key(self.config.app_private_key)
+
+    def sign(self, unsigned, hash_method="SHA-256"):
+        """用应用私钥签名（RSA2 是 SHA-256），返回 base64 字符串"""
+        signature = rsa.sign(unsigned.encode("utf-8"), self.private_key, hash_method)
+        return base64.b64encode(signature).decode("ascii")
+
     def verify_sign(self, unsigned_string, sign):
-        """验签的自定义函数,调用alipay的verify_with_rsa方法"""
-        return verify_with_rsa(
-            ALIPAY_PUBLIC_KEY, bytes(unsigned_string, encoding="utf-8"), sign
-        )
+        """验签的自定义函数，签名不对时返回False"""
+        try:
+            rsa.verify(
+                unsigned_string.encode("utf-8"), base64.b64decode(sign), self.public_key
+            )
+        except (rsa.VerificationError, binascii.Error, ValueError):
+            return False
+        return True
+
+    def verify_notification(self, params):
+        """校验一条异步通知（POST 过来的全部参数）"""
+        sign = params.get("sign")
+        if not sign:
+            return False
+        return self.verify_sign(unsigned_string(params), sign)
+
+    def verify_notifications(self, notifications):
+        """
+        批量校验异步通知，返回和输入一一对应的 True/False。
+        支付宝没收到 success 会重复推送同一条通知，同一批里内容相同的通知只验一次签。
+        """
+        results = {}
+        verified = []
+        for params in notifications:
+            key = (unsigned_string(params), params.get("sign"))
+            if key not in results:
+                results[key] = self.verify_notification(params)
+            verified.append(results[key])
+        return verified
 
     def trade_page(
         self,
@@ -72,9 +176,23 @@ class Alipay:
         request = AlipayTradePagePayRequest(biz_model=model)
 
         # 设置回调URL
-        request.notify_url = ALIPAY_NOTIFY_URL
-        request.return_url = ALIPAY_RETURN_URL
+        request.notify_url = self.config.notify_url
+        request.return_url = self.config.return_url
 
         # 得到构造的请求，如果http_method是GET，则是一个带完成请求参数的url，如果http_method是POST，则是一段HTML表单片段
         response = self.client.page_execute(request, http_method="GET")
         return response
+
+
+_alipay = None
+_alipay_lock = threading.Lock()
+
+
+def get_alipay():
+    """进程内共用的 Alipay 对象；配置变化（比如测试里 override_settings）时重新创建"""
+    global _alipay
+    config = settings_config()
+    with _alipay_lock:
+        if _alipay is None or _alipay.config != config:
+            _alipay = Alipay(config)
+        return _alipay
@@ -0,0 +1,127 @@
+"""
+支付宝签名/验签吞吐对比：每次重新解析密钥（原来的做法） vs 使用缓存的密钥对象
+
+不需要真实的支付宝密钥，运行时临时生成一对RSA密钥。在 backend 目录执行：
+
+    python -m utils.zhifubao_bench --rounds 300 --bits 2048
+"""
+
+import argparse
+import base64
+import time
+
+import rsa
+from alipay.aop.api.util.SignatureUtils import sign_with_rsa2, verify_with_rsa
+from pyasn1.codec.der import encoder
+from pyasn1.type import univ
+from rsa.asn1 import OpenSSLPubKey, PubKeyHeader
+
+from utils.zhifubao import Alipay, AlipayConfig, unsigned_string
+
+
+def pem_body(pem):
+    """去掉 BEGIN/END 标记和换行，和 .env 里保存的密钥格式一样"""
+    lines = pem.decode("ascii").strip().splitlines()
+    return "".join(lines[1:-1])
+
+
+def subject_public_key_info(public_key):
+    """rsa 库只能导出 PKCS#1 格式的公钥，这里包一层 X.509 SubjectPublicKeyInfo（DER）"""
+    info = OpenSSLPubKey()
+    header = PubKeyHeader()
+    header["oid"] = univ.ObjectIdentifier("1.2.840.113549.1.1.1")
+    info["header"] = header
+    info["key"] = univ.BitString.fromOctetString(public_key.save_pkcs1(format="DER"))
+    return encoder.encode(info)
+
+
+def make_alipay(bits):
+    public_key, private_key = rsa.newkeys(bits)
+    config = AlipayConfig(
+        server_url="https://openapi-sandbox.dl.alipaydev.com/gateway.do",
+        app_id="2021000000000000",
+        app_private_key=pem_body(private_key.save_pkcs1()),
+        # 支付宝公钥是 X.509 SubjectPublicKeyInfo 格式
+        alipay_public_key=pem_body(
+            b"-----BEGIN PUBLIC KEY-----\n"
+            + base64.encodebytes(subject_public_key_info(public_key))
+            + b"-----END PUBLIC KEY-----\n"
+        ),
+        return_url="",
+        notify_url="",
+    )
+    return Alipay(config)
+
+
+def notification(i):
+    return {
+        "app_id": "2021000000000000",
+        "out_trade_no": f"{i:010d}",
+        "trade_no": f"2024{i:024d}",
+        "trade_status": "TRADE_SUCCESS",
+        "total_amount": "99.00",
+        "charset": "utf-8",
+        "sign_type": "RSA2",
+    }
+
+
+def timed(label, rounds, func):
+    start = time.perf_counter()
+    for i in range(rounds):
+        func(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28}{rounds / elapsed:>10.1f} 次/秒")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="支付宝签名/验签吞吐对比")
+    parser.add_argument("--rounds", type=int, default=300)
+    parser.add_argument("--bits", type=int, default=2048)
+    args = parser.parse_args()
+
+    alipay = make_alipay(args.bits)
+    config = alipay.config
+    notifications = []
+    for i in range(args.rounds):
+        params = notification(i)
+        params["sign"] = alipay.sign(unsigned_string(params))
+        notifications.append(params)
+
+    timed(
+        "签名：每次解析私钥",
+        args.rounds,
+        lambda i: sign_with_rsa2(
+            config.app_private_key, unsigned_string(notifications[i]), "utf-8"
+        ),
+    )
+    timed(
+        "签名：缓存私钥",
+        args.rounds,
+        lambda i: alipay.sign(unsigned_string(notifications[i])),
+    )
+    timed(
+        "验签：每次解析公钥",
+        args.rounds,
+        lambda i: verify_with_rsa(
+            config.alipay_public_key,
+            unsigned_string(notifications[i]).encode("utf-8"),
+            notifications[i]["sign"],
+        ),
+    )
+    timed(
+        "验签：缓存公钥",
+        args.rounds,
+        lambda i: alipay.verify_notification(notifications[i]),
+    )
+
+    # 模拟支付宝重复推送：每条通知重放3次
+    replayed = [params for params in notifications for _ in range(3)]
+    start = time.perf_counter()
+    results = alipay.verify_notifications(replayed)
+    elapsed = time.perf_counter() - start
+    assert all(results)
+    print(f"{'批量验签（每条重放3次）':<28}{len(replayed) / elapsed:>10.1f} 条/秒")
+
+
+if __name__ == "__main__":
+    main()
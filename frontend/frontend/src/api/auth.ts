@@ -5,6 +5,7 @@ import { jwtDecode } from "jwt-decode";
 import Cookie from "js-cookie";
 import Swal from "sweetalert2";
 import Toast from "@/utils/SweetAlert2/Toast";
+import GenerateCartId from "@/utils/GenerateCartId";
 const authAxios = createAuthenticatedAxios();
 export const getCartCount = async (cart_id: string) => {
   const res = await apiClient.get(`/cart/cart-count/${cart_id}`);
@@ -14,6 +15,24 @@ export const getCartCount = async (cart_id: string) => {
   }
 };
 
+/**
+ * 把登录前的匿名购物车并进用户的购物车，合并失败不影响登录
+ * @param anonymousCartId
+ */
+const mergeAnonymousCart = async (anonymousCartId: string | null) => {
+  const cartId = GenerateCartId();
+  if (!anonymousCartId || anonymousCartId === cartId) return;
+  try {
+    // 目标购物车由后端按当前用户算出来，和 cartId 是同一个
+    const res = await authAxios.post("cart/merge/", {
+      anonymous_cart_id: anonymousCartId,
+    });
+    useAuthStore.getState().setCartCount(res.data.count);
+  } catch (error) {
+    console.error("合并匿名购物车失败:", error);
+  }
+};
+
 /**
  * 登录函数
  * @param email
@@ -28,8 +47,11 @@ export const login = async (email: string, password: string) => {
     });
     console.log("login data is:", data);
     console.log("login status is:", status);
+    // 登录前的匿名购物车（登录之后 GenerateCartId 会换成按用户ID生成的cart_id）
+    const anonymousCartId = localStorage.getItem("cart_id");
     if (status == 200) {
       setAuthUser(data.access, data.refresh);
+      await mergeAnonymousCart(anonymousCartId);
     }
     // let cart_id = localStorage.getItem("cart_id");
     // console.log('在login函数中，cart_id:',cart_id)
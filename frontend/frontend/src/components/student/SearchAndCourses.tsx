@@ -1,27 +1,27 @@
 import { useEffect, useState } from 'react'
 import { FaArrowRight, FaUser, FaRegFrownOpen, FaShoppingCart } from "react-icons/fa";
 import { BsReception4 } from "react-icons/bs";
-import type { EnrolledCourse } from '@/types/base'
+import type { StudentCourseSummary } from '@/types/base'
 import dayjs from 'dayjs'
 import { createAuthenticatedAxios } from '@/api/axios'
 import { GetUserData } from '@/utils'
 import { useQuery } from '@tanstack/react-query'
 import { Link } from 'react-router-dom'
 function SearchAndCourses({ path }: { path: string }) {
-    const [courses, setCourses] = useState<EnrolledCourse[]>([])
+    const [courses, setCourses] = useState<StudentCourseSummary[]>([])
     const authAxios = createAuthenticatedAxios()
     const userData = GetUserData()
 
     const handleSearch = (e: React.ChangeEvent<HTMLInputElement>) => {
         const query = e.target.value.toLowerCase()
         if (query !== '') {
-            const filted_enrolled_courses = enrolled_courses?.filter(course => course.course.title.toLowerCase().includes(query)) as EnrolledCourse[]
+            const filted_enrolled_courses = enrolled_courses?.filter(course => course.course.title.toLowerCase().includes(query)) as StudentCourseSummary[]
             setCourses(filted_enrolled_courses)
         } else {
-            setCourses(enrolled_courses as EnrolledCourse[])
+            setCourses(enrolled_courses as StudentCourseSummary[])
         }
     }
-    const getStudentCourseList = async (): Promise<EnrolledCourse[]> => {
+    const getStudentCourseList = async (): Promise<StudentCourseSummary[]> => {
         console.log('Fetching course list for user_id:', userData?.user_id);
         try {
             const res = await authAxios.get(`student/course-list/${userData?.user_id}/`)
@@ -129,11 +129,11 @@ function SearchAndCourses({ path }: { path: string }) {
                                         </div>
                                     </td>
                                     <td><p className='mt-3'>{dayjs(course.date).format('MM/DD/YY')}</p></td>
-                                    <td><p className='mt-3'>{course.lectures?.length || 0}</p></td>
-                                    <td><p className='mt-3'>{course.completed_lesson.length}</p></td>
+                                    <td><p className='mt-3'>{course.total_lectures}</p></td>
+                                    <td><p className='mt-3'>{course.completed_lessons} ({course.progress_percent}%)</p></td>
                                     <td>
                                         {
-                                            course.completed_lesson.length > 0 ?
+                                            course.completed_lessons > 0 ?
                                                 <>
                                                     <Link to={`/student/courses/${course.enrollment_id}`} className='btn btn-primary btn-sm mt-3'>Continue Course <FaArrowRight /></Link>
                                                 </>
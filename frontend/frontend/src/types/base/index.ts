@@ -169,12 +169,31 @@ export interface EnrolledCourse {
   date: string;
   lectures: VariantItem[]; // 课程的所有课时数组
   completed_lesson: CompletedLesson[]; // 完成的课时数组
+  completed_lessons: number; // 已完成课时数
+  total_lectures: number; // 课时总数
+  last_completed_lesson: number | null; // 最近一次标记完成的课时id
+  progress_percent: number; // 学习进度（0-100）
+  completed_at: string | null; // 学完全部课时的时间
   curriculum: Variant[]; // 课程章节数组
   note: Note[]; // 笔记数组
   question_answer: Question_Answer[]; // 问答数组
   review: Review | null; // 单个评价（一个学生对一个课程只能有一个评价）
 }
 
+// 学生课程列表（student/course-list）返回的精简版报名记录
+export interface StudentCourseSummary {
+  id: number;
+  enrollment_id: string;
+  date: string;
+  course: Pick<Course, 'id' | 'course_id' | 'title' | 'slug' | 'image' | 'language' | 'level' | 'price' | 'average_rating' | 'rating_count'>;
+  teacher_name: string | null;
+  completed_lessons: number; // 已完成课时数
+  total_lectures: number; // 课时总数
+  progress_percent: number; // 学习进度（0-100）
+  last_completed_lesson: string | null; // 最近一次标记完成的课时 variant_item_id
+  completed_at: string | null; // 学完全部课时的时间
+}
+
 export interface Note {
   id: number;
   course: Course;
@@ -217,6 +236,7 @@ export interface Coupon {
   discount: number;
   date: string;
   active: boolean;
+  single_use: boolean; // 批量生成的一次性优惠券，任何人用过之后就不能再用
 }
 
 export interface Wishlist {
@@ -253,7 +273,13 @@ export interface Profile {
 }
 
 export interface CartStats {
+  count: number;
   price: string;
   tax: string;
   total: string;
 }
+
+// cart/state 接口：购物车项（只有请求的字段）+ 汇总
+export interface CartState extends CartStats {
+  items: Array<Pick<Cart, 'id' | 'price'> & { course: Pick<Course, 'title' | 'image'> }>;
+}
@@ -1,7 +1,7 @@
 import { useState } from 'react'
-import type { Cart, CartStats } from "@/types/base/index";
+import type { CartState } from "@/types/base/index";
 import { useNavigate } from "react-router-dom";
-import { useQueries, useMutation, useQueryClient } from "@tanstack/react-query";
+import { useQuery, useMutation, useQueryClient } from "@tanstack/react-query";
 import { FaTimes } from "react-icons/fa";
 import { GenerateCartId } from "@/utils";
 import { getCartCount } from '@/api/auth'
@@ -32,13 +32,11 @@ function Carts() {
     const cartId = GenerateCartId() as string;
     const userId = getCurrentUserId()
 
-    const fetchCartList = async (): Promise<Cart[]> => {
-        const res = await authAxios.get(`/cart/cart-list/${cartId}`);
-        return res.data;
-    };
-
-    const fetchCartStats = async (): Promise<CartStats> => {
-        const res = await authAxios.get(`/cart/stats/${cartId}`);
+    // 购物车项和价格汇总一次请求拿到，购物车项只要页面用到的字段
+    const fetchCartState = async (): Promise<CartState> => {
+        const res = await authAxios.get(`/cart/state/${cartId}/`, {
+            params: { fields: 'id,price,course.title,course.image' }
+        });
         return res.data;
     };
 
@@ -75,7 +73,6 @@ function Carts() {
         onSuccess: async () => {
             queryClient.invalidateQueries({ queryKey: ["course-detail"] });
             queryClient.invalidateQueries({ queryKey: ["cart-list", cartId] });
-            queryClient.invalidateQueries({ queryKey: ["cart-stats", cartId] });
             queryClient.invalidateQueries({ queryKey: ["courses_list"] });
             const cart_id = localStorage.getItem("cart_id");
             if (cart_id) {
@@ -114,19 +111,10 @@ function Carts() {
         },
     });
 
-    const results = useQueries({
-        queries: [
-            {
-                queryKey: ["cart-list", cartId],
-                queryFn: fetchCartList,
-                staleTime: 5 * 60 * 1000,
-            },
-            {
-                queryKey: ["cart-stats", cartId],
-                queryFn: fetchCartStats,
-                staleTime: 5 * 60 * 1000,
-            },
-        ],
+    const { data: cart_state } = useQuery({
+        queryKey: ["cart-list", cartId],
+        queryFn: fetchCartState,
+        staleTime: 5 * 60 * 1000,
     });
 
     const checkOut = (e: any) => {
@@ -140,7 +128,8 @@ function Carts() {
     };
 
     // 访问结果
-    const [{ data: cart_list }, { data: cart_stats }] = results;
+    const cart_list = cart_state?.items;
+    const cart_stats = cart_state;
 
     const handleBidDataChange = (event: any) => {
         // 这里使用展开运算符(...)来复制现有的bioData对象的所有属性
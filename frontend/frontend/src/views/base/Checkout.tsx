@@ -258,6 +258,8 @@ function Checkout() {
                                                                         intent: "CAPTURE",
                                                                         purchase_units: [
                                                                             {
+                                                                                // 后端 PayPal webhook 按 custom_id 找回订单
+                                                                                custom_id: fetchOrderResult?.cart_order_id,
                                                                                 amount: {
                                                                                     currency_code: "USD",
                                                                                     value: fetchOrderResult?.total || '0'